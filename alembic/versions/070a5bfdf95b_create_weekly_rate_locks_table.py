@@ -20,13 +20,24 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # This revision used to be empty and the table came from create_all at app startup.
+    # Databases that already have it are left alone; fresh ones now get it from Alembic.
+    if sa.inspect(op.get_bind()).has_table('weekly_rate_locks'):
+        return
+    op.create_table('weekly_rate_locks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('article_id', sa.Integer(), nullable=False),
+    sa.Column('selling_rate', sa.Float(), nullable=False),
+    sa.Column('week_number', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['article_id'], ['articles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_weekly_rate_locks_id'), 'weekly_rate_locks', ['id'], unique=False)
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_index(op.f('ix_weekly_rate_locks_id'), table_name='weekly_rate_locks')
+    op.drop_table('weekly_rate_locks')
@@ -0,0 +1,90 @@
+"""Create margin_rollups table
+
+Revision ID: 5e1c0a7d9b42
+Revises: 37a085ca036b
+Create Date: 2026-10-17 09:12:31.402118
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1c0a7d9b42'
+down_revision: Union[str, Sequence[str], None] = '37a085ca036b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tables as of this revision, for the backfill
+purchase_orders = sa.table('purchase_orders', sa.column('id'), sa.column('store_id'), sa.column('status'), sa.column('created_at'))
+order_line_items = sa.table('order_line_items', sa.column('id'), sa.column('po_id'), sa.column('article_id'), sa.column('allocated_quantity'), sa.column('locked_rate'))
+bids = sa.table('bids', sa.column('line_item_id'), sa.column('status'), sa.column('bid_rate'))
+AMOUNT_COLUMNS = [f'{bucket}_{name}' for bucket in ('approved', 'completed') for name in ('line_items', 'quantity', 'revenue', 'cost')]
+
+
+def _backfill(margin_rollups) -> None:
+    """Sums the allocations of approved bids, and of completed POs, into the new table."""
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(
+            purchase_orders.c.store_id, purchase_orders.c.status, purchase_orders.c.created_at,
+            order_line_items.c.article_id, order_line_items.c.allocated_quantity, order_line_items.c.locked_rate, bids.c.bid_rate,
+        ).select_from(purchase_orders.join(
+            order_line_items, order_line_items.c.po_id == purchase_orders.c.id
+        ).join(
+            bids, sa.and_(bids.c.line_item_id == order_line_items.c.id, bids.c.status == 'APPROVED')
+        )).where(order_line_items.c.allocated_quantity > 0)
+    )
+
+    rollups = {}
+    for store_id, status, created_at, article_id, quantity, locked_rate, bid_rate in rows:
+        day = created_at.date() if isinstance(created_at, datetime) else created_at
+        year, week_number, _ = day.isocalendar()
+        row = rollups.setdefault((store_id, article_id, year, week_number), dict(
+            dict.fromkeys(AMOUNT_COLUMNS, 0),
+            store_id=store_id, article_id=article_id, year=year, week_number=week_number,
+            week_start=date.fromisocalendar(year, week_number, 1),
+        ))
+        for bucket in ['approved'] + (['completed'] if status == 'COMPLETED' else []):
+            row[f'{bucket}_line_items'] += 1
+            row[f'{bucket}_quantity'] += quantity
+            row[f'{bucket}_revenue'] += quantity * locked_rate
+            row[f'{bucket}_cost'] += quantity * bid_rate
+    if rollups:
+        conn.execute(margin_rollups.insert(), list(rollups.values()))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    margin_rollups = op.create_table('margin_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('article_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('week_number', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('approved_line_items', sa.Integer(), nullable=False),
+    sa.Column('approved_quantity', sa.Float(), nullable=False),
+    sa.Column('approved_revenue', sa.Float(), nullable=False),
+    sa.Column('approved_cost', sa.Float(), nullable=False),
+    sa.Column('completed_line_items', sa.Integer(), nullable=False),
+    sa.Column('completed_quantity', sa.Float(), nullable=False),
+    sa.Column('completed_revenue', sa.Float(), nullable=False),
+    sa.Column('completed_cost', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['article_id'], ['articles.id'], ),
+    sa.ForeignKeyConstraint(['store_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('store_id', 'article_id', 'year', 'week_number', name='uq_margin_rollups_store_article_week')
+    )
+    op.create_index(op.f('ix_margin_rollups_id'), 'margin_rollups', ['id'], unique=False)
+    _backfill(margin_rollups)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_margin_rollups_id'), table_name='margin_rollups')
+    op.drop_table('margin_rollups')
@@ -0,0 +1,33 @@
+"""Create cache_versions table
+
+Revision ID: 8a3f6b2e4c19
+Revises: 5e1c0a7d9b42
+Create Date: 2026-10-17 10:04:52.918233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a3f6b2e4c19'
+down_revision: Union[str, Sequence[str], None] = '5e1c0a7d9b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cache_versions = op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(cache_versions, [{'name': 'weekly_rates', 'version': 0}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('cache_versions')
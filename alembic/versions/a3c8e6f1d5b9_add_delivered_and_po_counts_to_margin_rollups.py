@@ -0,0 +1,100 @@
+"""Add delivered bucket and PO counts to margin_rollups
+
+Revision ID: a3c8e6f1d5b9
+Revises: e9b3c5a1f7d2
+Create Date: 2026-10-17 23:18:44.902671
+
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c8e6f1d5b9'
+down_revision: Union[str, Sequence[str], None] = 'e9b3c5a1f7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tables as of this revision, for the backfill
+purchase_orders = sa.table('purchase_orders', sa.column('id'), sa.column('store_id'), sa.column('status'), sa.column('created_at'))
+order_line_items = sa.table('order_line_items', sa.column('id'), sa.column('po_id'), sa.column('article_id'), sa.column('allocated_quantity'), sa.column('locked_rate'))
+bids = sa.table('bids', sa.column('line_item_id'), sa.column('status'), sa.column('bid_rate'))
+margin_rollups = sa.table(
+    'margin_rollups', sa.column('store_id'), sa.column('article_id'), sa.column('year'), sa.column('week_number'), sa.column('week_start'),
+    *(sa.column(f'{bucket}_{name}') for bucket in ('approved', 'delivered', 'completed') for name in ('line_items', 'quantity', 'revenue', 'cost')),
+    sa.column('delivered_pos'), sa.column('completed_pos'),
+)
+
+
+def _backfill() -> None:
+    """
+    Recomputes every rollup row from line items and approved bids, as rebuild_margin_rollups does,
+    so databases whose rollups were never rebuilt report their history too.
+    """
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(
+            purchase_orders.c.id, purchase_orders.c.store_id, purchase_orders.c.status, purchase_orders.c.created_at,
+            order_line_items.c.article_id, order_line_items.c.allocated_quantity, order_line_items.c.locked_rate, bids.c.bid_rate,
+        ).select_from(purchase_orders.join(
+            order_line_items, order_line_items.c.po_id == purchase_orders.c.id
+        ).outerjoin(
+            bids, sa.and_(bids.c.line_item_id == order_line_items.c.id, bids.c.status == 'APPROVED')
+        ))
+    )
+
+    rollups = {}
+    first_article = {}
+    for po_id, store_id, status, created_at, article_id, quantity, locked_rate, bid_rate in rows:
+        day = created_at.date() if isinstance(created_at, datetime) else created_at
+        year, week_number, _ = day.isocalendar()
+        key = (store_id, article_id, year, week_number)
+        row = rollups.setdefault(key, dict(
+            {column.name: 0 for column in margin_rollups.columns},
+            store_id=store_id, article_id=article_id, year=year, week_number=week_number,
+            week_start=date.fromisocalendar(year, week_number, 1),
+        ))
+        buckets = ['approved'] + ([status.lower()] if status in ('DELIVERED', 'COMPLETED') else [])
+        if status in ('DELIVERED', 'COMPLETED') and (po_id not in first_article or article_id < first_article[po_id][0][1]):
+            first_article[po_id] = (key, status)
+        if not quantity or bid_rate is None:
+            continue
+        for bucket in buckets:
+            row[f'{bucket}_line_items'] += 1
+            row[f'{bucket}_quantity'] += quantity
+            row[f'{bucket}_revenue'] += quantity * locked_rate
+            row[f'{bucket}_cost'] += quantity * bid_rate
+    for key, status in first_article.values():
+        rollups[key][f'{status.lower()}_pos'] += 1
+
+    # Keys of line items without an allocation, on POs not yet delivered, have nothing to store
+    amounts = [column.name for column in margin_rollups.columns if column.name not in ('store_id', 'article_id', 'year', 'week_number', 'week_start')]
+    filled = [row for row in rollups.values() if any(row[column] for column in amounts)]
+    conn.execute(margin_rollups.delete())
+    if filled:
+        conn.execute(margin_rollups.insert(), filled)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('margin_rollups', sa.Column('delivered_pos', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('margin_rollups', sa.Column('delivered_line_items', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('margin_rollups', sa.Column('delivered_quantity', sa.Float(), server_default='0', nullable=False))
+    op.add_column('margin_rollups', sa.Column('delivered_revenue', sa.Float(), server_default='0', nullable=False))
+    op.add_column('margin_rollups', sa.Column('delivered_cost', sa.Float(), server_default='0', nullable=False))
+    op.add_column('margin_rollups', sa.Column('completed_pos', sa.Integer(), server_default='0', nullable=False))
+    _backfill()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('margin_rollups', 'completed_pos')
+    op.drop_column('margin_rollups', 'delivered_cost')
+    op.drop_column('margin_rollups', 'delivered_revenue')
+    op.drop_column('margin_rollups', 'delivered_quantity')
+    op.drop_column('margin_rollups', 'delivered_line_items')
+    op.drop_column('margin_rollups', 'delivered_pos')
@@ -0,0 +1,28 @@
+"""Add po_progress cache version
+
+Revision ID: a7d4e2f9c1b6
+Revises: f3a9c6e2b8d4
+Create Date: 2026-10-17 16:48:09.274118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d4e2f9c1b6'
+down_revision: Union[str, Sequence[str], None] = 'f3a9c6e2b8d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('po_progress', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM cache_versions WHERE name = 'po_progress'")
@@ -0,0 +1,43 @@
+"""Add line item and approved item counters to PO
+
+Revision ID: c47d2e9a1f08
+Revises: 8a3f6b2e4c19
+Create Date: 2026-10-17 11:37:05.664120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d2e9a1f08'
+down_revision: Union[str, Sequence[str], None] = '8a3f6b2e4c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('purchase_orders', sa.Column('line_item_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('purchase_orders', sa.Column('approved_item_count', sa.Integer(), server_default='0', nullable=False))
+    # Backfill the counters from existing line items and approved bids
+    op.execute("""
+        UPDATE purchase_orders SET
+            line_item_count = (
+                SELECT COUNT(*) FROM order_line_items
+                WHERE order_line_items.po_id = purchase_orders.id
+            ),
+            approved_item_count = (
+                SELECT COUNT(DISTINCT order_line_items.id) FROM order_line_items
+                JOIN bids ON bids.line_item_id = order_line_items.id
+                WHERE order_line_items.po_id = purchase_orders.id AND bids.status = 'APPROVED'
+            )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('purchase_orders', 'approved_item_count')
+    op.drop_column('purchase_orders', 'line_item_count')
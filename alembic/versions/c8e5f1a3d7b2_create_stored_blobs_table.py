@@ -0,0 +1,45 @@
+"""Create stored_blobs table
+
+Revision ID: c8e5f1a3d7b2
+Revises: a7d4e2f9c1b6
+Create Date: 2026-10-17 18:11:36.905824
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e5f1a3d7b2'
+down_revision: Union[str, Sequence[str], None] = 'a7d4e2f9c1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNREFERENCED_ONLY = sa.text("ref_count = 0")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stored_blobs',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name'),
+    sa.UniqueConstraint('url')
+    )
+    op.create_index(
+        'ix_stored_blobs_unreferenced', 'stored_blobs', ['updated_at'],
+        postgresql_where=UNREFERENCED_ONLY, sqlite_where=UNREFERENCED_ONLY,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stored_blobs_unreferenced', table_name='stored_blobs')
+    op.drop_table('stored_blobs')
@@ -0,0 +1,41 @@
+"""Add bids.proof_status and pending_uploads table
+
+Revision ID: d4f7a2c9e6b1
+Revises: c8e5f1a3d7b2
+Create Date: 2026-10-17 20:42:18.310557
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7a2c9e6b1'
+down_revision: Union[str, Sequence[str], None] = 'c8e5f1a3d7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing bids were uploaded before they were inserted
+    op.add_column('bids', sa.Column('proof_status', sa.String(length=20), server_default='UPLOADED', nullable=False))
+    op.create_table('pending_uploads',
+    sa.Column('bid_id', sa.Integer(), nullable=False),
+    sa.Column('spool_path', sa.String(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=True),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['bid_id'], ['bids.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('bid_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('pending_uploads')
+    op.drop_column('bids', 'proof_status')
@@ -0,0 +1,28 @@
+"""Add open_line_items cache version
+
+Revision ID: e5b8d1c3a7f2
+Revises: c47d2e9a1f08
+Create Date: 2026-10-17 13:21:44.187305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8d1c3a7f2'
+down_revision: Union[str, Sequence[str], None] = 'c47d2e9a1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('open_line_items', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM cache_versions WHERE name = 'open_line_items'")
@@ -0,0 +1,31 @@
+"""Add spool_host and claimed_at to pending_uploads
+
+Revision ID: e9b3c5a1f7d2
+Revises: d4f7a2c9e6b1
+Create Date: 2026-10-17 21:37:04.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9b3c5a1f7d2'
+down_revision: Union[str, Sequence[str], None] = 'd4f7a2c9e6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows queued before this revision have no host; the recovery sweep treats them as orphans once stale
+    op.add_column('pending_uploads', sa.Column('spool_host', sa.String(length=255), nullable=True))
+    op.add_column('pending_uploads', sa.Column('claimed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pending_uploads', 'claimed_at')
+    op.drop_column('pending_uploads', 'spool_host')
@@ -0,0 +1,55 @@
+"""Add indexes for dashboard, bid and rate lookups
+
+Revision ID: f3a9c6e2b8d4
+Revises: e5b8d1c3a7f2
+Create Date: 2026-10-17 15:02:18.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c6e2b8d4'
+down_revision: Union[str, Sequence[str], None] = 'e5b8d1c3a7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING_BIDS_ONLY = sa.text("status = 'PENDING_BIDS'")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the first rate if the same article was locked twice in a week, then forbid duplicates
+    op.execute("""
+        DELETE FROM weekly_rate_locks WHERE id NOT IN (
+            SELECT MIN(id) FROM weekly_rate_locks GROUP BY year, week_number, article_id
+        )
+    """)
+    with op.batch_alter_table('weekly_rate_locks') as batch_op:
+        batch_op.create_unique_constraint('uq_weekly_rate_locks_week_article', ['year', 'week_number', 'article_id'])
+
+    # Built CONCURRENTLY on PostgreSQL so the live tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        op.create_index('ix_purchase_orders_store_created', 'purchase_orders', ['store_id', 'created_at', 'id'], postgresql_concurrently=True)
+        op.create_index('ix_purchase_orders_status_created', 'purchase_orders', ['status', 'created_at', 'id'], postgresql_concurrently=True)
+        op.create_index(
+            'ix_purchase_orders_pending_bids_created', 'purchase_orders', ['created_at', 'id'],
+            postgresql_where=PENDING_BIDS_ONLY, sqlite_where=PENDING_BIDS_ONLY, postgresql_concurrently=True,
+        )
+        op.create_index('ix_order_line_items_po_id', 'order_line_items', ['po_id'], postgresql_concurrently=True)
+        op.create_index('ix_bids_line_item_status', 'bids', ['line_item_id', 'status'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_bids_line_item_status', table_name='bids', postgresql_concurrently=True)
+        op.drop_index('ix_order_line_items_po_id', table_name='order_line_items', postgresql_concurrently=True)
+        op.drop_index('ix_purchase_orders_pending_bids_created', table_name='purchase_orders', postgresql_concurrently=True)
+        op.drop_index('ix_purchase_orders_status_created', table_name='purchase_orders', postgresql_concurrently=True)
+        op.drop_index('ix_purchase_orders_store_created', table_name='purchase_orders', postgresql_concurrently=True)
+    with op.batch_alter_table('weekly_rate_locks') as batch_op:
+        batch_op.drop_constraint('uq_weekly_rate_locks_week_article', type_='unique')
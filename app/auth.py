@@ -1,15 +1,41 @@
 # app/auth.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status, Request
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TTL_SECONDS,
+    AUTH_CACHE_CHECK_SECONDS,
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+)
 from app.db import models
-from app.db.base import get_db
+from app.db.base import get_async_db
+from app.services import versions
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Pinning min/max to the configured rounds makes passlib flag any other round count for rehash.
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -17,6 +43,80 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    """Raised when more than max_pending hash jobs are already waiting or running."""
+
+class PasswordHasher:
+    """
+    Runs pbkdf2 hashing on a dedicated, bounded thread pool so it never blocks the event loop.
+    hashlib releases the GIL while deriving keys, so the workers hash in parallel.
+    Keeps simple counters for queue depth and wait time, see stats().
+    """
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_hash_time = 0.0
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        submitted_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                wait = started_at - submitted_at
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._total_hash_time += time.perf_counter() - started_at
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(job))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash predates the current rounds policy."""
+        return await self._submit(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(pwd_context.hash, password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._total_wait / self._completed if self._completed else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "avg_hash_seconds": self._total_hash_time / self._completed if self._completed else 0.0,
+            }
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -27,8 +127,102 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_claims_for(user: models.User) -> dict:
+    """Claims put in every access token: carrying the id and role lets requests skip the users table."""
+    return {"sub": user.username, "uid": user.id, "role": user.role}
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Lightweight, session-independent snapshot of the authenticated user."""
+    id: int
+    username: str
+    role: str
+
+class TokenCache:
+    """
+    Bounded LRU of verified token -> CurrentUser. Entries expire after ttl seconds or
+    when the token itself expires, whichever comes first.
+
+    Each entry is stamped with the shared 'users' version counter it was read under and only
+    trusted while that is still the current version. The counter is re-read at most once every
+    check_interval seconds (along with the user, so a request runs at most one query), so a role
+    change or deleted user reaches every worker within that window, and the writing worker at once.
+    """
+    def __init__(
+        self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS, check_interval: float = AUTH_CACHE_CHECK_SECONDS,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, token: str) -> CurrentUser | None:
+        """The cached user, or None if missing, expired or read under an older (or unchecked) users version."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at, version = entry
+            if expires_at <= time.time() or version != self._version:
+                del self._entries[token]
+                return None
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: CurrentUser, version: int, token_exp: float | None = None) -> None:
+        """Caches user as read under the given users version, which becomes the current one."""
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._version, self._checked_at = version, time.monotonic()
+            self._entries[token] = (user, expires_at, version)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget_versions(self, names) -> None:
+        if versions.USERS in names:
+            with self._lock:
+                self._version = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+token_cache = TokenCache()
+versions.on_commit(token_cache.forget_versions)
+
+def _identity_changed(user: models.User) -> bool:
+    attrs = inspect(user).attrs
+    return attrs.username.history.has_changes() or attrs.role.history.has_changes()
+
+@event.listens_for(Session, "before_flush")
+def _bump_users_version(session, flush_context, instances):
+    # Bumped in the writing transaction, so every worker drops its cached tokens for the user
+    if any(isinstance(obj, models.User) for obj in session.deleted) or any(
+        isinstance(obj, models.User) and _identity_changed(obj) for obj in session.dirty
+    ):
+        versions.bump_version(session, versions.USERS)
+
+def role_of_token(token: str) -> str | None:
+    """Role behind an access token without touching the DB: the cached user's, else the signed claim. None if invalid."""
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user.role
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("role")
+    except JWTError:
+        return None
+
 # THIS IS THE NEW, CORRECTED DEPENDENCY
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -37,6 +231,11 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     token = request.cookies.get("access_token")
     if token is None:
         raise credentials_exception
+
+    # Fast path: token already verified by this worker, no decoding and no DB work.
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
         
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -45,8 +244,19 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+
+    # The session is only used on a cache miss, so cached requests never open a connection.
+    # The users version is read in the same statement to stamp the cache entry.
+    stmt = select(models.User.id, models.User.username, models.User.role, versions.version_column(versions.USERS).label("version"))
+    if payload.get("uid") is not None:
+        stmt = stmt.where(models.User.id == payload["uid"])
+    else:
+        # Tokens issued before the uid claim existed
+        stmt = stmt.where(models.User.username == username)
+    row = (await db.execute(stmt)).first()
+    if row is None or row.username != username:
         raise credentials_exception
-    return user
\ No newline at end of file
+
+    user = CurrentUser(id=row.id, username=row.username, role=row.role)
+    token_cache.put(token, user, row.version, payload.get("exp"))
+    return user
@@ -0,0 +1,190 @@
+# app/cli.py
+# Maintenance commands, run with: python -m app.cli <command>
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.auth import get_password_hash
+from app.core.config import ARTICLES, BIDDING_WINDOW_HOURS, BLOB_GC_GRACE_HOURS
+from app.db import models
+from app.db.base import SessionLocal
+from app.db.query_plans import check_query_plans
+from app.services import auctions, logic, rollups, uploads, versions
+from app.services.upload_queue import SpooledFile, upload_queue
+
+# MVP accounts created by the seed command, all with password 'password'
+SEED_USERS = {"metro": models.UserRole.store, "buyer1": models.UserRole.purchaser, "admin": models.UserRole.admin}
+
+def seed(args):
+    """Creates the MVP users and the article catalogue if missing; safe to run on every deploy."""
+    db = SessionLocal()
+    try:
+        existing_users = set(db.scalars(select(models.User.username).where(models.User.username.in_(SEED_USERS))))
+        for username, role in SEED_USERS.items():
+            if username not in existing_users:
+                db.add(models.User(username=username, hashed_password=get_password_hash("password"), role=role.value))
+
+        existing_articles = set(db.scalars(select(models.Article.article_number)))
+        missing_articles = [article for article in ARTICLES if article["article_number"] not in existing_articles]
+        db.add_all(models.Article(**article) for article in missing_articles)
+        db.commit()
+        print(f"Seeded {len(SEED_USERS) - len(existing_users)} users and {len(missing_articles)} articles")
+    finally:
+        db.close()
+
+def rebuild_rollups(args):
+    db = SessionLocal()
+    try:
+        count = rollups.rebuild_margin_rollups(db)
+        versions.bump_version(db, versions.PO_PROGRESS)
+        db.commit()
+        print(f"Rebuilt margin_rollups: {count} rows")
+    finally:
+        db.close()
+
+def recompute_recommendations(args):
+    """One-off backfill: recommendations used to be computed when a store opened a PO."""
+    db = SessionLocal()
+    try:
+        pos = db.query(models.PurchaseOrder).options(
+            selectinload(models.PurchaseOrder.line_items).selectinload(models.OrderLineItem.bids)
+        ).filter(models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value).all()
+        updated = 0
+        for po in pos:
+            if any(bid.status == models.BidStatus.APPROVED.value for item in po.line_items for bid in item.bids):
+                continue
+            logic.recommend_bids_for_po(po.line_items)
+            updated += 1
+        db.commit()
+        print(f"Recomputed recommendations for {updated} purchase orders")
+    finally:
+        db.close()
+
+def close_auctions(args):
+    """Meant to run on a schedule (cron / container job) at the daily bidding cutoff."""
+    cutoff = args.cutoff or datetime.now(timezone.utc) - timedelta(hours=BIDDING_WINDOW_HOURS)
+    db = SessionLocal()
+    try:
+        result = auctions.close_auctions(db, cutoff)
+        db.commit()
+        print(f"Closed auctions created before {cutoff.isoformat()}: "
+              f"{result['line_items_awarded']} line items awarded, {result['line_items_unfilled']} unfilled; "
+              f"{result['purchase_orders_approved']} POs approved, {result['purchase_orders_unfilled']} unfilled")
+    finally:
+        db.close()
+
+def gc_blobs(args):
+    """Deletes content-addressed proof blobs that no bid or PO photo has referenced for the grace period."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=args.grace_hours)
+    db = SessionLocal()
+
+    async def delete_blobs():
+        deleted = 0
+        try:
+            for name in uploads.unreferenced_names(db, cutoff):
+                # One transaction per blob: the row is re-checked and locked, the blob deleted, then the row
+                if not uploads.claim_unreferenced(db, name, cutoff):
+                    db.rollback()
+                    continue
+                try:
+                    await uploads.file_uploader.storage.delete(name)
+                except BaseException:
+                    db.rollback()
+                    raise
+                db.commit()
+                deleted += 1
+            return deleted
+        finally:
+            await uploads.file_uploader.close()
+
+    try:
+        deleted = asyncio.run(delete_blobs())
+    finally:
+        db.close()
+    print(f"Deleted {deleted} blobs unreferenced since {cutoff.isoformat()}")
+
+def upload_pending(args):
+    """
+    Uploads the bid proof photos still spooled on this host, including ones that gave up after
+    UPLOAD_MAX_ATTEMPTS, which are retried from scratch. Run it where UPLOAD_SPOOL_DIR lives. Workers
+    resume stranded PENDING uploads on their own (UploadQueue's recovery sweep); this doesn't wait for it.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(models.PendingUpload).order_by(models.PendingUpload.bid_id).all()
+        spooled = [row for row in rows if os.path.exists(row.spool_path)]
+        missing = [row.bid_id for row in rows if not os.path.exists(row.spool_path)]
+        db.query(models.Bid).filter(
+            models.Bid.id.in_([row.bid_id for row in spooled]), models.Bid.proof_status == models.ProofStatus.FAILED.value
+        ).update({models.Bid.proof_status: models.ProofStatus.PENDING.value}, synchronize_session=False)
+        db.commit()
+        pending = [(row.bid_id, SpooledFile.of(row)) for row in spooled]
+    finally:
+        db.close()
+
+    async def upload_all():
+        try:
+            for bid_id, photo in pending:
+                upload_queue.enqueue(bid_id, photo)
+            await upload_queue.join()
+            return upload_queue.stats()
+        finally:
+            await upload_queue.close()
+            await uploads.file_uploader.close()
+
+    stats = asyncio.run(upload_all())
+    print(f"Uploaded {stats['completed']} pending proof photos, {stats['failed']} failed again")
+    if missing:
+        print(f"No spool file on this host for bids: {', '.join(map(str, missing))}")
+    if stats["failed"]:
+        sys.exit(1)
+
+def check_plans(args):
+    """Fails (exit code 1) if a hot query falls back to a full table scan; meant for CI against a scratch database."""
+    db = SessionLocal()
+    try:
+        results = check_query_plans(db)
+    finally:
+        db.close()
+    for name, tables in results.items():
+        print(f"{name}: {'full scan on ' + ', '.join(sorted(tables)) if tables else 'ok'}")
+    if any(results.values()):
+        sys.exit(1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Blue Marina maintenance commands")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    seed_command = subcommands.add_parser("seed", help="Create the MVP users and articles if they do not exist yet")
+    seed_command.set_defaults(func=seed)
+
+    rebuild = subcommands.add_parser("rebuild-rollups", help="Recompute the margin_rollups table from scratch")
+    rebuild.set_defaults(func=rebuild_rollups)
+
+    recommend = subcommands.add_parser("recompute-recommendations", help="Re-mark the best bid on every open PO")
+    recommend.set_defaults(func=recompute_recommendations)
+
+    close = subcommands.add_parser("close-auctions", help="Award the best valid bid on every PO past its bidding window")
+    close.add_argument("--cutoff", type=datetime.fromisoformat, help="Close POs created at or before this time (default: now - BIDDING_WINDOW_HOURS)")
+    close.set_defaults(func=close_auctions)
+
+    gc = subcommands.add_parser("gc-blobs", help="Delete proof photos that are no longer referenced")
+    gc.add_argument("--grace-hours", type=float, default=BLOB_GC_GRACE_HOURS, help="Keep blobs released more recently than this")
+    gc.set_defaults(func=gc_blobs)
+
+    pending = subcommands.add_parser("upload-pending", help="Upload bid proof photos still spooled on this host")
+    pending.set_defaults(func=upload_pending)
+
+    plans = subcommands.add_parser("check-query-plans", help="EXPLAIN the hot queries and fail on full table scans")
+    plans.set_defaults(func=check_plans)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
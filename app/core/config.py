@@ -6,18 +6,102 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Web routes use an async engine; by default DATABASE_URL with its driver swapped for asyncpg.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+# Connection pools (async and sync) per worker process: POOL_SIZE kept open, up to MAX_OVERFLOW more under bursts.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+# Seconds a request waits for a free connection before failing with a pool timeout.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Connections older than this are replaced, and pre-ping drops ones that died (e.g. after a failover).
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Server-side per-statement timeout (PostgreSQL only); 0 disables it.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
 SECRET_KEY = os.getenv("SECRET_KEY") # This will be None if not set
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
+# Verified tokens are cached per worker so authenticated requests skip the users lookup.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+# Role or username changes and deleted users (the shared 'users' version) reach every worker within this many seconds.
+AUTH_CACHE_CHECK_SECONDS = float(os.getenv("AUTH_CACHE_CHECK_SECONDS", 2))
+# pbkdf2_sha256 policy; stored hashes with a different round count are upgraded on next login.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 29000))
+# Password hashing runs in a dedicated thread pool; logins beyond MAX_PENDING are turned away.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER_NAME = "bluemarina-proofs"
+# Size of the shared connection pool used by the async blob uploader.
+AZURE_STORAGE_MAX_CONNECTIONS = int(os.getenv("AZURE_STORAGE_MAX_CONNECTIONS", 20))
+# Proof photos are streamed to blob storage in staged blocks of this size.
+UPLOAD_BLOCK_SIZE_BYTES = int(os.getenv("UPLOAD_BLOCK_SIZE_BYTES", 4 * 1024 * 1024))
+MAX_UPLOAD_SIZE_BYTES = int(os.getenv("MAX_UPLOAD_SIZE_MB", 15)) * 1024 * 1024
+# Where proof photos are stored: 'azure' (Blob Storage) or 'local' (a directory, for tests and on-prem runs).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "uploads")
+LOCAL_STORAGE_URL_PREFIX = os.getenv("LOCAL_STORAGE_URL_PREFIX", "/uploads")
+# Name blobs by the SHA-256 of their content so identical photos are uploaded and stored once.
+CONTENT_ADDRESSED_UPLOADS = os.getenv("CONTENT_ADDRESSED_UPLOADS", "true").lower() in ("1", "true", "yes")
+# Unreferenced content-addressed blobs are only garbage-collected after this long.
+BLOB_GC_GRACE_HOURS = float(os.getenv("BLOB_GC_GRACE_HOURS", 24))
+# Bid proof photos are spooled here and uploaded in the background, so submitting a bid doesn't wait on blob storage.
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "upload_spool")
+# Concurrent background uploads per worker.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+# A failed upload is retried after UPLOAD_RETRY_BASE_SECONDS, doubling each time, until UPLOAD_MAX_ATTEMPTS.
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", 5))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", 2))
+# On shutdown, wait this long for queued uploads; the rest are finished by 'python -m app.cli upload-pending'.
+UPLOAD_DRAIN_SECONDS = float(os.getenv("UPLOAD_DRAIN_SECONDS", 10))
+# Every worker sweeps for stranded uploads this often, starting one interval after boot.
+UPLOAD_RECOVERY_SECONDS = float(os.getenv("UPLOAD_RECOVERY_SECONDS", 60))
+# A pending upload no worker has touched for this long is resumed by a worker on the host holding its spool file...
+UPLOAD_STALE_SECONDS = float(os.getenv("UPLOAD_STALE_SECONDS", 600))
+# ...and after this long its host is taken to be gone with the spool file, and the bid is marked FAILED.
+UPLOAD_ORPHAN_SECONDS = float(os.getenv("UPLOAD_ORPHAN_SECONDS", 3600))
+# Bulk PO imports are committed in transactions of roughly this many line items.
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 2000))
+# How often a worker re-checks the shared rates version before trusting its cached rates.
+RATE_CACHE_CHECK_SECONDS = float(os.getenv("RATE_CACHE_CHECK_SECONDS", 5))
+# Rendered admin/purchaser pages are cached per user under the data version counters they depend on.
+FRAGMENT_CACHE_ENABLED = os.getenv("FRAGMENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 1000))
+FRAGMENT_CACHE_TTL_SECONDS = float(os.getenv("FRAGMENT_CACHE_TTL_SECONDS", 300))
+# Versions bumped by other workers are noticed within this many seconds; the writing worker sees them at once.
+FRAGMENT_CACHE_CHECK_SECONDS = float(os.getenv("FRAGMENT_CACHE_CHECK_SECONDS", 2))
+# Optional shared backend (needs the redis package), e.g. redis://cache:6379/0; in-memory per worker when unset.
+FRAGMENT_CACHE_REDIS_URL = os.getenv("FRAGMENT_CACHE_REDIS_URL")
+# The auction-close job awards POs whose bidding window has passed.
+BIDDING_WINDOW_HOURS = float(os.getenv("BIDDING_WINDOW_HOURS", 24))
+# Each worker checks for line items opened by other workers this often to feed the live purchaser stream.
+LIVE_FEED_POLL_SECONDS = float(os.getenv("LIVE_FEED_POLL_SECONDS", 2))
+# Per-request JSON logs (logger 'app.requests') are emitted at INFO.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# When set, GET /metrics requires 'Authorization: Bearer <METRICS_TOKEN>'.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Development/CI mode: unplanned lazy loads on POs, line items and bids raise, and so does
+# the first SQL statement past a route's declared query budget. Off in production, where
+# budget overruns are only logged and counted in /metrics.
+STRICT_DB_CHECKS = os.getenv("STRICT_DB_CHECKS", "false").lower() in ("1", "true", "yes")
+# Opt-in request profiling (needs pyinstrument). When enabled, admins profile a request by sending
+# 'X-Profile: 1', and PROFILE_SAMPLE_RATE of all requests are profiled too. Disabled, it costs nothing.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 1))
+# Speedscope profiles are written here; only the newest PROFILE_MAX_FILES are kept.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
 
 # --- THIS IS THE CRITICAL FIX ---
 # Add this sanity check. It will crash the app with a clear error if the key is missing.
 if not SECRET_KEY or not isinstance(SECRET_KEY, str):
     raise RuntimeError("FATAL_ERROR: SECRET_KEY environment variable is not set!")
-if not AZURE_STORAGE_CONNECTION_STRING:
+if STORAGE_BACKEND == "azure" and not AZURE_STORAGE_CONNECTION_STRING:
     raise RuntimeError("FATAL_ERROR: AZURE_STORAGE_CONNECTION_STRING environment variable is not set!")
+if STORAGE_BACKEND not in ("azure", "local"):
+    raise RuntimeError(f"FATAL_ERROR: STORAGE_BACKEND must be 'azure' or 'local', not {STORAGE_BACKEND!r}")
 
 # --------------------------------
 
@@ -0,0 +1,223 @@
+# app/core/instrumentation.py
+# Per-request timings (SQL, blob upload, template render) for Server-Timing headers,
+# structured request logs and the Prometheus /metrics endpoint.
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+from app.core.config import STRICT_DB_CHECKS
+
+logger = logging.getLogger("app.requests")
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in STRICT_DB_CHECKS mode by the first statement past a route's query budget."""
+
+def query_budget(max_queries: int):
+    """
+    Declares the most SQL statements one request to the decorated route may run,
+    counting the user lookup on an auth cache miss. Put it under the router decorator.
+    """
+    def decorate(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+def _route_budget(scope: dict) -> int | None:
+    return getattr(getattr(scope.get("route"), "endpoint", None), "query_budget", None)
+
+def _route_label(scope: dict) -> str:
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+@dataclass
+class RequestTimings:
+    scope: dict = field(default_factory=dict)
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    # Named timers such as 'upload' and 'render', in seconds
+    timers: dict[str, float] = field(default_factory=dict)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+def current_timings() -> RequestTimings | None:
+    return _current.get()
+
+@contextmanager
+def timed(name: str):
+    """Adds the wall time of the block to the current request's named timer (no-op outside a request)."""
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.timers[name] = timings.timers.get(name, 0.0) + time.perf_counter() - start
+
+# --- SQL ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if STRICT_DB_CHECKS:
+        timings = _current.get()
+        budget = _route_budget(timings.scope) if timings is not None else None
+        if budget is not None and timings.db_queries >= budget:
+            raise QueryBudgetExceeded(
+                f"{_route_label(timings.scope)} exceeded its budget of {budget} queries with: {statement[:200]}"
+            )
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+def _handle_error(exception_context):
+    # Keep the start-time stack balanced when a statement fails
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine) -> None:
+    """Attributes every statement run on engine (sync, or an AsyncEngine's sync_engine) to the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+# --- Templates ---
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates whose renders count towards the request's 'render' timer."""
+    def TemplateResponse(self, *args, **kwargs):
+        with timed("render"):
+            return super().TemplateResponse(*args, **kwargs)
+
+# --- Metrics registry ---
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.observations += 1
+
+class RequestMetrics:
+    """In-process, per-worker request metrics rendered in the Prometheus text format."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {} # (method, route, status) -> count
+        self._over_budget = {} # (method, route) -> count
+        self._histograms = {} # (metric, method, route) -> Histogram
+
+    def _observe(self, metric: str, method: str, route: str, value: float, buckets: tuple) -> None:
+        histogram = self._histograms.get((metric, method, route))
+        if histogram is None:
+            histogram = self._histograms[(metric, method, route)] = Histogram(buckets)
+        histogram.observe(value)
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, timings: RequestTimings) -> None:
+        with self._lock:
+            key = (method, route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._observe("http_request_duration_seconds", method, route, duration, SECONDS_BUCKETS)
+            self._observe("http_request_db_seconds", method, route, timings.db_seconds, SECONDS_BUCKETS)
+            self._observe("http_request_db_queries", method, route, timings.db_queries, QUERY_COUNT_BUCKETS)
+            for name, seconds in timings.timers.items():
+                self._observe(f"http_request_{name}_seconds", method, route, seconds, SECONDS_BUCKETS)
+            budget = _route_budget(timings.scope)
+            if budget is not None and timings.db_queries > budget:
+                self._over_budget[(method, route)] = self._over_budget.get((method, route), 0) + 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ["# TYPE http_requests_total counter"]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            lines.append("# TYPE http_request_query_budget_exceeded_total counter")
+            for (method, route), count in sorted(self._over_budget.items()):
+                lines.append(f'http_request_query_budget_exceeded_total{{method="{method}",route="{route}"}} {count}')
+
+            by_metric = {}
+            for (metric, method, route), histogram in self._histograms.items():
+                by_metric.setdefault(metric, []).append((method, route, histogram))
+            for metric, series in sorted(by_metric.items()):
+                lines.append(f"# TYPE {metric} histogram")
+                for method, route, histogram in sorted(series, key=lambda s: (s[1], s[0])):
+                    labels = f'method="{method}",route="{route}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.observations}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.total:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.observations}")
+            return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+# --- Middleware ---
+def _server_timing(timings: RequestTimings, elapsed: float) -> str:
+    parts = [f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.db_queries} queries"']
+    parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.timers.items()]
+    parts.append(f"app;dur={elapsed * 1000:.1f}")
+    return ", ".join(parts)
+
+class InstrumentationMiddleware:
+    """
+    Pure ASGI middleware (so streaming responses and context variables pass through untouched).
+    Adds a Server-Timing header, logs one JSON line per request and feeds request_metrics.
+    Routes are labelled by their path template, e.g. /po/{po_id}, to keep label cardinality bounded.
+    Requests that run more statements than their route's query_budget are logged and counted.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings(scope=scope)
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            duration = time.perf_counter() - start
+            route = _route_label(scope)
+            request_metrics.observe_request(scope["method"], route, status, duration, timings)
+            logger.info(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration * 1000, 1),
+                "db_queries": timings.db_queries,
+                "db_ms": round(timings.db_seconds * 1000, 1),
+                **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in timings.timers.items()},
+            }))
+            budget = _route_budget(scope)
+            if budget is not None and timings.db_queries > budget:
+                logger.warning("%s %s ran %d queries, over its budget of %d", scope["method"], route, timings.db_queries, budget)
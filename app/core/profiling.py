@@ -0,0 +1,97 @@
+# app/core/profiling.py
+# On-demand sampling profiles of single requests, written as speedscope files (https://www.speedscope.app).
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from starlette.requests import Request
+from app.auth import role_of_token
+from app.core.config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE
+
+logger = logging.getLogger("app.profiling")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_SUFFIX = ".speedscope.json"
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+
+def _prune(directory: str, keep: int) -> None:
+    # File names start with a UTC timestamp, so name order is age order
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX))
+    for name in profiles[:max(len(profiles) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass # Another worker pruned it first
+
+def _write_profile(session, path: str, directory: str, keep: int) -> None:
+    from pyinstrument.renderers import SpeedscopeRenderer
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as fh:
+        fh.write(SpeedscopeRenderer().render(session))
+    _prune(directory, keep)
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles selected requests with pyinstrument: those an admin sends
+    with 'X-Profile: 1', plus a random sample_rate share of all requests. Each profile is written
+    to directory and named in the X-Profile-File response header.
+
+    Sampling follows the request's task across awaits, so async routes (including ORM work run
+    through AsyncSession.run_sync) are covered; sync routes run on the threadpool and only show
+    up as time spent waiting. A worker profiles one request at a time, others pass through.
+    """
+    def __init__(
+        self, app, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+        max_files: int = PROFILE_MAX_FILES, interval_ms: float = PROFILE_INTERVAL_MS,
+    ):
+        from pyinstrument import Profiler # Imported here so the dependency is only needed when profiling is enabled
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.interval = interval_ms / 1000
+        self._profiler_class = Profiler
+        self._busy = threading.Lock()
+
+    def _requested_by_admin(self, scope) -> bool:
+        if not any(name == PROFILE_HEADER and value == b"1" for name, value in scope["headers"]):
+            return False
+        token = Request(scope).cookies.get("access_token")
+        return token is not None and role_of_token(token) == "admin"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        selected = self._requested_by_admin(scope) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not selected or not self._busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        try:
+            started_at = datetime.now(timezone.utc)
+            name = f"{started_at:%Y%m%dT%H%M%S.%f}-{scope['method']}-{_slug(scope['path'])}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+            async def send_with_profile_name(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-file", name.encode())]}
+                await send(message)
+
+            profiler = self._profiler_class(interval=self.interval, async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_with_profile_name)
+            finally:
+                session = profiler.stop()
+                path = os.path.join(self.directory, name)
+                try:
+                    await asyncio.to_thread(_write_profile, session, path, self.directory, self.max_files)
+                    logger.info("Profiled %s %s in %.1f ms: %s", scope["method"], scope["path"], session.duration * 1000, path)
+                except OSError:
+                    logger.exception("Could not write profile %s", path)
+        finally:
+            self._busy.release()
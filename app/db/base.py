@@ -1,11 +1,58 @@
 # app/db/base.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE_SECONDS, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS,
+)
+from app.db.pool import TimedAsyncQueuePool, TimedQueuePool
 
-engine = create_engine(DATABASE_URL)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_url_for(url: str):
+    """DATABASE_URL with its driver swapped for the async one (psycopg2's sslmode becomes asyncpg's ssl)."""
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name())
+    if drivername is None:
+        return url
+    query = dict(url.query)
+    if drivername == "postgresql+asyncpg" and "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return url.set(drivername=drivername, query=query)
+
+def _engine_options(url, poolclass) -> dict:
+    """Pool and connection settings from config. In-memory SQLite keeps SQLAlchemy's default pool."""
+    url = make_url(url)
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE_SECONDS}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if url.get_backend_name() == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+# Sync engine: CLI jobs, the live-feed watcher and the bulk import, which run off the event loop.
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: web routes, so requests waiting on the database don't hold the event loop.
+# expire_on_commit=False: expired attributes can't be reloaded lazily without an await.
+_async_url = ASYNC_DATABASE_URL or async_url_for(DATABASE_URL)
+async_engine = create_async_engine(_async_url, **_engine_options(_async_url, TimedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +60,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,11 +1,16 @@
 # app/db/models.py
 import enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, UniqueConstraint, text
 # REMOVED: No longer need the Enum type from sqlalchemy
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from app.core.config import STRICT_DB_CHECKS
 from app.db.base import Base
 
+# Loader strategy for the PO / line item / bid relationships. Routes eager-load what they
+# render; in strict mode anything else raises instead of silently issuing one query per row.
+LAZY = "raise_on_sql" if STRICT_DB_CHECKS else "select"
+
 class UserRole(enum.Enum):
     store = "store"
     purchaser = "purchaser"
@@ -18,6 +23,7 @@ class POStatus(enum.Enum):
     IN_LOGISTICS = "IN_LOGISTICS"
     DELIVERED = "DELIVERED"
     COMPLETED = "COMPLETED"
+    UNFILLED = "UNFILLED" # Bidding closed (close_auctions) without a valid bid on any line item
 
 class BidStatus(enum.Enum):
     PENDING = "PENDING"
@@ -25,6 +31,11 @@ class BidStatus(enum.Enum):
     APPROVED = "APPROVED"
     REJECTED = "REJECTED"
 
+class ProofStatus(enum.Enum):
+    PENDING = "PENDING" # Photo spooled, upload queued (see PendingUpload)
+    UPLOADED = "UPLOADED"
+    FAILED = "FAILED" # Gave up after UPLOAD_MAX_ATTEMPTS, or the spool file was lost; 'python -m app.cli upload-pending' retries it if not
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -42,11 +53,26 @@ class Article(Base):
 
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
+    # Indexes match the dashboards' keyset order (created_at, id) for each filter
+    __table_args__ = (
+        Index("ix_purchase_orders_store_created", "store_id", "created_at", "id"),
+        Index("ix_purchase_orders_status_created", "status", "created_at", "id"),
+        # Only POs open for bidding: purchaser dashboard, live feed and auction close
+        Index(
+            "ix_purchase_orders_pending_bids_created", "created_at", "id",
+            postgresql_where=text("status = 'PENDING_BIDS'"),
+            sqlite_where=text("status = 'PENDING_BIDS'"),
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     po_number = Column(String, unique=True, index=True)
     status = Column(String(50), default=POStatus.PENDING_BIDS.value)
     store_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Counters kept in step with line items and approvals, so promoting a PO is an O(1) check
+    line_item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    approved_item_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # --- ADD THESE NEW LOGISTICS FIELDS ---
     assigned_driver = Column(String, nullable=True)
@@ -57,38 +83,46 @@ class PurchaseOrder(Base):
     grn_notes = Column(String, nullable=True)
     # ------------------------------------
     
-    store = relationship("User")
-    line_items = relationship("OrderLineItem", back_populates="purchase_order")
+    store = relationship("User", lazy=LAZY)
+    line_items = relationship("OrderLineItem", back_populates="purchase_order", lazy=LAZY)
 
 class OrderLineItem(Base):
     __tablename__ = "order_line_items"
     id = Column(Integer, primary_key=True, index=True)
-    po_id = Column(Integer, ForeignKey("purchase_orders.id"))
+    po_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
     article_id = Column(Integer, ForeignKey("articles.id"))
     requested_quantity = Column(Float)
     allocated_quantity = Column(Float, nullable=True)
     locked_rate = Column(Float)
     
-    purchase_order = relationship("PurchaseOrder", back_populates="line_items")
-    article = relationship("Article")
-    bids = relationship("Bid", back_populates="line_item")
+    purchase_order = relationship("PurchaseOrder", back_populates="line_items", lazy=LAZY)
+    article = relationship("Article", lazy=LAZY)
+    bids = relationship("Bid", back_populates="line_item", lazy=LAZY)
 
 class Bid(Base):
     __tablename__ = "bids"
+    __table_args__ = (
+        Index("ix_bids_line_item_status", "line_item_id", "status"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     line_item_id = Column(Integer, ForeignKey("order_line_items.id"))
     purchaser_id = Column(Integer, ForeignKey("users.id"))
     bid_rate = Column(Float)
-    proof_photo_url = Column(String)
+    proof_photo_url = Column(String) # NULL until the background upload completes
+    proof_status = Column(String(20), nullable=False, default=ProofStatus.UPLOADED.value, server_default=ProofStatus.UPLOADED.value)
     # THE FIX: Change Enum to String, provide a length
     status = Column(String(50), default=BidStatus.PENDING.value)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    line_item = relationship("OrderLineItem", back_populates="bids")
-    purchaser = relationship("User")
+    line_item = relationship("OrderLineItem", back_populates="bids", lazy=LAZY)
+    purchaser = relationship("User", lazy=LAZY)
 
 class WeeklyRateLock(Base):
     __tablename__ = "weekly_rate_locks"
+    # One locked rate per article and week; also serves the current-week rate lookup
+    __table_args__ = (
+        UniqueConstraint("year", "week_number", "article_id", name="uq_weekly_rate_locks_week_article"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     article_id = Column(Integer, ForeignKey("articles.id"), nullable=False)
     selling_rate = Column(Float, nullable=False)
@@ -96,4 +130,89 @@ class WeeklyRateLock(Base):
     year = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    article = relationship("Article")
\ No newline at end of file
+    article = relationship("Article")
+
+class MarginRollup(Base):
+    """
+    Pre-summed quantities, revenue and cost per store, article and ISO week of the PO.
+    'approved_*' columns grow as bids are approved; 'delivered_*' and 'completed_*' hold
+    the POs currently in that status, each PO counted once in '*_pos'. Maintained by
+    app.services.rollups.
+    """
+    __tablename__ = "margin_rollups"
+    __table_args__ = (
+        UniqueConstraint("store_id", "article_id", "year", "week_number", name="uq_margin_rollups_store_article_week"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    article_id = Column(Integer, ForeignKey("articles.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    week_number = Column(Integer, nullable=False)
+    week_start = Column(Date, nullable=False) # Monday of the ISO week, used for date-range filters
+
+    approved_line_items = Column(Integer, nullable=False, default=0)
+    approved_quantity = Column(Float, nullable=False, default=0.0)
+    approved_revenue = Column(Float, nullable=False, default=0.0)
+    approved_cost = Column(Float, nullable=False, default=0.0)
+
+    delivered_pos = Column(Integer, nullable=False, default=0)
+    delivered_line_items = Column(Integer, nullable=False, default=0)
+    delivered_quantity = Column(Float, nullable=False, default=0.0)
+    delivered_revenue = Column(Float, nullable=False, default=0.0)
+    delivered_cost = Column(Float, nullable=False, default=0.0)
+
+    completed_pos = Column(Integer, nullable=False, default=0)
+    completed_line_items = Column(Integer, nullable=False, default=0)
+    completed_quantity = Column(Float, nullable=False, default=0.0)
+    completed_revenue = Column(Float, nullable=False, default=0.0)
+    completed_cost = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    store = relationship("User")
+    article = relationship("Article")
+
+class CacheVersion(Base):
+    """
+    Named counters bumped on writes, so each worker can tell whether its
+    in-process caches are stale with a single primary-key lookup.
+    """
+    __tablename__ = "cache_versions"
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class StoredBlob(Base):
+    """
+    A content-addressed proof photo in blob storage and how many bids / PO photo fields use it.
+    Maintained by app.services.uploads; blobs left unreferenced are removed by 'python -m app.cli gc-blobs'.
+    """
+    __tablename__ = "stored_blobs"
+    __table_args__ = (
+        Index("ix_stored_blobs_unreferenced", "updated_at", postgresql_where=text("ref_count = 0"), sqlite_where=text("ref_count = 0")),
+    )
+    name = Column(String(100), primary_key=True) # SHA-256 hex digest plus the original file extension
+    url = Column(String, nullable=False, unique=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String(100))
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Last time a reference was added or released; the GC grace period counts from here
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PendingUpload(Base):
+    """
+    A bid proof photo spooled to local disk and not yet in blob storage. Removed by
+    app.services.upload_queue once the photo is uploaded and the bid's proof_photo_url is set.
+    """
+    __tablename__ = "pending_uploads"
+    bid_id = Column(Integer, ForeignKey("bids.id", ondelete="CASCADE"), primary_key=True)
+    spool_path = Column(String, nullable=False)
+    spool_host = Column(String(255)) # Host whose UPLOAD_SPOOL_DIR holds the file
+    # Last time a worker took the upload on or attempted it; see UPLOAD_STALE_SECONDS
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
+    file_name = Column(String)
+    content_type = Column(String(100))
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,85 @@
+# app/db/pool.py
+import bisect
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (ms) of the checkout wait histogram buckets; anything slower lands in "+Inf".
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class PoolMetrics:
+    """Checkout wait-time histogram and timeout count for one worker's connection pool."""
+    def __init__(self, buckets_ms: tuple = WAIT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets_ms) + 1)
+            self._total_ms = 0.0
+            self._max_ms = 0.0
+            self._checkouts = 0
+            self._timeouts = 0
+
+    def observe(self, wait_ms: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets_ms, wait_ms)] += 1
+            self._total_ms += wait_ms
+            self._max_ms = max(self._max_ms, wait_ms)
+            self._checkouts += 1
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}" for bound in self.buckets_ms] + ["le_inf"]
+            return {
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_ms_avg": round(self._total_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                "wait_ms_max": round(self._max_ms, 3),
+                "wait_ms_histogram": dict(zip(labels, self._counts)),
+            }
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+    def __init__(self, *args, metrics: PoolMetrics | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timed_out()
+            raise
+        self.metrics.observe((time.perf_counter() - start) * 1000)
+        return connection
+
+    def recreate(self):
+        # Keep the same metrics when the pool is recreated (e.g. after engine.dispose()).
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for the async engine."""
+
+def pool_status(pool) -> dict:
+    """Current occupancy of a pool plus, for a TimedQueuePool, its wait metrics."""
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, TimedQueuePool):
+        status.update(pool.metrics.snapshot())
+    return status
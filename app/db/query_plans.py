@@ -0,0 +1,66 @@
+# app/db/query_plans.py
+# EXPLAIN checks for the hot queries, so a dropped or unused index shows up as a failing check.
+import re
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from app.db import models
+from app.services import pagination, purchase_orders
+
+# Tables big enough in production that a full scan on a hot path is a bug
+HOT_TABLES = {"purchase_orders", "order_line_items", "bids", "weekly_rate_locks"}
+
+def hot_queries() -> dict:
+    """The statements behind the dashboards, approve_bid and the rate lookup, with sample parameters."""
+    po, item, bid, rate = models.PurchaseOrder, models.OrderLineItem, models.Bid, models.WeeklyRateLock
+    page = pagination.DEFAULT_PAGE_SIZE + 1
+    return {
+        "store_dashboard": select(po).where(po.store_id == 1).order_by(po.created_at.desc(), po.id.desc()).limit(page),
+        "admin_dashboard": select(po).where(po.status == models.POStatus.APPROVED.value).order_by(
+            po.created_at.desc(), po.id.desc()
+        ).limit(page),
+        "purchaser_dashboard": purchase_orders.open_line_items_statement().order_by(
+            po.created_at.desc(), item.id.desc()
+        ).limit(page),
+        "po_line_items": select(item).where(item.po_id == 1),
+        "approved_bid_of_item": select(bid).where(bid.line_item_id == 1, bid.status == models.BidStatus.APPROVED.value),
+        "current_week_rates": select(models.Article.article_number, rate.selling_rate).join(rate.article).where(
+            rate.week_number == 1, rate.year == 2026
+        ),
+    }
+
+def _postgresql_seq_scans(plan: dict) -> set[str]:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan":
+        found.add(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found |= _postgresql_seq_scans(child)
+    return found
+
+def _seq_scans(db: Session, sql: str) -> set[str]:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        return _postgresql_seq_scans(plan[0]["Plan"])
+    if dialect == "sqlite":
+        # 'SCAN <table>' without 'USING ... INDEX' is a full table scan
+        details = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        return {match.group(1) for detail in details if (match := re.match(r"SCAN (\w+)$", detail))}
+    raise ValueError(f"Query plan checks are not supported on {dialect}")
+
+def check_query_plans(db: Session) -> dict[str, set[str]]:
+    """
+    Returns, per hot query, the hot tables it reads with a full scan (empty when it uses indexes).
+    On PostgreSQL sequential scans are disabled for the check, so a seq scan in the plan means
+    no usable index exists, not that the planner preferred one on a small table.
+    """
+    dialect = db.get_bind().dialect
+    try:
+        if dialect.name == "postgresql":
+            db.execute(text("SET LOCAL enable_seqscan = off"))
+        results = {}
+        for name, stmt in hot_queries().items():
+            sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            results[name] = _seq_scans(db, sql) & HOT_TABLES
+        return results
+    finally:
+        db.rollback()
@@ -1,35 +1,92 @@
 # app/main.py
+import logging
+import secrets
 from fastapi import FastAPI, Depends, Request, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.db import models
-from app.db.base import get_db, engine
+from app.db.base import async_engine, get_async_db, engine
 from app.web.routes import router as web_router
-from app.auth import create_access_token, get_password_hash, verify_password
+from app.web.api import router as api_router
+from app.auth import create_access_token, token_claims_for, password_hasher, PasswordHasherBusy
+from app.services.upload_queue import upload_queue
+from app.services.uploads import file_uploader
+from app.services.events import line_item_feed
+from app.services.fragment_cache import fragment_cache
 
-from app.core.config import ARTICLES
+from app.core.config import (
+    LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL_PREFIX, LOG_LEVEL, MAX_UPLOAD_SIZE_BYTES, METRICS_TOKEN, PROFILING_ENABLED, STORAGE_BACKEND,
+)
+from app.core.instrumentation import InstrumentationMiddleware, instrument_engine, query_budget, request_metrics
 
-# Create database tables on startup
-models.Base.metadata.create_all(bind=engine)
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
 app = FastAPI(title="Blue Marina MVP")
 
 # REMOVED: The old exception handler is no longer needed.
 
+# --- Upload Size Guard ---
+# Reject oversize multipart bodies from the Content-Length header before the form is parsed.
+# Chunked uploads without a length are still capped while streaming in FileUploader.
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length", "")
+    if content_type.startswith("multipart/form-data") and content_length.isdigit():
+        if int(content_length) > MAX_UPLOAD_SIZE_BYTES:
+            return PlainTextResponse("Upload too large", status_code=413)
+    return await call_next(request)
+
+# --- Request Profiling ---
+# Opt-in pyinstrument profiles of single requests; not installed at all unless PROFILING_ENABLED.
+if PROFILING_ENABLED:
+    from app.core.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
+# --- Request Instrumentation ---
+# Counts SQL statements and DB time per request (Server-Timing header, request log, /metrics).
+# Registered last so it wraps every other middleware.
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+app.add_middleware(InstrumentationMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Prometheus scrape endpoint; each worker reports its own requests."""
+    if METRICS_TOKEN and not secrets.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
 # --- Token Endpoint ---
 # This endpoint now handles the form submission, sets the cookie, and redirects.
 @app.post("/token", tags=["Auth"])
-async def login_for_access_token(response: RedirectResponse, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+@query_budget(2) # the user lookup, plus the rehash UPDATE after a rounds change
+async def login_for_access_token(response: RedirectResponse, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.scalars(select(models.User).where(models.User.username == form_data.username))).first()
+    if not user:
         # If login fails, redirect back to login page with an error message
         return RedirectResponse(url="/login?error=1", status_code=status.HTTP_302_FOUND)
 
+    # pbkdf2 is CPU-heavy, so it runs on the bounded hashing pool instead of the event loop
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many logins in progress, please retry")
+    if not valid:
+        return RedirectResponse(url="/login?error=1", status_code=status.HTTP_302_FOUND)
+
+    # Transparently upgrade hashes created under an older rounds policy
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}
+        data=token_claims_for(user)
     )
     
     # Create a redirect response to the dashboard
@@ -41,26 +98,33 @@ async def login_for_access_token(response: RedirectResponse, form_data: OAuth2Pa
 
 # --- Include Web Routes ---
 app.include_router(web_router)
+app.include_router(api_router)
+
+# --- Proof photos stored on local disk (STORAGE_BACKEND=local) ---
+if STORAGE_BACKEND == "local":
+    app.mount(LOCAL_STORAGE_URL_PREFIX, StaticFiles(directory=LOCAL_STORAGE_DIR, check_dir=False), name="uploads")
 
-# --- On-the-fly User Creation for MVP ---
+# --- Sweep for proof uploads stranded by a restart; the first pass runs after boot, not during it ---
 @app.on_event("startup")
-def seed_initial_data():
-    db = next(get_db())
-    # ... (user creation logic remains the same)
-    if not db.query(models.User).filter(models.User.username == "metro").first():
-        user = models.User(username="metro", hashed_password=get_password_hash("password"), role=models.UserRole.store.value)
-        db.add(user)
-    if not db.query(models.User).filter(models.User.username == "buyer1").first():
-        user = models.User(username="buyer1", hashed_password=get_password_hash("password"), role=models.UserRole.purchaser.value)
-        db.add(user)
-    if not db.query(models.User).filter(models.User.username == "admin").first():
-        user = models.User(username="admin", hashed_password=get_password_hash("password"), role=models.UserRole.admin.value)
-        db.add(user)
-
-    if db.query(models.Article).count() == 0:
-        for article_data in ARTICLES:
-            article = models.Article(**article_data)
-            db.add(article)
-
-    db.commit()
-    db.close()
\ No newline at end of file
+async def start_upload_recovery():
+    upload_queue.start_recovery()
+
+# --- Let queued proof uploads finish before the storage transport closes ---
+@app.on_event("shutdown")
+async def close_upload_queue():
+    await upload_queue.close()
+
+# --- Release the pooled blob storage transport on shutdown ---
+@app.on_event("shutdown")
+async def close_file_uploader():
+    await file_uploader.close()
+
+# --- Stop the live feed watcher on shutdown ---
+@app.on_event("shutdown")
+async def close_line_item_feed():
+    await line_item_feed.close()
+
+# --- Close the shared page cache connection on shutdown ---
+@app.on_event("shutdown")
+async def close_fragment_cache():
+    await fragment_cache.close()
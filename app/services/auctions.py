@@ -0,0 +1,178 @@
+# app/services/auctions.py
+# Closing auctions in bulk: the best valid bid on each open line item wins when the bidding window ends.
+from datetime import datetime
+import numpy as np
+from sqlalchemy import and_, bindparam, exists, select, update
+from sqlalchemy.orm import Session, aliased
+from app.db import models
+from app.services import rollups, versions
+
+# Keeps IN (...) lists well under driver parameter limits.
+UPDATE_CHUNK_SIZE = 5000
+
+def _chunks(values: list, size: int = UPDATE_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def pick_winning_bids(item_ids, bid_ids, rates, locked_rates) -> np.ndarray:
+    """
+    Returns indices (into the input arrays) of the lowest valid bid per line item.
+    Vectorized equivalent of recommend_bids_for_po: bids outside the +/-30% guardrail of
+    validate_bid are ignored and ties go to the earliest (lowest id) bid.
+    """
+    valid = np.flatnonzero((rates >= locked_rates * 0.70) & (rates <= locked_rates * 1.30))
+    if valid.size == 0:
+        return valid
+    # Sort by item, then rate, then bid id; the first row of each item group is its winner.
+    order = valid[np.lexsort((bid_ids[valid], rates[valid], item_ids[valid]))]
+    _, first = np.unique(item_ids[order], return_index=True)
+    return order[first]
+
+def smart_allocations(requested, locked_rates, rates) -> np.ndarray:
+    """Vectorized calculate_smart_allocation."""
+    return np.where(
+        rates <= locked_rates * 0.7, requested,      # Rule 1: much cheaper -> full quantity
+        np.where(rates > locked_rates, requested * 0.10, requested)  # Rule 2: dearer -> 10%, Rule 3: normal fill
+    )
+
+def close_auctions(db: Session, cutoff: datetime) -> dict:
+    """
+    Closes bidding on every PENDING_BIDS PO created at or before cutoff.
+    On each open line item the lowest valid bid is APPROVED, the item's other bids are
+    REJECTED and the smart allocation is stored. Items left without a valid bid are closed
+    unfilled: their bids are REJECTED and their allocated_quantity set to 0. POs with at
+    least one approved item move to APPROVED, the rest to UNFILLED, so no PO stays open past
+    its deadline. The POs and then their line items are locked against concurrent approve_bid
+    calls, in id order, and everything is written with set-based UPDATEs; the caller commits.
+    """
+    # Same lock order as approve_bid: PO rows first, then line items
+    locked_po_ids = db.scalars(
+        select(models.PurchaseOrder.id).where(
+            models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value,
+            models.PurchaseOrder.created_at <= cutoff,
+        ).order_by(models.PurchaseOrder.id).with_for_update()
+    ).all()
+    if not locked_po_ids:
+        return {"line_items_awarded": 0, "line_items_unfilled": 0, "purchase_orders_approved": 0, "purchase_orders_unfilled": 0}
+    for chunk in _chunks(locked_po_ids):
+        db.execute(
+            select(models.OrderLineItem.id).where(models.OrderLineItem.po_id.in_(chunk))
+            .order_by(models.OrderLineItem.id).with_for_update()
+        )
+
+    awarded = _award_winning_bids(db, cutoff, locked_po_ids[-1])
+    result = {"line_items_awarded": awarded, **_close_purchase_orders(db, locked_po_ids)}
+    versions.bump_version(db, versions.OPEN_LINE_ITEMS)
+    versions.bump_version(db, versions.PO_PROGRESS)
+    return result
+
+def _award_winning_bids(db: Session, cutoff: datetime, last_po_id: int) -> int:
+    """Approves the best valid bid on each open item of the locked POs; returns the number of items awarded."""
+    approved_bid = aliased(models.Bid)
+    rows = db.execute(
+        select(
+            models.Bid.id, models.Bid.line_item_id, models.Bid.bid_rate,
+            models.OrderLineItem.locked_rate, models.OrderLineItem.requested_quantity,
+            models.OrderLineItem.article_id, models.OrderLineItem.po_id,
+            models.PurchaseOrder.store_id, models.PurchaseOrder.created_at,
+        ).join(
+            models.OrderLineItem, models.OrderLineItem.id == models.Bid.line_item_id
+        ).join(
+            models.PurchaseOrder, models.PurchaseOrder.id == models.OrderLineItem.po_id
+        ).where(
+            models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value,
+            models.PurchaseOrder.created_at <= cutoff,
+            models.PurchaseOrder.id <= last_po_id, # POs created since they were locked are left for the next run
+            models.Bid.status.in_([models.BidStatus.PENDING.value, models.BidStatus.RECOMMENDED.value]),
+            ~exists().where(and_(
+                approved_bid.line_item_id == models.Bid.line_item_id,
+                approved_bid.status == models.BidStatus.APPROVED.value,
+            )),
+        )
+    ).all()
+    if not rows:
+        return 0
+
+    bid_ids, item_ids, rates, locked_rates, requested, article_ids, po_ids, store_ids, created_ats = zip(*rows)
+    bid_ids = np.asarray(bid_ids, dtype=np.int64)
+    item_ids = np.asarray(item_ids, dtype=np.int64)
+    rates = np.asarray(rates, dtype=np.float64)
+    locked_rates = np.asarray(locked_rates, dtype=np.float64)
+    requested = np.asarray(requested, dtype=np.float64)
+
+    winners = pick_winning_bids(item_ids, bid_ids, rates, locked_rates)
+    if winners.size == 0:
+        return 0
+    allocations = smart_allocations(requested[winners], locked_rates[winners], rates[winners])
+
+    winner_bid_ids = bid_ids[winners].tolist()
+    awarded_item_ids = item_ids[winners].tolist()
+
+    for chunk in _chunks(awarded_item_ids):
+        db.execute(
+            update(models.Bid).where(models.Bid.line_item_id.in_(chunk)).values(status=models.BidStatus.REJECTED.value),
+            execution_options={"synchronize_session": False},
+        )
+    for chunk in _chunks(winner_bid_ids):
+        db.execute(
+            update(models.Bid).where(models.Bid.id.in_(chunk)).values(status=models.BidStatus.APPROVED.value),
+            execution_options={"synchronize_session": False},
+        )
+    # Bulk UPDATE by primary key (executemany)
+    db.execute(update(models.OrderLineItem), [
+        {"id": item_id, "allocated_quantity": quantity}
+        for item_id, quantity in zip(awarded_item_ids, allocations.tolist())
+    ])
+
+    # Plain floats: psycopg2 cannot adapt numpy scalars
+    winner_locked_rates = locked_rates[winners].tolist()
+    winner_rates = rates[winners].tolist()
+    rollups.record_bulk_approvals(db, (
+        (store_ids[i], article_ids[i], created_ats[i], quantity, locked_rate, rate)
+        for i, quantity, locked_rate, rate in zip(winners.tolist(), allocations.tolist(), winner_locked_rates, winner_rates)
+    ))
+
+    # Bump each PO's approved-item counter
+    touched_po_ids, awarded_counts = np.unique(np.asarray(po_ids, dtype=np.int64)[winners], return_counts=True)
+    db.execute(
+        update(models.PurchaseOrder.__table__).where(
+            models.PurchaseOrder.__table__.c.id == bindparam("po_id")
+        ).values(approved_item_count=models.PurchaseOrder.__table__.c.approved_item_count + bindparam("awarded")),
+        [{"po_id": po_id, "awarded": count} for po_id, count in zip(touched_po_ids.tolist(), awarded_counts.tolist())]
+    )
+    return len(winner_bid_ids)
+
+def _close_purchase_orders(db: Session, po_ids: list[int]) -> dict:
+    """Closes the items still without an approved bid, then moves every PO out of PENDING_BIDS."""
+    approved_bid = aliased(models.Bid)
+    has_approved_bid = exists().where(and_(
+        approved_bid.line_item_id == models.OrderLineItem.id,
+        approved_bid.status == models.BidStatus.APPROVED.value,
+    ))
+    counts = {"line_items_unfilled": 0, "purchase_orders_approved": 0, "purchase_orders_unfilled": 0}
+    for chunk in _chunks(po_ids):
+        unfilled_items = select(models.OrderLineItem.id).where(models.OrderLineItem.po_id.in_(chunk), ~has_approved_bid)
+        db.execute(
+            update(models.Bid).where(
+                models.Bid.line_item_id.in_(unfilled_items),
+                models.Bid.status.in_([models.BidStatus.PENDING.value, models.BidStatus.RECOMMENDED.value]),
+            ).values(status=models.BidStatus.REJECTED.value),
+            execution_options={"synchronize_session": False},
+        )
+        counts["line_items_unfilled"] += db.execute(
+            update(models.OrderLineItem).where(models.OrderLineItem.po_id.in_(chunk), ~has_approved_bid).values(allocated_quantity=0),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        for status, key, filled in (
+            (models.POStatus.APPROVED.value, "purchase_orders_approved", models.PurchaseOrder.approved_item_count > 0),
+            (models.POStatus.UNFILLED.value, "purchase_orders_unfilled", models.PurchaseOrder.approved_item_count == 0),
+        ):
+            counts[key] += db.execute(
+                update(models.PurchaseOrder).where(
+                    models.PurchaseOrder.id.in_(chunk),
+                    models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value,
+                    filled,
+                ).values(status=status),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+    return counts
@@ -1,24 +1,96 @@
 # app/services/azure_blob_service.py
-import uuid
-from azure.storage.blob import BlobServiceClient
-from app.core.config import AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME
+import asyncio
+import base64
+from typing import TYPE_CHECKING, AsyncIterator
+from app.core.config import (
+    AZURE_STORAGE_CONNECTION_STRING,
+    AZURE_STORAGE_CONTAINER_NAME,
+    AZURE_STORAGE_MAX_CONNECTIONS,
+)
+from app.services.storage import BlobStorage
 
-class FileUploader:
+# The Azure SDK and aiohttp take about half a second to import, so they are only
+# imported once the first upload needs them, not on every worker boot.
+if TYPE_CHECKING:
+    from azure.storage.blob.aio import BlobServiceClient
+
+class AzureBlobStorage(BlobStorage):
     def __init__(self):
-        self.blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
         self.container_name = AZURE_STORAGE_CONTAINER_NAME
+        self._blob_service_client = None
+        self._container_ready = False
+        self._container_lock = asyncio.Lock()
+
+    @property
+    def blob_service_client(self) -> "BlobServiceClient":
+        # Built lazily so the aiohttp session is bound to the running event loop.
+        # One client (and one pooled transport) is shared by every upload.
+        if self._blob_service_client is None:
+            import aiohttp
+            from azure.core.pipeline.transport import AioHttpTransport
+            from azure.storage.blob.aio import BlobServiceClient
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=AZURE_STORAGE_MAX_CONNECTIONS))
+            self._blob_service_client = BlobServiceClient.from_connection_string(
+                AZURE_STORAGE_CONNECTION_STRING,
+                transport=AioHttpTransport(session=session, session_owner=True),
+            )
+        return self._blob_service_client
+
+    async def _ensure_container(self) -> None:
+        # Only the first upload per process pays for the create_container round-trip.
+        if self._container_ready:
+            return
+        async with self._container_lock:
+            if self._container_ready:
+                return
+            from azure.core.exceptions import ResourceExistsError
+            try:
+                await self.blob_service_client.create_container(self.container_name)
+            except ResourceExistsError:
+                pass # Container already exists
+            self._container_ready = True
+
+    def _blob_client(self, name: str):
+        return self.blob_service_client.get_blob_client(container=self.container_name, blob=name)
+
+    async def exists(self, name: str) -> bool:
+        await self._ensure_container()
+        return await self._blob_client(name).exists()
 
-    def upload_file(self, file_content: bytes, file_name: str) -> str:
-        unique_filename = f"{uuid.uuid4()}-{file_name}"
-        blob_client = self.blob_service_client.get_blob_client(container=self.container_name, blob=unique_filename)
-        
-        # Create container if it doesn't exist
+    async def put(self, name: str, chunks: AsyncIterator[bytes], content_type: str | None) -> None:
+        """
+        Streams the blob one block at a time (put-block / put-block-list), so memory use per
+        upload is bounded by the chunk size rather than the file size. Blocks staged by an
+        upload that fails before the final commit are discarded by Azure.
+        """
+        from azure.storage.blob import BlobBlock, ContentSettings
+        await self._ensure_container()
+        blob_client = self._blob_client(name)
+
+        block_list = []
+        async for chunk in chunks:
+            # Block ids must all have the same length within a blob.
+            block_id = base64.b64encode(f"{len(block_list):08d}".encode()).decode()
+            await blob_client.stage_block(block_id, chunk, length=len(chunk))
+            block_list.append(BlobBlock(block_id=block_id))
+
+        await blob_client.commit_block_list(
+            block_list,
+            content_settings=ContentSettings(content_type=content_type),
+        )
+
+    async def delete(self, name: str) -> None:
+        from azure.core.exceptions import ResourceNotFoundError
         try:
-            self.blob_service_client.create_container(self.container_name)
-        except Exception:
-            pass # Container already exists
-        
-        blob_client.upload_blob(file_content, overwrite=True)
-        return blob_client.url
-
-file_uploader = FileUploader()
\ No newline at end of file
+            await self._blob_client(name).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    def url(self, name: str) -> str:
+        return self._blob_client(name).url
+
+    async def close(self) -> None:
+        if self._blob_service_client is not None:
+            await self._blob_service_client.close()
+            self._blob_service_client = None
+            self._container_ready = False
@@ -0,0 +1,136 @@
+# app/services/events.py
+# Server-sent events for the purchaser dashboard: one poller per worker fans line item changes out to subscribers.
+import asyncio
+import json
+import logging
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from app.core.config import LIVE_FEED_POLL_SECONDS
+from app.db import models
+from app.db.base import SessionLocal
+from app.services import purchase_orders, versions
+
+logger = logging.getLogger("app.events")
+
+# Events queued for a slow client beyond this are dropped; the client gets a 'refresh' instead.
+SUBSCRIBER_QUEUE_SIZE = 100
+# Longest wait between polls while the database keeps failing
+MAX_RETRY_SECONDS = 60.0
+# Keeps IN (...) lists of newly opened line items under driver parameter limits
+LOAD_CHUNK_SIZE = 1000
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _load_changes(last_version: int | None, seen_ids: set[int] | None) -> tuple[int, set[int], list[dict]]:
+    """
+    Reads the open_line_items version and, if it moved, the ids of all open line items.
+    Returns (version, open line item ids, the open items missing from seen_ids). With
+    seen_ids None this only takes the starting state and returns no items.
+    """
+    db = SessionLocal()
+    try:
+        version = versions.get_version(db, versions.OPEN_LINE_ITEMS)
+        if seen_ids is not None and version == last_version:
+            return version, seen_ids, []
+        # Compared as a set, not against the highest id seen: POs created concurrently can commit out of id order
+        open_ids = set(db.scalars(select(models.OrderLineItem.id).join(models.PurchaseOrder).where(
+            models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value
+        )))
+        if seen_ids is None:
+            return version, open_ids, []
+        new_ids = sorted(open_ids - seen_ids)
+        items = []
+        for start in range(0, len(new_ids), LOAD_CHUNK_SIZE):
+            items += db.scalars(purchase_orders.open_line_items_statement().where(
+                models.OrderLineItem.id.in_(new_ids[start:start + LOAD_CHUNK_SIZE])
+            ).order_by(models.OrderLineItem.id)).all()
+        return version, open_ids, [purchase_orders.line_item_to_dict(item) for item in items]
+    finally:
+        db.close()
+
+class LineItemFeed:
+    """
+    Per-worker fan-out for the purchaser live feed (Server-Sent Events).
+
+    One background task watches the shared 'open_line_items' version counter, so the
+    database sees one cheap lookup per worker per poll interval however many purchasers
+    are connected. When the counter moves (a PO was created, approved or closed by any
+    worker), the newly opened line items are loaded once and pushed to every subscriber.
+    Writes in this worker call notify() to push immediately instead of waiting for the poll.
+    """
+    def __init__(self, poll_interval: float = LIVE_FEED_POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._watch())
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def notify(self, event: str | None = None, data: dict | None = None) -> None:
+        """Thread-safe; called from sync routes after they commit."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._on_notify, event, data)
+
+    def _on_notify(self, event, data) -> None:
+        if event:
+            self._broadcast(event, data)
+        self._wake.set()
+
+    def _broadcast(self, event: str, data) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # The client fell behind; collapse its backlog into one 'refresh'.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("refresh", {}))
+
+    def _retry_delay(self, failures: int) -> float:
+        return min(self.poll_interval * 2 ** failures, MAX_RETRY_SECONDS)
+
+    async def _watch(self) -> None:
+        version, open_ids, failures = None, None, 0
+        while True:
+            if failures:
+                await asyncio.sleep(self._retry_delay(failures))
+            elif open_ids is not None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                if not self._subscribers:
+                    continue
+            try:
+                new_version, new_open_ids, items = await run_in_threadpool(_load_changes, version, open_ids)
+            except Exception:
+                failures += 1
+                logger.exception("Live feed poll failed %d time(s) in a row; retrying in %.1fs", failures, self._retry_delay(failures))
+                continue
+            failures = 0
+            if open_ids is not None and new_version != version:
+                if items:
+                    self._broadcast("line_items", items)
+                self._broadcast("version", {"version": new_version})
+            version, open_ids = new_version, new_open_ids
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+line_item_feed = LineItemFeed()
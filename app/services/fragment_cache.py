@@ -0,0 +1,141 @@
+# app/services/fragment_cache.py
+# Rendered-page cache for the read-heavy admin and purchaser views, versioned by the shared
+# cache_versions counters so a write anywhere invalidates every worker's copy.
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth import CurrentUser
+from app.core.config import (
+    FRAGMENT_CACHE_CHECK_SECONDS,
+    FRAGMENT_CACHE_ENABLED,
+    FRAGMENT_CACHE_REDIS_URL,
+    FRAGMENT_CACHE_SIZE,
+    FRAGMENT_CACHE_TTL_SECONDS,
+)
+from app.services import versions
+
+class MemoryBackend:
+    """Per-worker LRU of key -> rendered body; entries also expire after their ttl."""
+    def __init__(self, max_size: int = FRAGMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    async def set(self, key: str, body: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (body, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """Shared by every worker and host; Redis evicts entries itself once their ttl passes."""
+    def __init__(self, url: str, prefix: str = "fragment:"):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+
+    @property
+    def client(self):
+        # redis is an optional dependency, only imported when this backend is configured and used
+        if self._client is None:
+            import redis.asyncio
+            self._client = redis.asyncio.from_url(self.url)
+        return self._client
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, body: bytes, ttl: float) -> None:
+        await self.client.set(self.prefix + key, body, px=int(ttl * 1000))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class FragmentCache:
+    """
+    Caches rendered pages per user and URL under a stamp made of the version counters the page
+    depends on. Writes bump those counters (versions.bump_version), which changes the stamp, so
+    stale pages are never served and simply age out of the backend.
+
+    The counters are re-read at most once every check_interval seconds, so a cache hit costs no
+    database work at all. Versions bumped by this worker are forgotten as soon as the writing
+    transaction commits; other workers notice them within check_interval.
+    """
+    def __init__(
+        self, backend, ttl: float = FRAGMENT_CACHE_TTL_SECONDS,
+        check_interval: float = FRAGMENT_CACHE_CHECK_SECONDS, enabled: bool = FRAGMENT_CACHE_ENABLED,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._versions = {} # name -> (version, checked_at)
+
+    async def _stamp(self, db: AsyncSession, names: tuple[str, ...]) -> str:
+        now = time.monotonic()
+        with self._lock:
+            known = {name: self._versions.get(name) for name in names}
+        if any(entry is None or now - entry[1] >= self.check_interval for entry in known.values()):
+            current = await db.run_sync(versions.get_versions, names)
+            with self._lock:
+                self._versions.update((name, (version, now)) for name, version in current.items())
+        else:
+            current = {name: version for name, (version, _) in known.items()}
+        return ",".join(f"{name}={current[name]}" for name in names)
+
+    def forget_versions(self, names) -> None:
+        with self._lock:
+            for name in names:
+                self._versions.pop(name, None)
+
+    async def page(
+        self, request: Request, db: AsyncSession, user: CurrentUser, depends_on: tuple[str, ...], render, vary: str = "",
+    ) -> Response:
+        """
+        Returns the cached page for this user and URL if it was rendered under the current versions
+        of the depends_on counters; otherwise awaits render() and caches its response if it is a 200.
+        vary adds anything else the page depends on, such as the current week.
+        """
+        if not self.enabled:
+            return await render()
+
+        key = f"{user.id}:{user.role}:{request.url}:{vary}:{await self._stamp(db, depends_on)}"
+        body = await self.backend.get(key)
+        if body is not None:
+            return HTMLResponse(body, headers={"X-Fragment-Cache": "hit"})
+
+        response = await render()
+        if response.status_code == 200:
+            await self.backend.set(key, response.body, self.ttl)
+        response.headers["X-Fragment-Cache"] = "miss"
+        return response
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+fragment_cache = FragmentCache(RedisBackend(FRAGMENT_CACHE_REDIS_URL) if FRAGMENT_CACHE_REDIS_URL else MemoryBackend())
+
+versions.on_commit(fragment_cache.forget_versions)
@@ -22,6 +22,15 @@ def validate_bid(bid_rate: float, locked_rate: float) -> bool:
     upper_bound = locked_rate * 1.30
     return lower_bound <= bid_rate <= upper_bound
 
+def is_better_bid(bid_rate: float, locked_rate: float, best_rate: float | None) -> bool:
+    """
+    True if a new bid should replace the current recommendation: it must pass the
+    guardrail and be strictly cheaper than the current best (ties keep the earlier bid).
+    """
+    if not validate_bid(bid_rate, locked_rate):
+        return False
+    return best_rate is None or bid_rate < best_rate
+
 def recommend_bids_for_po(line_items: list) -> None:
     """
     Analyzes all bids for each line item in a PO and marks the best one as 'RECOMMENDED'.
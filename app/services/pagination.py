@@ -0,0 +1,54 @@
+# app/services/pagination.py
+# Keyset (created_at, id) pagination and date-range filters for the dashboard lists.
+import base64
+from datetime import date, datetime, timedelta
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+def clamp_page_size(page_size: int | None) -> int:
+    if not page_size or page_size < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(page_size, MAX_PAGE_SIZE)
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """Returns (created_at, id) or None for a missing or malformed cursor (i.e. the first page)."""
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def filter_created_between(stmt, created_col, date_from: date | None, date_to: date | None):
+    """Inclusive date range filter on a created_at column."""
+    if date_from:
+        stmt = stmt.where(created_col >= date_from)
+    if date_to:
+        stmt = stmt.where(created_col < date_to + timedelta(days=1))
+    return stmt
+
+async def keyset_page(db: AsyncSession, stmt, created_col, id_col, cursor: str | None, page_size: int, position_of=None):
+    """
+    Newest-first keyset pagination of a select() on (created_col, id_col).
+    position_of(row) gives the (created_at, id) of a result row, by default row.created_at/row.id.
+    Returns (rows, next_cursor); next_cursor is None on the last page. Every page costs
+    one index range scan no matter how deep it is, unlike OFFSET.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(*position))
+    rows = (await db.scalars(stmt.order_by(created_col.desc(), id_col.desc()).limit(page_size + 1))).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(*(position_of(last) if position_of else (last.created_at, last.id)))
+    return rows, next_cursor
@@ -0,0 +1,241 @@
+# app/services/purchase_orders.py
+# Creating purchase orders: line item resolution against the week's locked rates, and bulk CSV/JSON import.
+import csv
+import io
+import json
+import math
+import uuid
+from collections import defaultdict
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from app.auth import CurrentUser
+from app.db import models
+from app.services import versions
+from app.services.rates import rate_cache
+
+# Reasons a requested row is left out of a PO
+SKIP_INVALID_QUANTITY = "invalid quantity"
+SKIP_UNKNOWN_ARTICLE = "unknown article"
+SKIP_NO_LOCKED_RATE = "no locked rate this week"
+SKIP_MISSING_PO_REF = "missing po_ref"
+SKIP_UNKNOWN_STORE = "unknown store"
+SKIP_STORE_NOT_PERMITTED = "store not permitted"
+
+def new_po_number() -> str:
+    return f"PO-{uuid.uuid4().hex[:8].upper()}"
+
+def open_line_items_statement():
+    """
+    select() of the line items of PENDING_BIDS POs, with their PO and article loaded in the
+    same query. Runs on both the sync and the async session.
+    """
+    # contains_eager reuses the explicit PurchaseOrder join to populate item.purchase_order.
+    return select(models.OrderLineItem).join(models.PurchaseOrder).options(
+        contains_eager(models.OrderLineItem.purchase_order),
+        joinedload(models.OrderLineItem.article)
+    ).where(
+        models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value
+    )
+
+def line_item_to_dict(item: models.OrderLineItem) -> dict:
+    """JSON shape of an open line item for the purchaser API and live feed."""
+    return {
+        "id": item.id,
+        "po_id": item.po_id,
+        "po_number": item.purchase_order.po_number,
+        "article_number": item.article.article_number,
+        "article_name": item.article.name,
+        "unit": item.article.unit,
+        "requested_quantity": item.requested_quantity,
+        "created_at": item.purchase_order.created_at.isoformat() if item.purchase_order.created_at else None,
+    }
+
+def resolve_line_items(db: Session, rows: list[tuple[str, str]], rates: dict[str, float]) -> tuple[list[dict], list[dict]]:
+    """
+    Validates (article_number, quantity) rows against the article master and the week's
+    locked rates, resolving every article number with a single IN query.
+    Returns (line item values ready for insert, skipped rows with a reason).
+    """
+    article_numbers = {article_number for article_number, _ in rows}
+    article_ids = dict(
+        db.query(models.Article.article_number, models.Article.id).filter(
+            models.Article.article_number.in_(article_numbers)
+        ).all()
+    ) if article_numbers else {}
+
+    items, skipped = [], []
+    for row_number, (article_number, quantity_str) in enumerate(rows, start=1):
+        def skip(reason):
+            skipped.append({"row": row_number, "article_number": article_number, "reason": reason})
+
+        try:
+            quantity = float(quantity_str)
+        except (TypeError, ValueError):
+            quantity = 0
+        if not (math.isfinite(quantity) and quantity > 0):
+            skip(SKIP_INVALID_QUANTITY)
+            continue
+
+        article_id = article_ids.get(article_number)
+        if article_id is None:
+            skip(SKIP_UNKNOWN_ARTICLE)
+            continue
+
+        locked_rate = rates.get(article_number, 0.0)
+        if not locked_rate > 0:
+            skip(SKIP_NO_LOCKED_RATE)
+            continue
+
+        items.append({"row": row_number, "article_id": article_id, "requested_quantity": quantity, "locked_rate": locked_rate})
+    return items, skipped
+
+def insert_line_items(db: Session, po_id: int, items: list[dict]) -> None:
+    """Inserts all line items of a PO with one batched INSERT."""
+    if items:
+        db.execute(insert(models.OrderLineItem), [
+            {
+                "po_id": po_id,
+                "article_id": item["article_id"],
+                "requested_quantity": item["requested_quantity"],
+                "locked_rate": item["locked_rate"],
+            }
+            for item in items
+        ])
+
+def parse_import_file(content: bytes, filename: str) -> list[dict]:
+    """
+    Reads a bulk PO file into flat rows of po_ref, store, article_number and quantity.
+    CSV files need a header with po_ref, article_number, quantity and an optional store column.
+    JSON files hold a list of POs: [{"po_ref": ..., "store": ..., "lines": [{"article_number": ..., "quantity": ...}]}].
+    Raises ValueError for unsupported or malformed files.
+    """
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        missing = {"po_ref", "article_number", "quantity"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+        return [
+            {
+                "po_ref": (row.get("po_ref") or "").strip(),
+                "store": (row.get("store") or "").strip(),
+                "article_number": (row.get("article_number") or "").strip(),
+                "quantity": row.get("quantity"),
+            }
+            for row in reader
+        ]
+
+    if name.endswith(".json"):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON: {exc}")
+        if not isinstance(data, list):
+            raise ValueError("JSON body must be a list of purchase orders")
+        rows = []
+        for po_number, po in enumerate(data, start=1):
+            if not isinstance(po, dict) or not isinstance(po.get("lines"), list):
+                raise ValueError(f"Purchase order {po_number} needs a 'lines' list")
+            for line_number, line in enumerate(po["lines"], start=1):
+                if not isinstance(line, dict):
+                    raise ValueError(f"Line {line_number} of purchase order {po_number} must be an object")
+                rows.append({
+                    "po_ref": str(po.get("po_ref") or "").strip(),
+                    "store": str(po.get("store") or "").strip(),
+                    "article_number": str(line.get("article_number") or "").strip(),
+                    "quantity": line.get("quantity"),
+                })
+        return rows
+
+    raise ValueError("Unsupported file type, upload a .csv or .json file")
+
+def _resolve_stores(db: Session, rows: list[dict], current_user: CurrentUser) -> dict[str, int | str]:
+    """Maps each store value in the file to a store user id, or to the reason it is rejected."""
+    names = {row["store"] for row in rows}
+    if current_user.role == models.UserRole.store.value:
+        # Stores may only import for themselves; a blank store column means "me".
+        return {name: current_user.id if name in ("", current_user.username) else SKIP_STORE_NOT_PERMITTED for name in names}
+
+    store_ids = dict(
+        db.query(models.User.username, models.User.id).filter(
+            models.User.username.in_(names),
+            models.User.role == models.UserRole.store.value
+        ).all()
+    )
+    return {name: store_ids.get(name, SKIP_UNKNOWN_STORE) for name in names}
+
+def _insert_po_batch(db: Session, batch: list[tuple[int, str, list[dict]]], results: dict) -> None:
+    """Inserts one batch of POs and their line items, two statements in total, then commits."""
+    po_numbers = [new_po_number() for _ in batch]
+    po_ids = db.scalars(
+        insert(models.PurchaseOrder).returning(models.PurchaseOrder.id, sort_by_parameter_order=True),
+        [
+            {
+                "po_number": po_number,
+                "store_id": store_id,
+                "status": models.POStatus.PENDING_BIDS.value,
+                "line_item_count": len(items),
+            }
+            for po_number, (store_id, _, items) in zip(po_numbers, batch)
+        ]
+    ).all()
+
+    line_values = []
+    for po_id, po_number, (_, po_ref, items) in zip(po_ids, po_numbers, batch):
+        for item in items:
+            line_values.append({
+                "po_id": po_id,
+                "article_id": item["article_id"],
+                "requested_quantity": item["requested_quantity"],
+                "locked_rate": item["locked_rate"],
+            })
+            results[item["row"]].update(status="created", po_number=po_number)
+    db.execute(insert(models.OrderLineItem), line_values)
+    versions.bump_version(db, versions.OPEN_LINE_ITEMS)
+    db.commit()
+
+def import_purchase_orders(db: Session, rows: list[dict], current_user: CurrentUser, batch_size: int = 2000) -> dict:
+    """
+    Creates one PO per (store, po_ref) from parsed import rows. Articles, rates and stores
+    are validated with set-based queries, then POs are inserted in transactions of roughly
+    batch_size line items each. Returns a per-row report in file order.
+    """
+    items, skipped = resolve_line_items(db, [(row["article_number"], row["quantity"]) for row in rows], rate_cache.get(db))
+    stores = _resolve_stores(db, rows, current_user)
+
+    results = {
+        row_number: {"row": row_number, "po_ref": row["po_ref"], "article_number": row["article_number"], "status": "skipped"}
+        for row_number, row in enumerate(rows, start=1)
+    }
+    for entry in skipped:
+        results[entry["row"]]["reason"] = entry["reason"]
+
+    pos = defaultdict(list)
+    for item in items:
+        row = rows[item["row"] - 1]
+        store = stores[row["store"]]
+        if not row["po_ref"]:
+            results[item["row"]]["reason"] = SKIP_MISSING_PO_REF
+        elif isinstance(store, str):
+            results[item["row"]]["reason"] = store
+        else:
+            pos[(store, row["po_ref"])].append(item)
+
+    batch, batch_lines = [], 0
+    for (store_id, po_ref), po_items in pos.items():
+        batch.append((store_id, po_ref, po_items))
+        batch_lines += len(po_items)
+        if batch_lines >= batch_size:
+            _insert_po_batch(db, batch, results)
+            batch, batch_lines = [], 0
+    if batch:
+        _insert_po_batch(db, batch, results)
+
+    report = list(results.values())
+    return {
+        "pos_created": len(pos),
+        "lines_created": sum(1 for entry in report if entry["status"] == "created"),
+        "lines_skipped": sum(1 for entry in report if entry["status"] == "skipped"),
+        "rows": report,
+    }
+
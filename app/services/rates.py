@@ -0,0 +1,62 @@
+# app/services/rates.py
+# Weekly selling rates, cached per worker under the shared weekly_rates version.
+import threading
+import time
+from datetime import date
+from sqlalchemy.orm import Session
+from app.core.config import RATE_CACHE_CHECK_SECONDS
+from app.db import models
+from app.services import versions
+
+def current_week_rates(db: Session) -> dict[str, float]:
+    """Maps article_number -> selling rate locked for the current ISO week."""
+    current_week = date.today().isocalendar()[1]
+    current_year = date.today().year
+    rows = db.query(models.Article.article_number, models.WeeklyRateLock.selling_rate).join(
+        models.WeeklyRateLock.article
+    ).filter(
+        models.WeeklyRateLock.week_number == current_week,
+        models.WeeklyRateLock.year == current_year
+    ).all()
+    return {article_number: selling_rate for article_number, selling_rate in rows}
+
+class WeeklyRateCache:
+    """
+    Process-wide cache of current_week_rates().
+
+    The map is loaded on first use and reused until the week changes or the shared
+    'weekly_rates' version counter moves. The counter is re-read at most once every
+    check_interval seconds, so other workers see a new rate within that window while
+    the worker that wrote it invalidates immediately.
+    """
+    def __init__(self, check_interval: float = RATE_CACHE_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rates = None
+        self._week = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, db: Session) -> dict[str, float]:
+        week = (date.today().year, date.today().isocalendar()[1])
+        with self._lock:
+            if self._rates is not None and self._week == week and time.monotonic() - self._checked_at < self.check_interval:
+                return self._rates
+
+        version = versions.get_version(db, versions.WEEKLY_RATES)
+        with self._lock:
+            if self._rates is not None and self._week == week and self._version == version:
+                self._checked_at = time.monotonic()
+                return self._rates
+
+        rates = current_week_rates(db)
+        with self._lock:
+            self._rates, self._week, self._version = rates, week, version
+            self._checked_at = time.monotonic()
+        return rates
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._rates = None
+
+rate_cache = WeeklyRateCache()
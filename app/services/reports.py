@@ -0,0 +1,95 @@
+# app/services/reports.py
+# The margin summary report, read from the weekly margin_rollups buckets.
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+from app.services.rollups import week_of
+
+BREAKDOWNS = ("store", "article")
+
+def _margin_columns():
+    """Aggregate columns over the pre-summed 'delivered_*' and 'completed_*' rollup columns."""
+    rollup = models.MarginRollup
+    return [
+        func.coalesce(func.sum(rollup.delivered_line_items + rollup.completed_line_items), 0).label("line_items"),
+        func.coalesce(func.sum(rollup.delivered_revenue + rollup.completed_revenue), 0.0).label("total_revenue"),
+        func.coalesce(func.sum(rollup.delivered_cost + rollup.completed_cost), 0.0).label("total_cost"),
+    ]
+
+def _week_bounds(start_date: date | None, end_date: date | None) -> tuple[date | None, date | None]:
+    """Widens a date range to whole ISO weeks, the granularity of the rollup table."""
+    first_week = week_of(start_date)[2] if start_date else None
+    last_week = week_of(end_date)[2] if end_date else None
+    return first_week, last_week
+
+def _filter_rollups(query, first_week: date | None, last_week: date | None, store_id: int | None):
+    rollup = models.MarginRollup
+    if first_week:
+        query = query.filter(rollup.week_start >= first_week)
+    if last_week:
+        query = query.filter(rollup.week_start <= last_week)
+    if store_id:
+        query = query.filter(rollup.store_id == store_id)
+    return query
+
+def _summary_from_row(row) -> dict:
+    total_revenue = row.total_revenue or 0
+    total_cost = row.total_cost or 0
+    net_margin_amount = total_revenue - total_cost
+    return {
+        "line_items": row.line_items,
+        "total_revenue": total_revenue,
+        "total_cost": total_cost,
+        "net_margin_amount": net_margin_amount,
+        "net_margin_percent": (net_margin_amount / total_revenue) * 100 if total_revenue > 0 else 0,
+    }
+
+def summarize_margins(
+    db: Session,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    store_id: int | None = None,
+    breakdown: str | None = None,
+) -> dict:
+    """
+    Reads revenue (allocated qty x locked rate), cost (allocated qty x approved bid rate)
+    and net margin for delivered or completed POs from the margin_rollups table. Date filters are
+    applied by whole ISO week. One query for the totals, plus one grouped query when a
+    'store' or 'article' breakdown is requested.
+    """
+    first_week, last_week = _week_bounds(start_date, end_date)
+    rollup = models.MarginRollup
+
+    totals = _filter_rollups(
+        db.query(
+            *_margin_columns(),
+            func.coalesce(func.sum(rollup.delivered_pos + rollup.completed_pos), 0).label("total_pos"),
+        ),
+        first_week, last_week, store_id,
+    ).one()
+    summary = _summary_from_row(totals)
+    summary["total_pos"] = totals.total_pos
+    summary["breakdown"] = []
+
+    if breakdown == "store":
+        rows = _filter_rollups(
+            db.query(models.User.username.label("label"), *_margin_columns()),
+            first_week, last_week, store_id,
+        ).join(models.User, models.User.id == rollup.store_id).group_by(
+            models.User.id, models.User.username
+        ).order_by(models.User.username).all()
+    elif breakdown == "article":
+        rows = _filter_rollups(
+            db.query(models.Article.name.label("label"), *_margin_columns()),
+            first_week, last_week, store_id,
+        ).join(models.Article, models.Article.id == rollup.article_id).group_by(
+            models.Article.id, models.Article.name
+        ).order_by(models.Article.name).all()
+    else:
+        rows = []
+
+    for row in rows:
+        summary["breakdown"].append({"label": row.label, **_summary_from_row(row)})
+
+    return summary
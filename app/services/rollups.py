@@ -0,0 +1,220 @@
+# app/services/rollups.py
+# Weekly margin_rollups buckets per store and article, kept up to date as bids are approved and POs delivered.
+from collections import defaultdict
+from datetime import date, datetime
+from itertools import groupby
+from sqlalchemy import and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.db import models
+
+APPROVED_COLUMNS = ("approved_line_items", "approved_quantity", "approved_revenue", "approved_cost")
+# PO buckets hold a PO's allocated items for as long as it is in that status, plus a count of such POs
+DELIVERED_COLUMNS = ("delivered_pos", "delivered_line_items", "delivered_quantity", "delivered_revenue", "delivered_cost")
+COMPLETED_COLUMNS = ("completed_pos", "completed_line_items", "completed_quantity", "completed_revenue", "completed_cost")
+PO_BUCKETS = {
+    models.POStatus.DELIVERED.value: DELIVERED_COLUMNS,
+    models.POStatus.COMPLETED.value: COMPLETED_COLUMNS,
+}
+ROLLUP_KEY = ("store_id", "article_id", "year", "week_number")
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+# Rows per multi-row upsert; keeps bound parameters under driver limits (19 per row)
+UPSERT_BATCH_SIZE = 500
+
+def week_of(day: date) -> tuple[int, int, date]:
+    """Returns (ISO year, ISO week, Monday of that week) for a date or datetime."""
+    if isinstance(day, datetime):
+        day = day.date()
+    year, week, _ = day.isocalendar()
+    return year, week, date.fromisocalendar(year, week, 1)
+
+def _contribution(line_item: models.OrderLineItem, quantity: float | None, bid_rate: float | None) -> tuple:
+    """(line items, quantity, revenue, cost) a single allocated line item adds to a rollup row."""
+    if not quantity or bid_rate is None:
+        return (0, 0.0, 0.0, 0.0)
+    return (1, quantity, quantity * line_item.locked_rate, quantity * bid_rate)
+
+def _row_values(store_id: int, article_id: int, created_at: datetime, increments: dict) -> dict:
+    year, week_number, week_start = week_of(created_at)
+    values = {column: 0 for column in APPROVED_COLUMNS + DELIVERED_COLUMNS + COMPLETED_COLUMNS}
+    values.update(increments)
+    values.update(store_id=store_id, article_id=article_id, year=year, week_number=week_number, week_start=week_start)
+    return values
+
+def _increment_many(db: Session, columns: tuple, rows: list[tuple]) -> None:
+    """
+    Adds amounts for the given columns to many distinct (store, article, week) rows.
+    rows holds (store_id, article_id, created_at, amounts in column order). On PostgreSQL
+    and SQLite this is a single multi-row upsert; elsewhere it falls back to one row at a time.
+    """
+    rows = [row for row in rows if any(row[3])]
+    if not rows:
+        return
+
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        for store_id, article_id, created_at, amounts in rows:
+            _increment(db, store_id, article_id, created_at, dict(zip(columns, amounts)))
+        return
+
+    table = models.MarginRollup.__table__
+    stmt = insert(table).values([
+        _row_values(store_id, article_id, created_at, dict(zip(columns, amounts)))
+        for store_id, article_id, created_at, amounts in rows
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={column: table.c[column] + stmt.excluded[column] for column in columns},
+    )
+    db.execute(stmt)
+
+def _increment(db: Session, store_id: int, article_id: int, created_at: datetime, increments: dict) -> None:
+    """Adds the given amounts to one (store, article, week) row, creating it if needed."""
+    if not any(increments.values()):
+        return
+
+    table = models.MarginRollup.__table__
+    values = _row_values(store_id, article_id, created_at, increments)
+
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEY),
+            set_={column: table.c[column] + stmt.excluded[column] for column in increments},
+        )
+        db.execute(stmt)
+        return
+
+    # Generic fallback for other databases: update in place, insert if the row is missing.
+    result = db.execute(
+        table.update().where(and_(*(table.c[key] == values[key] for key in ROLLUP_KEY))).values(
+            {column: table.c[column] + amount for column, amount in increments.items()}
+        )
+    )
+    if result.rowcount == 0:
+        db.execute(table.insert().values(**values))
+
+def record_bid_approval(
+    db: Session,
+    po: models.PurchaseOrder,
+    line_item: models.OrderLineItem,
+    approved_bid: models.Bid,
+    previous_quantity: float | None = None,
+    previous_bid: models.Bid | None = None,
+) -> None:
+    """
+    Applies a new allocation on line_item to the 'approved_*' columns.
+    If the item had already been approved, the previous allocation is subtracted first,
+    so re-approving a different bid leaves the rollup consistent.
+    """
+    new = _contribution(line_item, line_item.allocated_quantity, approved_bid.bid_rate)
+    old = _contribution(line_item, previous_quantity, previous_bid.bid_rate if previous_bid else None)
+    deltas = dict(zip(APPROVED_COLUMNS, (n - o for n, o in zip(new, old))))
+    _increment(db, po.store_id, line_item.article_id, po.created_at, deltas)
+
+def record_bulk_approvals(db: Session, allocations) -> None:
+    """
+    Applies many first-time allocations at once, summed per (store, article, week).
+    allocations yields (store_id, article_id, po_created_at, quantity, locked_rate, bid_rate).
+    """
+    groups = {}
+    for store_id, article_id, created_at, quantity, locked_rate, bid_rate in allocations:
+        if not quantity:
+            continue
+        key = (store_id, article_id, week_of(created_at)[:2])
+        totals = groups.setdefault(key, [created_at, 0, 0.0, 0.0, 0.0])
+        totals[1] += 1
+        totals[2] += quantity
+        totals[3] += quantity * locked_rate
+        totals[4] += quantity * bid_rate
+
+    rows = [(store_id, article_id, created_at, totals) for (store_id, article_id, _), (created_at, *totals) in groups.items()]
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        _increment_many(db, APPROVED_COLUMNS, rows[start:start + UPSERT_BATCH_SIZE])
+
+def _po_totals(line_items) -> dict:
+    """
+    Sums (POs, line items, quantity, revenue, cost) per article for one PO's (line item, approved bid rate) pairs.
+    The PO itself is counted once, on the row of its lowest article id, so PO counts add up across rows.
+    """
+    per_article = defaultdict(lambda: [0, 0, 0.0, 0.0, 0.0])
+    for line_item, bid_rate in line_items:
+        totals = per_article[line_item.article_id]
+        for i, amount in enumerate(_contribution(line_item, line_item.allocated_quantity, bid_rate), start=1):
+            totals[i] += amount
+    if per_article:
+        per_article[min(per_article)][0] += 1
+    return per_article
+
+def record_po_status_change(db: Session, po: models.PurchaseOrder, previous_status: str | None) -> None:
+    """
+    Moves a PO's allocated items between the 'delivered_*' and 'completed_*' buckets after its
+    status changed from previous_status, in a single upsert. Other statuses have no bucket.
+    """
+    old_columns = PO_BUCKETS.get(previous_status, ())
+    new_columns = PO_BUCKETS.get(po.status, ())
+    if old_columns == new_columns:
+        return
+
+    line_items = db.query(models.OrderLineItem, models.Bid.bid_rate).outerjoin(
+        models.Bid, and_(
+            models.Bid.line_item_id == models.OrderLineItem.id,
+            models.Bid.status == models.BidStatus.APPROVED.value,
+        )
+    ).filter(models.OrderLineItem.po_id == po.id).all()
+
+    _increment_many(db, old_columns + new_columns, [
+        (po.store_id, article_id, po.created_at, [-amount for amount in totals[:len(old_columns)]] + totals[:len(new_columns)])
+        for article_id, totals in _po_totals(line_items).items()
+    ])
+
+def rebuild_margin_rollups(db: Session, batch_size: int = 5000) -> int:
+    """
+    Recomputes the whole margin_rollups table from line items and approved bids.
+    Returns the number of rollup rows written. The caller commits.
+    """
+    rows = db.query(
+        models.PurchaseOrder.id,
+        models.PurchaseOrder.store_id,
+        models.PurchaseOrder.status,
+        models.PurchaseOrder.created_at,
+        models.OrderLineItem,
+        models.Bid.bid_rate,
+    ).join(
+        models.OrderLineItem, models.OrderLineItem.po_id == models.PurchaseOrder.id
+    ).outerjoin(
+        models.Bid, and_(
+            models.Bid.line_item_id == models.OrderLineItem.id,
+            models.Bid.status == models.BidStatus.APPROVED.value,
+        )
+    ).order_by(models.PurchaseOrder.id).yield_per(batch_size)
+
+    rollups = {}
+
+    def add(store_id, article_id, created_at, columns, amounts):
+        year, week_number, week_start = week_of(created_at)
+        key = (store_id, article_id, year, week_number)
+        row = rollups.setdefault(key, dict(
+            {column: 0 for column in APPROVED_COLUMNS + DELIVERED_COLUMNS + COMPLETED_COLUMNS},
+            **dict(zip(ROLLUP_KEY, key)), week_start=week_start,
+        ))
+        for column, amount in zip(columns, amounts):
+            row[column] += amount
+
+    # Rows arrive grouped by PO, so each delivered or completed PO is summed once all of its line items are seen
+    for (_, store_id, po_status, created_at), po_rows in groupby(rows, key=lambda row: row[:4]):
+        line_items = [(line_item, bid_rate) for *_, line_item, bid_rate in po_rows]
+        for line_item, bid_rate in line_items:
+            contribution = _contribution(line_item, line_item.allocated_quantity, bid_rate)
+            if contribution[0]:
+                add(store_id, line_item.article_id, created_at, APPROVED_COLUMNS, contribution)
+        if po_status in PO_BUCKETS:
+            for article_id, totals in _po_totals(line_items).items():
+                add(store_id, article_id, created_at, PO_BUCKETS[po_status], totals)
+
+    db.query(models.MarginRollup).delete(synchronize_session=False)
+    if rollups:
+        db.execute(models.MarginRollup.__table__.insert(), list(rollups.values()))
+    return len(rollups)
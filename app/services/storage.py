@@ -0,0 +1,83 @@
+# app/services/storage.py
+# Pluggable blob storage for proof photos: Azure Blob Storage in the cloud, a local directory
+# for tests and on-prem runs. FileUploader (app.services.uploads) decides what to store and under which name.
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+from app.core.config import LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL_PREFIX, STORAGE_BACKEND
+
+class BlobStorage(ABC):
+    """Interface of a storage backend. Names are flat and safe (no path separators)."""
+    @abstractmethod
+    async def exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def put(self, name: str, chunks: AsyncIterator[bytes], content_type: str | None) -> None:
+        """Writes the blob from chunks; a reader never sees a partially written blob."""
+
+    @abstractmethod
+    async def delete(self, name: str) -> None:
+        """Removes the blob; a no-op if it does not exist."""
+
+    @abstractmethod
+    def url(self, name: str) -> str:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+class LocalFileStorage(BlobStorage):
+    """
+    Blobs as files under directory, served by the app under url_prefix (see app.main).
+    Each blob is written to a temporary file and renamed into place when complete.
+    """
+    def __init__(self, directory: str = LOCAL_STORAGE_DIR, url_prefix: str = LOCAL_STORAGE_URL_PREFIX):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def _path(self, name: str) -> str:
+        """The file of a blob; raises ValueError for names that would resolve outside directory."""
+        directory = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(directory, name))
+        if os.path.dirname(path) != directory:
+            raise ValueError(f"Blob name {name!r} is not a plain file name")
+        return path
+
+    async def exists(self, name: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(name))
+
+    async def put(self, name: str, chunks: AsyncIterator[bytes], content_type: str | None) -> None:
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+        temporary = self._path(f".{name}.{uuid.uuid4().hex}.part")
+        fh = await asyncio.to_thread(open, temporary, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(fh.write, chunk)
+            await asyncio.to_thread(fh.close)
+            await asyncio.to_thread(os.replace, temporary, self._path(name))
+        except BaseException:
+            fh.close()
+            await asyncio.to_thread(_remove, temporary)
+            raise
+
+    async def delete(self, name: str) -> None:
+        await asyncio.to_thread(_remove, self._path(name))
+
+    def url(self, name: str) -> str:
+        return f"{self.url_prefix}/{name}"
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def storage_from_config() -> BlobStorage:
+    """The backend selected by STORAGE_BACKEND ('azure' or 'local')."""
+    if STORAGE_BACKEND == "local":
+        return LocalFileStorage()
+    from app.services.azure_blob_service import AzureBlobStorage
+    return AzureBlobStorage()
@@ -0,0 +1,324 @@
+# app/services/upload_queue.py
+# Background uploads of bid proof photos. The bid route spools the photo to local disk and commits
+# the bid with proof_status PENDING; a small per-worker pool uploads it and fills in proof_photo_url.
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from fastapi import UploadFile
+from sqlalchemy import func, or_
+from starlette.datastructures import Headers
+from app.core.config import (
+    UPLOAD_DRAIN_SECONDS,
+    UPLOAD_MAX_ATTEMPTS,
+    UPLOAD_ORPHAN_SECONDS,
+    UPLOAD_RECOVERY_SECONDS,
+    UPLOAD_RETRY_BASE_SECONDS,
+    UPLOAD_SPOOL_DIR,
+    UPLOAD_STALE_SECONDS,
+    UPLOAD_WORKERS,
+)
+from app.db import models
+from app.db.base import SessionLocal
+from app.services import uploads
+from app.services.uploads import FileUploader, StoredFile, UploadTooLargeError, file_uploader
+
+logger = logging.getLogger("app.uploads")
+
+@dataclass(frozen=True)
+class SpooledFile:
+    path: str
+    file_name: str | None
+    content_type: str | None
+    size: int
+
+    @classmethod
+    def of(cls, pending: models.PendingUpload) -> "SpooledFile":
+        size = os.path.getsize(pending.spool_path)
+        return cls(pending.spool_path, pending.file_name, pending.content_type, size)
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _complete(bid_id: int, stored: StoredFile) -> None:
+    """Points the bid at its uploaded photo and drops the pending row, in one transaction."""
+    db = SessionLocal()
+    try:
+        # Only a bid still waiting for its photo gains the reference, so a repeated completion can't
+        # count it twice. FAILED is included: a sweep may have given up on an upload that then finished.
+        updated = db.query(models.Bid).filter(
+            models.Bid.id == bid_id,
+            models.Bid.proof_status.in_([models.ProofStatus.PENDING.value, models.ProofStatus.FAILED.value]),
+        ).update(
+            {models.Bid.proof_photo_url: stored.url, models.Bid.proof_status: models.ProofStatus.UPLOADED.value},
+            synchronize_session=False,
+        )
+        if updated:
+            uploads.add_reference(db, stored)
+        db.query(models.PendingUpload).filter(models.PendingUpload.bid_id == bid_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _record_failure(bid_id: int, attempts: int, error: str, gave_up: bool) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.PendingUpload).filter(models.PendingUpload.bid_id == bid_id).update(
+            {
+                models.PendingUpload.attempts: attempts,
+                models.PendingUpload.last_error: error[:500],
+                models.PendingUpload.claimed_at: func.now(),
+            },
+            synchronize_session=False,
+        )
+        if gave_up:
+            db.query(models.Bid).filter(
+                models.Bid.id == bid_id, models.Bid.proof_status == models.ProofStatus.PENDING.value
+            ).update({models.Bid.proof_status: models.ProofStatus.FAILED.value}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _claim_stranded(host: str, stale_before: datetime) -> list[tuple[int, SpooledFile | None, int]]:
+    """
+    Takes over this host's pending uploads that no worker has touched since stale_before. Returns
+    (bid_id, spooled file or None if it is gone, attempts so far) for each one this call claimed.
+    """
+    db = SessionLocal()
+    try:
+        stale = or_(models.PendingUpload.claimed_at.is_(None), models.PendingUpload.claimed_at < stale_before)
+        rows = db.query(models.PendingUpload).join(models.Bid, models.Bid.id == models.PendingUpload.bid_id).filter(
+            models.PendingUpload.spool_host == host, models.Bid.proof_status == models.ProofStatus.PENDING.value, stale,
+        ).all()
+        claimed = []
+        for row in rows:
+            # Conditional on still being stale, so of the workers sharing this host only one resumes it
+            taken = db.query(models.PendingUpload).filter(models.PendingUpload.bid_id == row.bid_id, stale).update(
+                {models.PendingUpload.claimed_at: func.now()}, synchronize_session=False
+            )
+            if taken:
+                spooled = SpooledFile.of(row) if os.path.exists(row.spool_path) else None
+                claimed.append((row.bid_id, spooled, row.attempts))
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+def _fail_orphans(host: str, orphaned_before: datetime) -> int:
+    """Marks FAILED the pending uploads of other hosts that nobody has touched since orphaned_before."""
+    db = SessionLocal()
+    try:
+        orphaned = db.query(models.PendingUpload.bid_id).filter(
+            or_(models.PendingUpload.spool_host.is_(None), models.PendingUpload.spool_host != host),
+            or_(models.PendingUpload.claimed_at.is_(None), models.PendingUpload.claimed_at < orphaned_before),
+        )
+        failed = db.query(models.Bid).filter(
+            models.Bid.id.in_(orphaned.scalar_subquery()), models.Bid.proof_status == models.ProofStatus.PENDING.value
+        ).update({models.Bid.proof_status: models.ProofStatus.FAILED.value}, synchronize_session=False)
+        if failed:
+            db.query(models.PendingUpload).filter(models.PendingUpload.bid_id.in_(orphaned.scalar_subquery())).update(
+                {models.PendingUpload.last_error: "spool file lost with its host"}, synchronize_session=False
+            )
+        db.commit()
+        return failed
+    finally:
+        db.close()
+
+class UploadQueue:
+    """
+    Per-worker queue of spooled proof photos, uploaded by at most `workers` concurrent tasks.
+
+    A failed upload is retried by the same task after an exponential backoff with jitter, so
+    while blob storage is struggling the queue slows down rather than piling on more requests.
+    After max_attempts the bid is marked FAILED; its spool file and PendingUpload row are kept
+    for 'python -m app.cli upload-pending'. The tasks are started by the first enqueue, not at boot.
+
+    Uploads a worker didn't finish (shutdown after drain_seconds, a crash) are picked up by the
+    recovery sweep every worker runs: a worker on the same host resumes them once stale_after
+    has passed, or marks them FAILED if the spool file is gone. Containers are ephemeral, so an
+    upload whose host has been silent for orphan_after is taken to be lost and marked FAILED.
+    """
+    def __init__(
+        self, uploader: FileUploader, spool_dir: str = UPLOAD_SPOOL_DIR, workers: int = UPLOAD_WORKERS,
+        max_attempts: int = UPLOAD_MAX_ATTEMPTS, retry_base: float = UPLOAD_RETRY_BASE_SECONDS,
+        recovery_interval: float = UPLOAD_RECOVERY_SECONDS, stale_after: float = UPLOAD_STALE_SECONDS,
+        orphan_after: float = UPLOAD_ORPHAN_SECONDS, host: str | None = None,
+    ):
+        self.uploader = uploader
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.recovery_interval = recovery_interval
+        self.stale_after = stale_after
+        self.orphan_after = orphan_after
+        self.host = host or socket.gethostname()
+        self._queue = None
+        self._tasks = []
+        self._recovery_task = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._retried = 0
+        self._failed = 0
+        self._abandoned = 0
+        self._resumed = 0
+        self._lost = 0
+
+    async def spool(self, file: UploadFile) -> SpooledFile:
+        """Copies the upload to the spool directory. Raises UploadTooLargeError past the uploader's max_size."""
+        if file.size is not None and file.size > self.uploader.max_size:
+            raise UploadTooLargeError(f"{file.filename} exceeds {self.uploader.max_size} bytes")
+        await asyncio.to_thread(os.makedirs, self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        size = 0
+        fh = await asyncio.to_thread(open, path, "wb")
+        try:
+            async for chunk in self.uploader.read_chunks(file, file.filename):
+                await asyncio.to_thread(fh.write, chunk)
+                size += len(chunk)
+            await asyncio.to_thread(fh.close)
+        except BaseException:
+            fh.close()
+            await asyncio.to_thread(_discard, path)
+            raise
+        return SpooledFile(path, file.filename, file.content_type, size)
+
+    async def discard(self, spooled: SpooledFile) -> None:
+        """Removes a spool file whose bid was never committed."""
+        await asyncio.to_thread(_discard, spooled.path)
+
+    def enqueue(self, bid_id: int, spooled: SpooledFile, attempts: int = 0) -> None:
+        """Queues the upload; call once the bid and its PendingUpload row are committed."""
+        if self._queue is None:
+            loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            # Started from a fresh context, so the tasks don't inherit the first request's timings and query budget
+            self._tasks = [contextvars.Context().run(loop.create_task, self._work()) for _ in range(self.workers)]
+        self._queue.put_nowait((bid_id, spooled, attempts))
+
+    async def _work(self) -> None:
+        while True:
+            bid_id, spooled, attempts = await self._queue.get()
+            self._count("_in_flight", 1)
+            try:
+                await self._process(bid_id, spooled, attempts)
+            except Exception:
+                logger.exception("Proof upload for bid %s crashed", bid_id)
+            finally:
+                self._count("_in_flight", -1)
+                self._queue.task_done()
+
+    async def _upload(self, spooled: SpooledFile) -> StoredFile:
+        fh = await asyncio.to_thread(open, spooled.path, "rb")
+        try:
+            headers = Headers({"content-type": spooled.content_type}) if spooled.content_type else None
+            file = UploadFile(fh, size=spooled.size, filename=spooled.file_name, headers=headers)
+            return await self.uploader.upload_file(file, spooled.file_name)
+        finally:
+            fh.close()
+
+    async def _process(self, bid_id: int, spooled: SpooledFile, attempts: int) -> None:
+        while True:
+            attempts += 1
+            try:
+                stored = await self._upload(spooled)
+                await asyncio.to_thread(_complete, bid_id, stored)
+                break
+            except Exception as exc:
+                # A vanished spool file won't come back, so there is nothing to retry
+                lost = isinstance(exc, FileNotFoundError) and exc.filename == spooled.path
+                gave_up = lost or attempts >= self.max_attempts
+                logger.warning("Proof upload for bid %s failed (attempt %d of %d): %r", bid_id, attempts, self.max_attempts, exc)
+                try:
+                    await asyncio.to_thread(_record_failure, bid_id, attempts, repr(exc), gave_up)
+                except Exception:
+                    logger.exception("Could not record the failed proof upload for bid %s", bid_id)
+                if gave_up:
+                    self._count("_failed", 1)
+                    return
+                self._count("_retried", 1)
+                await asyncio.sleep(self.retry_base * 2 ** (attempts - 1) * random.uniform(0.5, 1.5))
+        await asyncio.to_thread(_discard, spooled.path)
+        self._count("_completed", 1)
+
+    def start_recovery(self) -> None:
+        """Starts the periodic sweep for stranded uploads; its first pass runs one interval from now."""
+        if self._recovery_task is None:
+            loop = asyncio.get_running_loop()
+            self._recovery_task = contextvars.Context().run(loop.create_task, self._recover())
+
+    async def _recover(self) -> None:
+        while True:
+            await asyncio.sleep(self.recovery_interval)
+            try:
+                await self.recover_once()
+            except Exception:
+                logger.exception("Sweep for stranded proof uploads failed") # Transient DB error; retried next interval
+
+    async def recover_once(self) -> None:
+        now = datetime.now(timezone.utc)
+        stranded = await asyncio.to_thread(_claim_stranded, self.host, now - timedelta(seconds=self.stale_after))
+        for bid_id, spooled, attempts in stranded:
+            if spooled is None:
+                await asyncio.to_thread(_record_failure, bid_id, attempts, "spool file lost", True)
+                self._count("_lost", 1)
+            else:
+                self.enqueue(bid_id, spooled, attempts)
+                self._count("_resumed", 1)
+        orphaned = await asyncio.to_thread(_fail_orphans, self.host, now - timedelta(seconds=self.orphan_after))
+        self._count("_lost", orphaned)
+        if stranded or orphaned:
+            logger.warning("Recovered stranded proof uploads: %d resumed or lost here, %d lost with other hosts", len(stranded), orphaned)
+
+    async def join(self) -> None:
+        """Waits until every queued upload has completed or given up."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def _count(self, counter: str, delta: int) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + delta)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "retried": self._retried,
+                "failed": self._failed,
+                "abandoned": self._abandoned, # Left PENDING at shutdown
+                "resumed": self._resumed, # Stranded uploads taken over by this worker's recovery sweep
+                "lost": self._lost, # Marked FAILED because the spool file is gone
+            }
+
+    async def close(self, drain_seconds: float = UPLOAD_DRAIN_SECONDS) -> None:
+        """Gives queued uploads drain_seconds to finish; whatever is left stays PENDING for the recovery sweep."""
+        if self._recovery_task is not None:
+            self._recovery_task.cancel()
+            await asyncio.gather(self._recovery_task, return_exceptions=True)
+            self._recovery_task = None
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_seconds)
+        except asyncio.TimeoutError:
+            unfinished = self._queue.qsize() + self._in_flight
+            self._count("_abandoned", unfinished)
+            logger.warning("Shutting down with %d proof uploads unfinished", unfinished)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue, self._tasks = None, []
+
+upload_queue = UploadQueue(file_uploader)
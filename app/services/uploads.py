@@ -0,0 +1,198 @@
+# app/services/uploads.py
+# Proof photo uploads: size limits, content addressing and reference counts on top of a BlobStorage backend.
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from fastapi import UploadFile
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.core.config import CONTENT_ADDRESSED_UPLOADS, MAX_UPLOAD_SIZE_BYTES, UPLOAD_BLOCK_SIZE_BYTES
+from app.db import models
+from app.db.base import SessionLocal
+from app.services.storage import BlobStorage, storage_from_config
+
+class UploadTooLargeError(ValueError):
+    """Raised when an uploaded file exceeds MAX_UPLOAD_SIZE_BYTES."""
+
+@dataclass(frozen=True)
+class StoredFile:
+    name: str
+    url: str
+    size: int
+    content_type: str | None
+    digest: str | None # SHA-256 hex digest in content-addressed mode, else None
+    uploaded: bool # False when an identical blob was already stored and the transfer was skipped
+
+def _extension(file_name: str | None) -> str:
+    extension = os.path.splitext(file_name or "")[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,10}", extension) else ""
+
+class FileUploader:
+    """
+    Stores uploaded files in a BlobStorage backend.
+
+    In content-addressed mode the file is hashed while it is read and named after its SHA-256
+    digest; if the storage already holds that name the upload is skipped, so a photo re-used
+    across bids or re-submitted is transferred and stored once. Otherwise every upload gets a
+    fresh uuid name. Reads are capped at max_size either way.
+    """
+    def __init__(
+        self, storage: BlobStorage, content_addressed: bool = CONTENT_ADDRESSED_UPLOADS,
+        max_size: int = MAX_UPLOAD_SIZE_BYTES, block_size: int = UPLOAD_BLOCK_SIZE_BYTES,
+    ):
+        self.storage = storage
+        self.content_addressed = content_addressed
+        self.max_size = max_size
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._uploads = 0
+        self._deduplicated = 0
+        self._bytes_uploaded = 0
+        self._bytes_skipped = 0
+
+    async def read_chunks(self, file: UploadFile, file_name: str):
+        """Yields the file in block_size chunks; raises UploadTooLargeError past max_size bytes."""
+        total_size = 0
+        while True:
+            chunk = await file.read(self.block_size)
+            if not chunk:
+                return
+            total_size += len(chunk)
+            if total_size > self.max_size:
+                raise UploadTooLargeError(f"{file_name} exceeds {self.max_size} bytes")
+            yield chunk
+
+    async def _put(self, name: str, file: UploadFile, file_name: str) -> int:
+        size = 0
+        async def counted():
+            nonlocal size
+            async for chunk in self.read_chunks(file, file_name):
+                size += len(chunk)
+                yield chunk
+        await self.storage.put(name, counted(), file.content_type)
+        return size
+
+    async def upload_file(self, file: UploadFile, file_name: str) -> StoredFile:
+        """Raises UploadTooLargeError as soon as more than max_size bytes have been read."""
+        if file.size is not None and file.size > self.max_size:
+            raise UploadTooLargeError(f"{file_name} exceeds {self.max_size} bytes")
+
+        if not self.content_addressed:
+            # Only the extension of the client's file name is kept; the rest could hold path separators
+            name = f"{uuid.uuid4()}{_extension(file_name)}"
+            size = await self._put(name, file, file_name)
+            self._count(uploaded=True, size=size)
+            return StoredFile(name, self.storage.url(name), size, file.content_type, digest=None, uploaded=True)
+
+        # Starlette has already spooled the request body, so hashing first and re-reading is cheap
+        digest, size = hashlib.sha256(), 0
+        async for chunk in self.read_chunks(file, file_name):
+            digest.update(chunk)
+            size += len(chunk)
+        name = digest.hexdigest() + _extension(file_name)
+
+        # Renew the blob's grace period before trusting exists(), so gc_blobs can't delete it under us
+        await asyncio.to_thread(renew_blob, name)
+        uploaded = not await self.storage.exists(name)
+        if uploaded:
+            await file.seek(0)
+            await self._put(name, file, file_name)
+        self._count(uploaded=uploaded, size=size)
+        return StoredFile(name, self.storage.url(name), size, file.content_type, digest=digest.hexdigest(), uploaded=uploaded)
+
+    def _count(self, uploaded: bool, size: int) -> None:
+        with self._lock:
+            self._uploads += 1
+            if uploaded:
+                self._bytes_uploaded += size
+            else:
+                self._deduplicated += 1
+                self._bytes_skipped += size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "content_addressed": self.content_addressed,
+                "uploads": self._uploads,
+                "deduplicated": self._deduplicated,
+                "bytes_uploaded": self._bytes_uploaded,
+                "bytes_skipped": self._bytes_skipped,
+            }
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+file_uploader = FileUploader(storage_from_config())
+
+# --- Reference counts of content-addressed blobs ---
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def add_reference(db: Session, stored: StoredFile) -> None:
+    """Records one more row pointing at a content-addressed blob, inside the caller's transaction."""
+    if stored.digest is None:
+        return
+    table = models.StoredBlob.__table__
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(
+            name=stored.name, url=stored.url, size=stored.size, content_type=stored.content_type, ref_count=1, updated_at=func.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"], set_={"ref_count": table.c.ref_count + 1, "updated_at": func.now()}
+        )
+        db.execute(stmt)
+        return
+
+    updated = db.query(models.StoredBlob).filter(models.StoredBlob.name == stored.name).update(
+        {models.StoredBlob.ref_count: models.StoredBlob.ref_count + 1, models.StoredBlob.updated_at: func.now()},
+        synchronize_session=False,
+    )
+    if not updated:
+        db.add(models.StoredBlob(name=stored.name, url=stored.url, size=stored.size, content_type=stored.content_type, ref_count=1))
+
+def release_reference(db: Session, url: str | None) -> None:
+    """Drops one reference to the blob at url, e.g. when a PO photo is replaced. Other URLs are ignored."""
+    if not url:
+        return
+    db.execute(
+        update(models.StoredBlob).where(models.StoredBlob.url == url, models.StoredBlob.ref_count > 0).values(
+            ref_count=models.StoredBlob.ref_count - 1, updated_at=func.now()
+        )
+    )
+
+def renew_blob(name: str) -> None:
+    """
+    Restarts the GC grace period of a stored blob, in its own committed transaction. If gc_blobs is
+    deleting the blob right now this waits for it, so a following exists() check sees it gone.
+    """
+    db = SessionLocal()
+    try:
+        db.query(models.StoredBlob).filter(models.StoredBlob.name == name).update(
+            {models.StoredBlob.updated_at: func.now()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _unreferenced(released_before: datetime):
+    return (models.StoredBlob.ref_count == 0, models.StoredBlob.updated_at < released_before)
+
+def unreferenced_names(db: Session, released_before: datetime) -> list[str]:
+    """Blobs nobody has referenced or renewed since released_before: candidates for claim_unreferenced."""
+    return db.scalars(select(models.StoredBlob.name).where(*_unreferenced(released_before))).all()
+
+def claim_unreferenced(db: Session, name: str, released_before: datetime) -> bool:
+    """
+    Deletes the blob's row if it is still unreferenced since released_before. Delete the blob from
+    storage before committing: the row stays locked until then, so an upload renewing or referencing
+    it meanwhile waits and then finds the blob gone. False if the row was referenced or renewed.
+    """
+    return db.execute(
+        delete(models.StoredBlob).where(models.StoredBlob.name == name, *_unreferenced(released_before)).returning(models.StoredBlob.name)
+    ).first() is not None
@@ -0,0 +1,61 @@
+# app/services/versions.py
+# Shared cache_versions counters: writes bump them, per-worker caches compare against them.
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.db import models
+
+# Names of the shared version counters
+WEEKLY_RATES = "weekly_rates"
+OPEN_LINE_ITEMS = "open_line_items" # line items open for bidding (PO created, approved or closed)
+PO_PROGRESS = "po_progress" # bid approvals, logistics and completion: PO statuses past bidding and margins
+# Usernames, roles and deleted users, behind the cached tokens of app.auth. ORM flushes bump it
+# automatically; bulk UPDATE or DELETE statements on users must call bump_version themselves.
+USERS = "users"
+
+# Session.info key of the counters bumped in the session's current transaction
+BUMPED_KEY = "bumped_versions"
+
+# Callbacks given the names of the counters bumped by each committed transaction
+_commit_listeners = []
+
+def get_version(db: Session, name: str) -> int:
+    """Current value of a version counter, 0 if it has never been bumped."""
+    version = db.query(models.CacheVersion.version).filter(models.CacheVersion.name == name).scalar()
+    return version or 0
+
+def version_column(name: str):
+    """The counter as a scalar subquery, to read it in the same statement as other data."""
+    return func.coalesce(
+        select(models.CacheVersion.version).where(models.CacheVersion.name == name).scalar_subquery(), 0
+    )
+
+def get_versions(db: Session, names) -> dict[str, int]:
+    """Current values of several version counters in one query, 0 for those never bumped."""
+    rows = db.query(models.CacheVersion.name, models.CacheVersion.version).filter(models.CacheVersion.name.in_(names))
+    found = dict(rows.all())
+    return {name: found.get(name, 0) for name in names}
+
+def bump_version(db: Session, name: str) -> None:
+    """Increments a version counter inside the caller's transaction."""
+    updated = db.query(models.CacheVersion).filter(models.CacheVersion.name == name).update(
+        {models.CacheVersion.version: models.CacheVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(models.CacheVersion(name=name, version=1))
+    # Lets in-process caches drop their copy of the counter as soon as this commits
+    db.info.setdefault(BUMPED_KEY, set()).add(name)
+
+def on_commit(callback) -> None:
+    """Registers callback(names), called after each commit that bumped counters, so in-process caches can drop their copy."""
+    _commit_listeners.append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _notify_bumped_versions(session):
+    bumped = session.info.pop(BUMPED_KEY, None)
+    if bumped:
+        for callback in _commit_listeners:
+            callback(bumped)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bumped_versions(session):
+    session.info.pop(BUMPED_KEY, None)
@@ -0,0 +1,159 @@
+# app/web/api.py
+# JSON endpoints for machine clients (store POS systems, integrations).
+import asyncio
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.base import AsyncSessionLocal, async_engine, engine, get_async_db, get_db
+from app.db.pool import pool_status
+from app.db import models
+from app.auth import CurrentUser, get_current_user, password_hasher
+from app.core.instrumentation import query_budget
+from app.core.config import BULK_IMPORT_BATCH_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
+from app.services import pagination, purchase_orders, versions
+from app.services.events import format_sse, line_item_feed
+from app.services.upload_queue import upload_queue
+from app.services.uploads import file_uploader
+
+# An SSE comment is sent this often so proxies keep idle streams open.
+KEEP_ALIVE_SECONDS = 15
+
+router = APIRouter(prefix="/api", tags=["API"])
+
+# --- Bulk PO Import ---
+@router.post("/purchase-orders/import")
+def import_purchase_orders(
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    file: UploadFile = File(...)
+):
+    """
+    Creates many POs from one CSV or JSON file and returns a per-row result report.
+    Stores import for themselves; admins name the target store on every row.
+    Declared sync so parsing and the batched inserts run in the threadpool, off the event loop.
+    """
+    if current_user.role not in (models.UserRole.store.value, models.UserRole.admin.value):
+        raise HTTPException(status_code=403, detail="Only stores and admins can import purchase orders")
+
+    try:
+        rows = purchase_orders.parse_import_file(file.file.read(), file.filename)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    report = purchase_orders.import_purchase_orders(db, rows, current_user, batch_size=BULK_IMPORT_BATCH_SIZE)
+    if report["pos_created"]:
+        line_item_feed.notify()
+    return report
+
+
+# --- Purchaser Live Feed ---
+def _require_purchaser(current_user: CurrentUser) -> None:
+    if current_user.role not in (models.UserRole.purchaser.value, models.UserRole.admin.value):
+        raise HTTPException(status_code=403, detail="Only purchasers can view open line items")
+
+@router.get("/line-items/open")
+@query_budget(3)
+async def open_line_items(
+    request: Request,
+    cursor: str | None = None,
+    page_size: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Newest-first page of line items open for bidding.
+    The ETag is derived from the 'open_line_items' version counter, so a client polling
+    with If-None-Match gets a 304 after a single primary-key lookup while nothing changed.
+    """
+    _require_purchaser(current_user)
+    page_size = pagination.clamp_page_size(page_size)
+    version = await db.run_sync(versions.get_version, versions.OPEN_LINE_ITEMS)
+    etag = f'W/"{version}-{page_size}-{cursor or ""}"'
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    items, next_cursor = await pagination.keyset_page(
+        db, purchase_orders.open_line_items_statement(),
+        models.PurchaseOrder.created_at, models.OrderLineItem.id, cursor, page_size,
+        position_of=lambda item: (item.purchase_order.created_at, item.id)
+    )
+    return JSONResponse(
+        {
+            "version": version,
+            "items": [purchase_orders.line_item_to_dict(item) for item in items],
+            "next_cursor": next_cursor,
+        },
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+async def _authenticate(request: Request) -> CurrentUser:
+    # Own short-lived session: a session dependency would stay open for the whole stream.
+    async with AsyncSessionLocal() as db:
+        return await get_current_user(request, db)
+
+@router.get("/line-items/stream")
+async def stream_line_items(request: Request):
+    """
+    Server-Sent Events for the purchaser dashboard:
+    'line_items' (newly opened items), 'po_status' (a PO left bidding), 'version' (the
+    open list changed; refetch /api/line-items/open) and 'refresh' (events were dropped).
+    """
+    current_user = await _authenticate(request)
+    _require_purchaser(current_user)
+    queue = line_item_feed.subscribe()
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            line_item_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- Operational Metrics ---
+@router.get("/metrics/password-hashing")
+@query_budget(1)
+def password_hashing_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    """Queue depth, wait and hash times of the login password hashing pool."""
+    if current_user.role != models.UserRole.admin.value:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return password_hasher.stats()
+
+@router.get("/metrics/uploads")
+@query_budget(1)
+def upload_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    """This worker's proof uploads: how many were deduplicated, the bytes transferred or skipped, and the background queue."""
+    if current_user.role != models.UserRole.admin.value:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {**file_uploader.stats(), "queue": upload_queue.stats()}
+
+@router.get("/metrics/db-pool")
+@query_budget(1)
+def db_pool_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    """
+    This worker's database pools (async for web routes, sync for jobs): checked-out, idle
+    and overflow connections, and a histogram of how long checkouts waited.
+    Sustained waits or timeouts mean the pool is too small.
+    """
+    if current_user.role != models.UserRole.admin.value:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {
+        "async": pool_status(async_engine.pool),
+        "sync": pool_status(engine.pool),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout_seconds": DB_POOL_TIMEOUT,
+    }
+
@@ -1,140 +1,176 @@
 # app/web/routes.py
-import uuid
+from urllib.parse import urlencode
 from fastapi import APIRouter, Request, Depends, Form, UploadFile, File, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
-from app.db.base import get_db
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from app.db.base import get_async_db
 from app.db import models
-from app.auth import get_current_user
+from app.auth import CurrentUser, get_current_user
 from app.core.config import ARTICLES, WEEKLY_LOCKED_RATES
-from app.services.azure_blob_service import file_uploader
-from app.services import logic
+from app.core.instrumentation import TimedTemplates, query_budget, timed
+from app.services.upload_queue import upload_queue
+from app.services.uploads import file_uploader, UploadTooLargeError
+from app.services import logic, pagination, purchase_orders, reports, rollups, uploads, versions
+from app.services.events import line_item_feed
+from app.services.fragment_cache import fragment_cache
+from app.services.rates import rate_cache
 from datetime import datetime
 from datetime import date
 
 router = APIRouter(tags=["Web"])
-templates = Jinja2Templates(directory="app/web/templates")
+templates = TimedTemplates(directory="app/web/templates")
 
 # --- Auth Pages ---
 @router.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
-    return templates.TemplateResponse("auth/login.html", {"request": request})
+    return templates.TemplateResponse(request, "auth/login.html")
 
 @router.get("/", response_class=RedirectResponse)
 def root():
     return RedirectResponse(url="/login")
 
 # --- Shared Dashboard ---
+# Statuses an admin can filter the logistics dashboard by
+ADMIN_DASHBOARD_STATUSES = [
+    models.POStatus.APPROVED.value,
+    models.POStatus.IN_LOGISTICS.value,
+    models.POStatus.DELIVERED.value,
+    models.POStatus.COMPLETED.value,
+]
+
 @router.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(3)
+async def dashboard(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    cursor: str | None = None,
+    page_size: int | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None
+):
+    # Every dashboard is keyset-paginated (newest first) with a bounded page size
+    page_size = pagination.clamp_page_size(page_size)
+    filters = {"status": status, "date_from": date_from, "date_to": date_to}
+
+    def render(template_name, next_cursor, **context):
+        return templates.TemplateResponse(request, template_name, {
+            "user": current_user,
+            "filters": filters,
+            "statuses": [po_status.value for po_status in models.POStatus],
+            "page_size": page_size,
+            "next_page_url": str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+            "first_page_url": str(request.url.remove_query_params("cursor")) if cursor else None,
+            **context
+        })
+
     if current_user.role == "store":
-        purchase_orders = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.store_id == current_user.id).all()
-        return templates.TemplateResponse("store/dashboard.html", {"request": request, "purchase_orders": purchase_orders, "user": current_user})
-    
-    # if current_user.role == "purchaser":
-    #     # Show line items that are pending bids
-    #     line_items = db.query(models.OrderLineItem).options(joinedload(models.OrderLineItem.purchase_order), joinedload(models.OrderLineItem.article)).filter(models.PurchaseOrder.status == 'PENDING_BIDS').all()
-    #     return templates.TemplateResponse("purchaser/dashboard.html", {"request": request, "line_items": line_items, "user": current_user})
+        stmt = select(models.PurchaseOrder).where(models.PurchaseOrder.store_id == current_user.id)
+        if status:
+            stmt = stmt.where(models.PurchaseOrder.status == status)
+        stmt = pagination.filter_created_between(stmt, models.PurchaseOrder.created_at, date_from, date_to)
+        store_pos, next_cursor = await pagination.keyset_page(
+            db, stmt, models.PurchaseOrder.created_at, models.PurchaseOrder.id, cursor, page_size
+        )
+        return render("store/dashboard.html", next_cursor, purchase_orders=store_pos)
     
     if current_user.role == "purchaser":
-        # THE FIX: Add a .join(models.PurchaseOrder) to connect the tables correctly.
-        line_items = db.query(models.OrderLineItem).options(
-            joinedload(models.OrderLineItem.purchase_order), 
-            joinedload(models.OrderLineItem.article)
-        ).join(models.PurchaseOrder).filter(
-            models.PurchaseOrder.status == 'PENDING_BIDS'
-        ).all()
-        return templates.TemplateResponse("purchaser/dashboard.html", {"request": request, "line_items": line_items, "user": current_user})
+        async def render_open_line_items():
+            stmt = purchase_orders.open_line_items_statement()
+            stmt = pagination.filter_created_between(stmt, models.PurchaseOrder.created_at, date_from, date_to)
+            line_items, next_cursor = await pagination.keyset_page(
+                db, stmt, models.PurchaseOrder.created_at, models.OrderLineItem.id, cursor, page_size,
+                position_of=lambda item: (item.purchase_order.created_at, item.id)
+            )
+            return render("purchaser/dashboard.html", next_cursor, line_items=line_items)
+
+        return await fragment_cache.page(request, db, current_user, (versions.OPEN_LINE_ITEMS,), render_open_line_items)
 
     if current_user.role == "admin":
-        # Show POs ready for logistics
-        approved_pos = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.status == 'APPROVED').all()
-        return templates.TemplateResponse("admin/dashboard.html", {"request": request, "purchase_orders": approved_pos, "user": current_user})
+        # Show POs ready for logistics by default
+        if status not in ADMIN_DASHBOARD_STATUSES:
+            status = filters["status"] = models.POStatus.APPROVED.value
+
+        async def render_logistics_queue():
+            stmt = select(models.PurchaseOrder).options(
+                joinedload(models.PurchaseOrder.store)
+            ).where(models.PurchaseOrder.status == status)
+            stmt = pagination.filter_created_between(stmt, models.PurchaseOrder.created_at, date_from, date_to)
+            approved_pos, next_cursor = await pagination.keyset_page(
+                db, stmt, models.PurchaseOrder.created_at, models.PurchaseOrder.id, cursor, page_size
+            )
+            return render("admin/dashboard.html", next_cursor, purchase_orders=approved_pos, statuses=ADMIN_DASHBOARD_STATUSES)
+
+        return await fragment_cache.page(request, db, current_user, (versions.PO_PROGRESS,), render_logistics_queue)
 
 # --- Store Routes ---
 @router.get("/create-po", response_class=HTMLResponse)
-def create_po_page(request: Request, current_user: models.User = Depends(get_current_user)):
+@query_budget(1)
+def create_po_page(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "store": return RedirectResponse(url="/dashboard")
-    return templates.TemplateResponse("store/create_po.html", {"request": request, "articles": ARTICLES})
+    return templates.TemplateResponse(request, "store/create_po.html", {"articles": ARTICLES})
 
 
 
 @router.post("/create-po")
-async def handle_create_po(request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(8)
+async def handle_create_po(request: Request, db: AsyncSession = Depends(get_async_db), current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "store": 
         return RedirectResponse(url="/dashboard")
     
     form_data = await request.form()
-    
-    new_po = models.PurchaseOrder(
-        po_number=f"PO-{uuid.uuid4().hex[:6].upper()}",
-        store_id=current_user.id,
-        status='PENDING_BIDS'
-    )
-    db.add(new_po)
-    db.flush() # Flush to get the new_po.id
-
-    # Get current week rates from the database
-    current_week = date.today().isocalendar()[1]
-    current_year = date.today().year
-    weekly_rates_query = db.query(models.WeeklyRateLock).options(joinedload(models.WeeklyRateLock.article)).filter(
-        models.WeeklyRateLock.week_number == current_week,
-        models.WeeklyRateLock.year == current_year
-    ).all()
-    # Convert to a dictionary for easy lookup
-    rates_dict = {rate.article.article_number: rate.selling_rate for rate in weekly_rates_query}
 
-    items_added_count = 0
+    # Collect every (article, quantity) row from the form before touching the database
+    rows = []
     i = 0
     while True:
         article_num = form_data.get(f"article_{i}")
-        quantity_str = form_data.get(f"quantity_{i}")
-        # rate_str = form_data.get(f"rate_{i}") # <-- REMOVED THIS LINE
-
         if not article_num:
             break
-
-        # THE FIX: Removed the check for 'rate_str'
-        if article_num and quantity_str:
-            quantity = float(quantity_str)
-            # rate = float(rate_str) # <-- REMOVED THIS LINE
-            
-            # THE FIX: Removed the check for 'rate > 0'
-            if quantity > 0:
-                article = db.query(models.Article).filter(models.Article.article_number == article_num).first()
-                if article:
-                    locked_rate = rates_dict.get(article.article_number, 0.0)
-                    
-                    # Add a check to ensure a rate was found
-                    if locked_rate > 0:
-                        line_item = models.OrderLineItem(
-                            po_id=new_po.id,
-                            article_id=article.id,
-                            requested_quantity=quantity,
-                            locked_rate=locked_rate # Use the rate from the database
-                        )
-                        db.add(line_item)
-                        items_added_count += 1
+        rows.append((article_num, form_data.get(f"quantity_{i}")))
         i += 1
-    
-    if items_added_count == 0:
-        db.rollback() 
-        return RedirectResponse(url="/create-po?error=empty", status_code=303)
 
-    db.commit()
+    # Resolve all articles in one query and price them with the cached current-week locked rates
+    rates = await db.run_sync(rate_cache.get)
+    items, skipped = await db.run_sync(purchase_orders.resolve_line_items, rows, rates)
+    skipped_params = [("skipped", f"Row {row['row']}: {row['article_number']} ({row['reason']})") for row in skipped]
+
+    if not items:
+        return RedirectResponse(url=f"/create-po?{urlencode([('error', 'empty')] + skipped_params)}", status_code=303)
+
+    new_po = models.PurchaseOrder(
+        po_number=purchase_orders.new_po_number(),
+        store_id=current_user.id,
+        status='PENDING_BIDS',
+        line_item_count=len(items)
+    )
+    db.add(new_po)
+    await db.flush() # Flush to get the new_po.id
+
+    await db.run_sync(purchase_orders.insert_line_items, new_po.id, items)
+    await db.run_sync(versions.bump_version, versions.OPEN_LINE_ITEMS)
+    await db.commit()
+    line_item_feed.notify()
+
+    if skipped_params:
+        return RedirectResponse(url=f"/dashboard?{urlencode(skipped_params)}", status_code=303)
     return RedirectResponse(url="/dashboard", status_code=303)
 
 
 
 @router.get("/po/{po_id}", response_class=HTMLResponse)
-def po_detail_page(request: Request, po_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(2)
+async def po_detail_page(request: Request, po_id: int, db: AsyncSession = Depends(get_async_db), current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "store": return RedirectResponse(url="/dashboard")
     
-    po = db.query(models.PurchaseOrder).options(
+    po = (await db.scalars(select(models.PurchaseOrder).options(
         joinedload(models.PurchaseOrder.line_items).joinedload(models.OrderLineItem.bids).joinedload(models.Bid.purchaser),
         joinedload(models.PurchaseOrder.line_items).joinedload(models.OrderLineItem.article)
-    ).filter(models.PurchaseOrder.id == po_id).first()
+    ).where(models.PurchaseOrder.id == po_id))).unique().first()
 
 
     # Calculate margin for each bid to display in the UI
@@ -146,98 +182,147 @@ def po_detail_page(request: Request, po_id: int, db: Session = Depends(get_db),
             else:
                 bid.margin_percent = "N/A"
     
-    # --- THIS IS THE FIX ---
-    # Check if any bids on this PO have already been approved.
-    has_approved_bids = any(
-        bid.status == models.BidStatus.APPROVED.value 
-        for item in po.line_items for bid in item.bids
-    )
-
-    # Only run the recommendation logic if the PO is still pending AND no bids have been approved yet.
-    if po.status == models.POStatus.PENDING_BIDS.value and not has_approved_bids:
-        logic.recommend_bids_for_po(po.line_items)
-        db.commit()
-        db.refresh(po) # Refresh to get the new 'RECOMMENDED' statuses
-
-    return templates.TemplateResponse("store/po_detail.html", {"request": request, "po": po})
+    # Recommendations are maintained when bids are submitted, so this page only reads.
+    return templates.TemplateResponse(request, "store/po_detail.html", {"po": po})
 
 @router.post("/approve-bid/{bid_id}")
-def approve_bid(bid_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(11)
+async def approve_bid(bid_id: int, db: AsyncSession = Depends(get_async_db), current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "store": 
         return RedirectResponse(url="/dashboard")
 
-    # Eagerly load the related objects we know we'll need
-    approved_bid = db.query(models.Bid).options(
-        joinedload(models.Bid.line_item).joinedload(models.OrderLineItem.purchase_order)
-    ).filter(models.Bid.id == bid_id).first()
+    # Lock the bid's PO, then its line item, so concurrent approvals (double-submits or another
+    # tab) on the same item or PO are applied one at a time. close_auctions takes its locks in
+    # the same order, PO rows before line items.
+    po = (await db.scalars(select(models.PurchaseOrder).where(
+        models.PurchaseOrder.id == select(models.OrderLineItem.po_id).join(
+            models.Bid, models.Bid.line_item_id == models.OrderLineItem.id
+        ).where(models.Bid.id == bid_id).scalar_subquery()
+    ).with_for_update())).first()
 
-    if not approved_bid:
+    if not po or po.store_id != current_user.id:
         return RedirectResponse(url="/dashboard", status_code=303)
 
-    line_item = approved_bid.line_item
-    po = line_item.purchase_order
+    # Allocations are final once the PO has left bidding; delivered and completed POs are already in the report
+    if po.status != models.POStatus.PENDING_BIDS.value:
+        return RedirectResponse(url=f"/po/{po.id}", status_code=303)
 
-    # --- THIS IS THE FIX ---
-    # Fetch all bids for the item and modify them in memory.
-    # This is the idiomatic way and avoids session synchronization issues.
-    all_bids_for_item = db.query(models.Bid).filter(models.Bid.line_item_id == line_item.id).all()
-    for bid in all_bids_for_item:
-        if bid.id == approved_bid.id:
-            bid.status = models.BidStatus.APPROVED.value
-        else:
-            bid.status = models.BidStatus.REJECTED.value
-    
-    # Perform smart allocation
-    line_item.allocated_quantity = logic.calculate_smart_allocation(line_item, approved_bid)
-    
-    # Commit the changes for this line item.
-    db.commit()
+    line_item, approved_bid = (await db.execute(select(models.OrderLineItem, models.Bid).join(
+        models.Bid, models.Bid.line_item_id == models.OrderLineItem.id
+    ).where(models.Bid.id == bid_id).with_for_update(of=models.OrderLineItem))).one()
 
-    # --- Now, check if the entire PO is ready for approval in a fresh query ---
-    total_items = db.query(models.OrderLineItem).filter(models.OrderLineItem.po_id == po.id).count()
-    
-    approved_items = db.query(models.OrderLineItem).join(models.Bid).filter(
-        models.OrderLineItem.po_id == po.id,
+    # Already approved (e.g. a double-submit): nothing to do
+    if approved_bid.status == models.BidStatus.APPROVED.value:
+        return RedirectResponse(url=f"/po/{po.id}", status_code=303)
+
+    previous_bid = (await db.scalars(select(models.Bid).where(
+        models.Bid.line_item_id == line_item.id,
         models.Bid.status == models.BidStatus.APPROVED.value
-    ).distinct().count()
+    ))).first()
+    previous_quantity = line_item.allocated_quantity
+
+    # Approve this bid and reject its siblings in a single UPDATE
+    await db.execute(
+        update(models.Bid).where(models.Bid.line_item_id == line_item.id).values(
+            status=case(
+                (models.Bid.id == approved_bid.id, models.BidStatus.APPROVED.value),
+                else_=models.BidStatus.REJECTED.value
+            )
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    approved_bid.status = models.BidStatus.APPROVED.value
+
+    # Perform smart allocation
+    line_item.allocated_quantity = logic.calculate_smart_allocation(line_item, approved_bid)
+    await db.run_sync(rollups.record_bid_approval, po, line_item, approved_bid, previous_quantity, previous_bid)
 
-    if total_items == approved_items:
+    # The PO row is locked, so the counter check is O(1) and race-free
+    if previous_bid is None:
+        po.approved_item_count += 1
+    promoted = po.approved_item_count >= po.line_item_count
+    if promoted:
         po.status = models.POStatus.APPROVED.value
-        db.commit()
+        await db.run_sync(versions.bump_version, versions.OPEN_LINE_ITEMS)
+    await db.run_sync(versions.bump_version, versions.PO_PROGRESS)
+
+    await db.commit()
+    if promoted:
+        line_item_feed.notify("po_status", {"po_id": po.id, "status": models.POStatus.APPROVED.value})
 
     return RedirectResponse(url=f"/po/{po.id}", status_code=303)
 
 
 # --- Purchaser Routes ---
 @router.get("/bid/{line_item_id}", response_class=HTMLResponse)
-def submit_bid_page(request: Request, line_item_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(2)
+async def submit_bid_page(request: Request, line_item_id: int, db: AsyncSession = Depends(get_async_db), current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "purchaser": return RedirectResponse(url="/dashboard")
-    line_item = db.query(models.OrderLineItem).options(joinedload(models.OrderLineItem.article)).filter(models.OrderLineItem.id == line_item_id).first()
-    return templates.TemplateResponse("purchaser/submit_bid.html", {"request": request, "line_item": line_item})
+    line_item = (await db.scalars(select(models.OrderLineItem).options(
+        joinedload(models.OrderLineItem.article), joinedload(models.OrderLineItem.purchase_order)
+    ).where(models.OrderLineItem.id == line_item_id))).first()
+    return templates.TemplateResponse(request, "purchaser/submit_bid.html", {"line_item": line_item})
 
 @router.post("/bid/{line_item_id}")
+@query_budget(6)
 async def handle_submit_bid(
     line_item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
     bid_rate: float = Form(...),
     proof_photo: UploadFile = File(...)
 ):
     if current_user.role != "purchaser": return RedirectResponse(url="/dashboard")
     
-    # Upload photo proof
-    file_content = await proof_photo.read()
-    photo_url = file_uploader.upload_file(file_content, proof_photo.filename)
+    # Spool the photo proof to local disk; it is uploaded to blob storage in the background
+    try:
+        with timed("upload"):
+            photo = await upload_queue.spool(proof_photo)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="Proof photo is too large")
     
-    # Create the bid
+    # Lock the line item so concurrent bids on it are recommended one at a time
+    line_item = (await db.scalars(select(models.OrderLineItem).options(
+        joinedload(models.OrderLineItem.purchase_order)
+    ).where(models.OrderLineItem.id == line_item_id).with_for_update(of=models.OrderLineItem))).first()
+    if not line_item:
+        await upload_queue.discard(photo)
+        return RedirectResponse(url="/dashboard", status_code=303)
+
+    # Create the bid; proof_photo_url is filled in once the upload completes
     new_bid = models.Bid(
         line_item_id=line_item_id,
         purchaser_id=current_user.id,
         bid_rate=bid_rate,
-        proof_photo_url=photo_url
+        proof_status=models.ProofStatus.PENDING.value,
+        status=models.BidStatus.PENDING.value
     )
+
+    # Keep the single best valid bid per line item marked as RECOMMENDED
+    if line_item.purchase_order.status == models.POStatus.PENDING_BIDS.value:
+        current_bids = (await db.scalars(select(models.Bid).where(
+            models.Bid.line_item_id == line_item_id,
+            models.Bid.status.in_([models.BidStatus.RECOMMENDED.value, models.BidStatus.APPROVED.value])
+        ))).all()
+        if not any(bid.status == models.BidStatus.APPROVED.value for bid in current_bids):
+            best_rate = min((bid.bid_rate for bid in current_bids), default=None)
+            if logic.is_better_bid(bid_rate, line_item.locked_rate, best_rate):
+                for bid in current_bids:
+                    bid.status = models.BidStatus.PENDING.value
+                new_bid.status = models.BidStatus.RECOMMENDED.value
+
     db.add(new_bid)
-    db.commit()
+    try:
+        await db.flush()
+        db.add(models.PendingUpload(
+            bid_id=new_bid.id, spool_path=photo.path, spool_host=upload_queue.host,
+            file_name=photo.file_name, content_type=photo.content_type,
+        ))
+        await db.commit()
+    except BaseException:
+        await upload_queue.discard(photo)
+        raise
+    upload_queue.enqueue(new_bid.id, photo)
     
     return RedirectResponse(url="/dashboard", status_code=303)
 
@@ -251,9 +336,12 @@ def logout():
 
 
 @router.get("/po/{po_id}/logistics", response_class=HTMLResponse)
-def logistics_detail_page(request: Request, po_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@query_budget(4)
+async def logistics_detail_page(request: Request, po_id: int, db: AsyncSession = Depends(get_async_db), current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "admin": return RedirectResponse(url="/dashboard")
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == po_id).first()
+    po = (await db.scalars(select(models.PurchaseOrder).options(
+        selectinload(models.PurchaseOrder.line_items).selectinload(models.OrderLineItem.bids)
+    ).where(models.PurchaseOrder.id == po_id))).first()
     #return templates.TemplateResponse("admin/logistics_detail.html", {"request": request, "po": po})
     # --- THIS IS THE NEW LOGIC ---
     total_payout = 0
@@ -270,9 +358,9 @@ def logistics_detail_page(request: Request, po_id: int, db: Session = Depends(ge
     # -----------------------------
 
     return templates.TemplateResponse(
+        request,
         "admin/logistics_detail.html", 
         {
-            "request": request, 
             "po": po,
             "total_payout": total_payout,
             "total_invoice": total_invoice
@@ -280,59 +368,73 @@ def logistics_detail_page(request: Request, po_id: int, db: Session = Depends(ge
     )
 
 @router.post("/po/{po_id}/assign-driver")
+@query_budget(4)
 async def assign_driver(
     po_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
     assigned_driver: str = Form(...),
     pickup_time: str = Form(...)
 ):
     if current_user.role != "admin": return RedirectResponse(url="/dashboard")
     
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == po_id).first()
+    po = await db.get(models.PurchaseOrder, po_id)
     if po:
         po.assigned_driver = assigned_driver
         po.pickup_time = datetime.fromisoformat(pickup_time)
         po.status = models.POStatus.IN_LOGISTICS.value
-        db.commit()
+        await db.run_sync(versions.bump_version, versions.PO_PROGRESS)
+        await db.commit()
     
     return RedirectResponse(url=f"/po/{po_id}/logistics", status_code=303)
 
 @router.post("/po/{po_id}/upload-proof")
+@query_budget(9)
 async def upload_logistics_proof(
     po_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
     proof_type: str = Form(...), # Will be 'pickup' or 'delivery'
     photo: UploadFile = File(...),
     pickup_temperature: float = Form(None)
 ):
     if current_user.role != "admin": return RedirectResponse(url="/dashboard")
 
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == po_id).first()
+    po = await db.get(models.PurchaseOrder, po_id)
     if po:
-        file_content = await photo.read()
-        photo_url = file_uploader.upload_file(file_content, photo.filename)
+        try:
+            with timed("upload"):
+                stored = await file_uploader.upload_file(photo, photo.filename)
+        except UploadTooLargeError:
+            raise HTTPException(status_code=413, detail="Proof photo is too large")
         
         if proof_type == 'pickup':
-            po.pickup_photo_url = photo_url
+            await db.run_sync(uploads.release_reference, po.pickup_photo_url)
+            po.pickup_photo_url = stored.url
             if pickup_temperature is not None:
                 po.pickup_temperature = pickup_temperature
+            await db.run_sync(uploads.add_reference, stored)
         elif proof_type == 'delivery':
-            po.delivery_photo_url = photo_url
+            await db.run_sync(uploads.release_reference, po.delivery_photo_url)
+            po.delivery_photo_url = stored.url
+            previous_status = po.status
             po.status = models.POStatus.DELIVERED.value # Mark as delivered after final photo
+            await db.run_sync(uploads.add_reference, stored)
+            await db.run_sync(rollups.record_po_status_change, po, previous_status)
 
-        db.commit()
+        await db.run_sync(versions.bump_version, versions.PO_PROGRESS)
+        await db.commit()
 
     return RedirectResponse(url=f"/po/{po_id}/logistics", status_code=303)
 
 
 # --- ADD THIS NEW STORE CONFIRMATION ROUTE ---
 @router.post("/po/{po_id}/confirm-receipt")
-def handle_store_confirmation(
+@query_budget(6)
+async def handle_store_confirmation(
     po_id: int, 
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: CurrentUser = Depends(get_current_user),
     action: str = Form(...), # 'accept' or 'reject'
     notes: str = Form(None)
 ):
@@ -340,13 +442,14 @@ def handle_store_confirmation(
     if current_user.role != "store":
         return RedirectResponse(url="/dashboard")
 
-    po = db.query(models.PurchaseOrder).filter(
+    po = (await db.scalars(select(models.PurchaseOrder).where(
         models.PurchaseOrder.id == po_id,
         models.PurchaseOrder.store_id == current_user.id
-    ).first()
+    ))).first()
 
     # Only allow confirmation if the order has been delivered
     if po and po.status == models.POStatus.DELIVERED.value:
+        previous_status = po.status
         if action == "accept":
             po.status = models.POStatus.COMPLETED.value
         elif action == "reject":
@@ -355,63 +458,63 @@ def handle_store_confirmation(
             po.status = models.POStatus.COMPLETED.value
             po.grn_notes = f"REJECTED: {notes}"
         
-        db.commit()
+        await db.run_sync(rollups.record_po_status_change, po, previous_status)
+        await db.run_sync(versions.bump_version, versions.PO_PROGRESS)
+        await db.commit()
     
     return RedirectResponse(url="/dashboard", status_code=303)
 
 
 # --- ADD THIS NEW ADMIN REPORT ROUTE ---
 @router.get("/summary-report", response_class=HTMLResponse)
-def summary_report_page(
+@query_budget(5)
+async def summary_report_page(
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    store_id: int | None = None,
+    breakdown: str | None = None
 ):
     # Security check: only admins can see this
     if current_user.role != "admin":
         return RedirectResponse(url="/dashboard")
 
-    # Fetch all completed or delivered POs to include in the summary
-    completed_pos = db.query(models.PurchaseOrder).filter(
-        models.PurchaseOrder.status.in_([
-            models.POStatus.COMPLETED.value,
-            models.POStatus.DELIVERED.value
-        ])
-    ).all()
-
-    total_revenue = 0
-    total_cost = 0
-
-    for po in completed_pos:
-        for item in po.line_items:
-            approved_bid = next((bid for bid in item.bids if bid.status == models.BidStatus.APPROVED.value), None)
-            if approved_bid and item.allocated_quantity:
-                total_revenue += item.allocated_quantity * item.locked_rate
-                total_cost += item.allocated_quantity * approved_bid.bid_rate
-
-    net_margin_amount = total_revenue - total_cost
-    net_margin_percent = (net_margin_amount / total_revenue) * 100 if total_revenue > 0 else 0
+    if breakdown not in reports.BREAKDOWNS:
+        breakdown = None
 
-    summary_data = {
-        "total_pos": len(completed_pos),
-        "total_revenue": total_revenue,
-        "total_cost": total_cost,
-        "net_margin_amount": net_margin_amount,
-        "net_margin_percent": net_margin_percent,
-    }
+    async def render_summary():
+        # Revenue, cost and margin are read from the pre-summed margin_rollups table
+        summary_data = await db.run_sync(
+            reports.summarize_margins, start_date=start_date, end_date=end_date, store_id=store_id, breakdown=breakdown
+        )
+        stores = (await db.scalars(
+            select(models.User).where(models.User.role == models.UserRole.store.value).order_by(models.User.username)
+        )).all()
+
+        return templates.TemplateResponse(
+            request,
+            "admin/summary_report.html",
+            {
+                "summary": summary_data,
+                "user": current_user,
+                "stores": stores,
+                "filters": {"start_date": start_date, "end_date": end_date, "store_id": store_id, "breakdown": breakdown}
+            }
+        )
 
-    return templates.TemplateResponse(
-        "admin/summary_report.html",
-        {"request": request, "summary": summary_data, "user": current_user}
-    )
+    # Margins only move when bids are approved or POs completed, both of which bump po_progress
+    return await fragment_cache.page(request, db, current_user, (versions.PO_PROGRESS,), render_summary)
 
 
 # --- START: NEW ADMIN RATE MANAGER ROUTE ---
 @router.get("/rates-manager", response_class=HTMLResponse)
-def rates_manager_page(
+@query_budget(4)
+async def rates_manager_page(
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if current_user.role != "admin":
         return RedirectResponse(url="/dashboard")
@@ -421,30 +524,38 @@ def rates_manager_page(
     #current_year = date.today().year()
     current_year = date.today().year
 
-    # Fetch rates for the current week
-    rates = db.query(models.WeeklyRateLock).filter(
-        models.WeeklyRateLock.week_number == current_week,
-        models.WeeklyRateLock.year == current_year
-    ).all()
-    
-    # Get all articles to populate the dropdown for adding new rates
-    all_articles = db.query(models.Article).all()
+    async def render_rates():
+        # Fetch rates for the current week
+        rates = (await db.scalars(select(models.WeeklyRateLock).options(
+            joinedload(models.WeeklyRateLock.article)
+        ).where(
+            models.WeeklyRateLock.week_number == current_week,
+            models.WeeklyRateLock.year == current_year
+        ))).all()
+
+        # Get all articles to populate the dropdown for adding new rates
+        all_articles = (await db.scalars(select(models.Article))).all()
+
+        return templates.TemplateResponse(
+            request,
+            "admin/rates_manager.html",
+            {
+                "rates": rates,
+                "all_articles": all_articles,
+                "current_week": current_week,
+                "user": current_user
+            }
+        )
 
-    return templates.TemplateResponse(
-        "admin/rates_manager.html",
-        {
-            "request": request,
-            "rates": rates,
-            "all_articles": all_articles,
-            "current_week": current_week,
-            "user": current_user
-        }
+    return await fragment_cache.page(
+        request, db, current_user, (versions.WEEKLY_RATES,), render_rates, vary=f"{current_year}-W{current_week}"
     )
 
 @router.post("/add-rate")
-def handle_add_rate(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+@query_budget(5)
+async def handle_add_rate(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
     article_id: int = Form(...),
     selling_rate: float = Form(...)
 ):
@@ -455,11 +566,11 @@ def handle_add_rate(
     current_year = date.today().year
 
     # Check if a rate for this article and week already exists to prevent duplicates
-    existing_rate = db.query(models.WeeklyRateLock).filter(
+    existing_rate = (await db.scalars(select(models.WeeklyRateLock).where(
         models.WeeklyRateLock.article_id == article_id,
         models.WeeklyRateLock.week_number == current_week,
         models.WeeklyRateLock.year == current_year
-    ).first()
+    ))).first()
 
     if not existing_rate:
         new_rate = models.WeeklyRateLock(
@@ -469,7 +580,14 @@ def handle_add_rate(
             year=current_year
         )
         db.add(new_rate)
-        db.commit()
+        await db.run_sync(versions.bump_version, versions.WEEKLY_RATES)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another admin locked this article's rate for the week first
+            await db.rollback()
+        else:
+            rate_cache.invalidate()
 
     return RedirectResponse(url="/rates-manager", status_code=303)
 # --- END: NEW ADMIN RATE MANAGER ROUTE ---
\ No newline at end of file
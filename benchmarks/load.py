@@ -0,0 +1,314 @@
+# benchmarks/load.py
+"""
+End-to-end load benchmark.
+
+Boots app.main:app in-process against a throwaway database (SQLite by default, or a
+local PostgreSQL via --database-url), swaps blob storage for an in-memory backend,
+seeds realistic volumes and drives the real flows concurrently through the ASGI app:
+login, create-po, submit bid with a photo, PO detail, approve-bid and the summary report.
+Reports p50/p95/p99 latency, requests/sec and DB queries per request per flow.
+
+    python -m benchmarks.load --concurrency 50 --duration 60 --json results.json
+
+With --strict the app runs with STRICT_DB_CHECKS on: an unplanned lazy load or a route going
+over its query budget fails that request, so the run exits non-zero. CI covers the same checks
+with the test suite (tests/), which always runs strict.
+
+The schema of the target database is DROPPED and recreated: never point it at real data.
+Needs httpx (pip install -r requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import asdict
+import httpx
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'blue_marina_benchmark.db')}"
+PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(64 * 1024) # 64 KB stand-in for a JPEG proof photo
+# SQLite waits this long for a competing writer instead of failing with 'database is locked'
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+# Share of virtual users per role
+ROLE_MIX = {"store": 0.4, "purchaser": 0.5, "admin": 0.1}
+
+_query_counter = contextvars.ContextVar("benchmark_query_counter", default=None)
+
+def in_memory_storage():
+    """BlobStorage backend that keeps blobs in memory, so runs measure the app and not Azure."""
+    from app.services.storage import BlobStorage
+
+    class InMemoryStorage(BlobStorage):
+        def __init__(self):
+            self.blobs = {}
+
+        async def exists(self, name: str) -> bool:
+            return name in self.blobs
+
+        async def put(self, name: str, chunks, content_type) -> None:
+            self.blobs[name] = b"".join([chunk async for chunk in chunks])
+
+        async def delete(self, name: str) -> None:
+            self.blobs.pop(name, None)
+
+        def url(self, name: str) -> str:
+            return f"memory://{name}"
+
+        async def close(self) -> None:
+            self.blobs.clear()
+
+    return InMemoryStorage()
+
+class QueryCountingMiddleware:
+    """Counts SQL statements executed while serving each request and returns them in X-DB-Queries."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        counter = [0]
+        token = _query_counter.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-db-queries", str(counter[0]).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _query_counter.reset(token)
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; busy_timeout makes writers queue up
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def _count_query(*args, **kwargs):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.server_errors = defaultdict(int)
+        self.failed_users = 0
+
+    def record(self, flow: str, seconds: float, response) -> None:
+        self.latencies[flow].append(seconds * 1000)
+        if "x-db-queries" in response.headers:
+            self.queries[flow].append(int(response.headers["x-db-queries"]))
+        if response.status_code >= 400:
+            self.errors[flow] += 1
+        if response.status_code >= 500:
+            self.server_errors[flow] += 1
+
+    def report(self, elapsed: float) -> dict:
+        def percentile(values, p):
+            values = sorted(values)
+            return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+        flows = {}
+        for flow, values in sorted(self.latencies.items()):
+            queries = self.queries.get(flow) or [0]
+            flows[flow] = {
+                "requests": len(values),
+                "errors": self.errors[flow],
+                "server_errors": self.server_errors[flow],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "queries_per_request": round(sum(queries) / len(queries), 2),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "elapsed_seconds": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2),
+            "failed_users": self.failed_users, "flows": flows,
+        }
+
+async def _timed(client, recorder: Recorder, flow: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.record(flow, time.perf_counter() - start, response)
+    return response
+
+async def _login(client, recorder, username, password):
+    response = await _timed(client, recorder, "login", "POST", "/token", data={"username": username, "password": password})
+    if "access_token" not in response.cookies:
+        raise RuntimeError(f"Login failed for {username}: {response.status_code}")
+
+async def _store_user(client, recorder, rng, data, username, deadline):
+    po_ids = data.po_ids_by_store.get(username, [])
+    bids = data.approvable_bids_by_store.get(username, [])
+    while time.monotonic() < deadline:
+        action = rng.choices(["create_po", "po_detail", "approve_bid", "dashboard"], weights=[3, 4, 2, 2])[0]
+        if action == "create_po":
+            form = {}
+            for i, article_number in enumerate(rng.sample(data.article_numbers, 5)):
+                form[f"article_{i}"] = article_number
+                form[f"quantity_{i}"] = str(rng.randint(1, 100))
+            await _timed(client, recorder, "create_po", "POST", "/create-po", data=form)
+        elif action == "po_detail" and po_ids:
+            await _timed(client, recorder, "po_detail", "GET", f"/po/{rng.choice(po_ids)}")
+        elif action == "approve_bid" and bids:
+            await _timed(client, recorder, "approve_bid", "POST", f"/approve-bid/{bids.pop()}")
+        else:
+            await _timed(client, recorder, "dashboard_store", "GET", "/dashboard")
+
+async def _purchaser_user(client, recorder, rng, data, username, deadline):
+    while time.monotonic() < deadline:
+        if rng.random() < 0.3 or not data.open_line_item_ids:
+            await _timed(client, recorder, "dashboard_purchaser", "GET", "/dashboard")
+            continue
+        line_item_id = rng.choice(data.open_line_item_ids)
+        await _timed(client, recorder, "bid_page", "GET", f"/bid/{line_item_id}")
+        await _timed(
+            client, recorder, "submit_bid", "POST", f"/bid/{line_item_id}",
+            data={"bid_rate": f"{rng.uniform(5, 250):.2f}"},
+            # Unique bytes per bid, so content addressing doesn't turn every upload into a dedup hit
+            files={"proof_photo": ("proof.jpg", PHOTO + rng.randbytes(16), "image/jpeg")},
+        )
+
+async def _admin_user(client, recorder, rng, data, username, deadline):
+    while time.monotonic() < deadline:
+        breakdown = rng.choice(["", "store", "article"])
+        await _timed(client, recorder, "summary_report", "GET", f"/summary-report?breakdown={breakdown}")
+
+async def _virtual_user(app, recorder, seed, data, role, username, password, deadline):
+    rng = random.Random(seed)
+    # App exceptions come back as 500 responses and are counted, instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", follow_redirects=False) as client:
+        try:
+            await _login(client, recorder, username, password)
+            flow = {"store": _store_user, "purchaser": _purchaser_user, "admin": _admin_user}[role]
+            await flow(client, recorder, rng, data, username, deadline)
+        except Exception as exc:
+            # One broken virtual user stops, the others keep driving load
+            recorder.failed_users += 1
+            print(f"Virtual user {username} ({role}) stopped: {exc!r}", file=sys.stderr)
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _print_report(report: dict) -> None:
+    print(f"\n{report['requests']} requests in {report['elapsed_seconds']}s ({report['rps']} req/s)")
+    print(f"{'flow':<22}{'reqs':>8}{'err':>6}{'5xx':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for flow, row in report["flows"].items():
+        print(f"{flow:<22}{row['requests']:>8}{row['errors']:>6}{row['server_errors']:>6}{row['rps']:>9}{row['p50_ms']:>10}"
+              f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['queries_per_request']:>9}")
+    uploads = report["uploads"]
+    print(f"background proof uploads: {uploads['completed']} completed, {uploads['retried']} retried, "
+          f"{uploads['failed']} failed, {uploads['abandoned']} unfinished at shutdown")
+    if report["failed_users"]:
+        print(f"{report['failed_users']} virtual users stopped early (see stderr)")
+
+async def run(args) -> dict:
+    # Everything under app/ reads its configuration at import time, so it is imported only now.
+    from sqlalchemy import event
+    from app.db import models
+    from app.db.base import SessionLocal, async_engine, engine
+    from app.main import app
+    from app.services.upload_queue import upload_queue
+    from app.services.uploads import FileUploader
+    from app.web import routes
+    from benchmarks.seed import PASSWORD, SeedVolumes, seed
+
+    if engine.dialect.name == "sqlite":
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "connect", _sqlite_pragmas)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    volumes = SeedVolumes(stores=args.stores, purchasers=args.purchasers, purchase_orders=args.purchase_orders)
+    print(f"Seeding {volumes} ...")
+    db = SessionLocal()
+    try:
+        data = seed(db, volumes, random.Random(args.seed))
+    finally:
+        db.close()
+
+    routes.file_uploader = FileUploader(in_memory_storage())
+    # Bid photos go through the background queue; spool them to a scratch directory
+    upload_queue.uploader = routes.file_uploader
+    upload_queue.spool_dir = tempfile.mkdtemp(prefix="bm-spool-")
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", _count_query)
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = []
+    for i in range(args.concurrency):
+        role = rng.choices(list(ROLE_MIX), weights=list(ROLE_MIX.values()))[0]
+        names = {"store": data.store_names, "purchaser": data.purchaser_names, "admin": [data.admin_name]}[role]
+        users.append((role, names[i % len(names)]))
+
+    asgi_app = QueryCountingMiddleware(app)
+    async with app.router.lifespan_context(app):
+        print(f"Running {args.concurrency} virtual users for {args.duration}s ...")
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            _virtual_user(asgi_app, recorder, args.seed + i, data, role, username, PASSWORD, deadline)
+            for i, (role, username) in enumerate(users)
+        ))
+        elapsed = time.monotonic() - start
+
+    report = recorder.report(elapsed)
+    report.update(
+        commit=_git_commit(),
+        database=args.database_url.split("://", 1)[0],
+        concurrency=args.concurrency,
+        uploads=upload_queue.stats(),
+        volumes=asdict(volumes),
+    )
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Blue Marina end-to-end load benchmark")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL, help="Throwaway database; its schema is dropped and recreated")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to drive load for")
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--purchasers", type=int, default=40)
+    parser.add_argument("--purchase-orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, for comparable runs across commits")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--strict", action="store_true", help="Fail requests on lazy loads and query budget overruns")
+    args = parser.parse_args(argv)
+
+    # Set before app.core.config is imported; .env values never override these.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    if args.strict:
+        os.environ["STRICT_DB_CHECKS"] = "true"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("AZURE_STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+    report = asyncio.run(run(args))
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.json}")
+    if report["failed_users"] or any(row["errors"] for row in report["flows"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
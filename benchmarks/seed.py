@@ -0,0 +1,147 @@
+# benchmarks/seed.py
+# Bulk seeding of a throwaway benchmark database with realistic volumes.
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from app.auth import get_password_hash
+from app.core.config import ARTICLES
+from app.db import models
+from app.services import rollups, versions
+
+PASSWORD = "benchmark"
+INSERT_BATCH_SIZE = 5000
+
+@dataclass
+class SeedVolumes:
+    stores: int = 20
+    purchasers: int = 40
+    articles: int = 200
+    purchase_orders: int = 5000
+    items_per_po: int = 5
+    bids_per_item: int = 3
+    # Share of POs still open for bidding; the rest are spread over the later statuses
+    open_share: float = 0.3
+
+@dataclass
+class SeedData:
+    """What the load generator needs to know about the seeded rows."""
+    store_names: list[str] = field(default_factory=list)
+    purchaser_names: list[str] = field(default_factory=list)
+    admin_name: str = "bench_admin"
+    article_numbers: list[str] = field(default_factory=list)
+    po_ids_by_store: dict[str, list[int]] = field(default_factory=dict)
+    # Per store: one PENDING bid on each line item of its open POs, to approve during the run
+    approvable_bids_by_store: dict[str, list[int]] = field(default_factory=dict)
+    open_line_item_ids: list[int] = field(default_factory=list)
+
+def _insert(db: Session, model, rows: list[dict]) -> list[int]:
+    ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        ids += db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows[start:start + INSERT_BATCH_SIZE]
+        ).all()
+    return ids
+
+def seed(db: Session, volumes: SeedVolumes, rng: random.Random) -> SeedData:
+    """Fills an empty schema. All users share PASSWORD, hashed once."""
+    data = SeedData()
+    hashed = get_password_hash(PASSWORD)
+
+    data.store_names = [f"bench_store_{i}" for i in range(volumes.stores)]
+    data.purchaser_names = [f"bench_buyer_{i}" for i in range(volumes.purchasers)]
+    users = [{"username": name, "hashed_password": hashed, "role": models.UserRole.store.value} for name in data.store_names]
+    users += [{"username": name, "hashed_password": hashed, "role": models.UserRole.purchaser.value} for name in data.purchaser_names]
+    users.append({"username": data.admin_name, "hashed_password": hashed, "role": models.UserRole.admin.value})
+    user_ids = dict(zip([user["username"] for user in users], _insert(db, models.User, users)))
+    store_ids = [user_ids[name] for name in data.store_names]
+    purchaser_ids = [user_ids[name] for name in data.purchaser_names]
+
+    articles = list(ARTICLES) + [
+        {"article_number": f"BENCH-{i:04d}", "name": f"Benchmark Article {i}", "unit": "kg"}
+        for i in range(max(volumes.articles - len(ARTICLES), 0))
+    ]
+    article_ids = _insert(db, models.Article, articles)
+    data.article_numbers = [article["article_number"] for article in articles]
+    locked_rates = {article_id: round(rng.uniform(5, 250), 2) for article_id in article_ids}
+
+    year, week, _ = date.today().isocalendar()
+    _insert(db, models.WeeklyRateLock, [
+        {"article_id": article_id, "selling_rate": rate, "week_number": week, "year": year}
+        for article_id, rate in locked_rates.items()
+    ])
+
+    later_statuses = [
+        models.POStatus.APPROVED.value, models.POStatus.IN_LOGISTICS.value,
+        models.POStatus.DELIVERED.value, models.POStatus.COMPLETED.value,
+    ]
+    now = datetime.now(timezone.utc)
+    pos = []
+    for i in range(volumes.purchase_orders):
+        is_open = rng.random() < volumes.open_share
+        pos.append({
+            "po_number": f"PO-BENCH-{i:07d}",
+            "store_id": rng.choice(store_ids),
+            "status": models.POStatus.PENDING_BIDS.value if is_open else rng.choice(later_statuses),
+            "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+            "line_item_count": volumes.items_per_po,
+            "approved_item_count": 0 if is_open else volumes.items_per_po,
+        })
+    po_ids = _insert(db, models.PurchaseOrder, pos)
+    store_name_by_id = {user_ids[name]: name for name in data.store_names}
+    for po_id, po in zip(po_ids, pos):
+        data.po_ids_by_store.setdefault(store_name_by_id[po["store_id"]], []).append(po_id)
+
+    items = []
+    for po_id, po in zip(po_ids, pos):
+        for article_id in rng.sample(article_ids, volumes.items_per_po):
+            is_open = po["status"] == models.POStatus.PENDING_BIDS.value
+            quantity = float(rng.randint(1, 200))
+            items.append({
+                "po_id": po_id,
+                "article_id": article_id,
+                "requested_quantity": quantity,
+                "allocated_quantity": None if is_open else quantity,
+                "locked_rate": locked_rates[article_id],
+            })
+    item_ids = _insert(db, models.OrderLineItem, items)
+
+    bids = []
+    for item_id, item in zip(item_ids, items):
+        is_open = item["allocated_quantity"] is None
+        for n in range(volumes.bids_per_item):
+            if is_open:
+                status = models.BidStatus.PENDING.value
+            else:
+                status = models.BidStatus.APPROVED.value if n == 0 else models.BidStatus.REJECTED.value
+            bids.append({
+                "line_item_id": item_id,
+                "purchaser_id": rng.choice(purchaser_ids),
+                "bid_rate": round(item["locked_rate"] * rng.uniform(0.75, 1.2), 2),
+                "proof_photo_url": "memory://seed.jpg",
+                "status": status,
+            })
+    _insert(db, models.Bid, bids)
+    rollups.rebuild_margin_rollups(db)
+    # The migrations create these rows; the schema here comes from create_all
+    db.execute(insert(models.CacheVersion), [
+        {"name": name, "version": 0} for name in (versions.WEEKLY_RATES, versions.OPEN_LINE_ITEMS, versions.PO_PROGRESS)
+    ])
+    db.commit()
+
+    # One approvable bid per open line item, grouped by the store that owns the PO
+    rows = db.execute(
+        select(models.PurchaseOrder.store_id, models.OrderLineItem.id, select(models.Bid.id).where(
+            models.Bid.line_item_id == models.OrderLineItem.id
+        ).order_by(models.Bid.id).limit(1).scalar_subquery()).join(
+            models.OrderLineItem, models.OrderLineItem.po_id == models.PurchaseOrder.id
+        ).where(models.PurchaseOrder.status == models.POStatus.PENDING_BIDS.value)
+    ).all()
+    for store_id, item_id, bid_id in rows:
+        data.open_line_item_ids.append(item_id)
+        if bid_id is not None:
+            data.approvable_bids_by_store.setdefault(store_name_by_id[store_id], []).append(bid_id)
+    for bid_ids in data.approvable_bids_by_store.values():
+        rng.shuffle(bid_ids)
+    return data
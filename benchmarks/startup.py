@@ -0,0 +1,92 @@
+# benchmarks/startup.py
+"""
+Worker boot benchmark.
+
+Boots app.main:app in fresh interpreters, the way a new uvicorn worker does, and times the
+import, the startup hooks and the first request. Fails (exit code 1) if the median boot takes
+longer than --max-seconds or if booting opened a database connection, so a slow or
+side-effecting import shows up in CI.
+
+    python -m benchmarks.startup --runs 5 --max-seconds 2
+
+The database is a SQLite path that does not exist: any connection during boot creates the file.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in the child interpreter; prints one JSON line with the timings in seconds.
+_BOOT = """
+import asyncio, json, time
+import httpx
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get("/metrics")
+        served = time.perf_counter()
+    return ready, served, response.status_code
+
+ready, served, status = asyncio.run(boot())
+print(json.dumps({
+    "import_seconds": imported - started,
+    "startup_seconds": ready - imported,
+    "first_request_seconds": served - ready,
+    "boot_seconds": served - started,
+    "status": status,
+}))
+"""
+
+def boot_once(database_path: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "startup-secret"),
+        "AZURE_STORAGE_CONNECTION_STRING": os.environ.get("AZURE_STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true"),
+    }
+    env.pop("ASYNC_DATABASE_URL", None)
+    env.pop("METRICS_TOKEN", None)
+    output = subprocess.run([sys.executable, "-c", _BOOT], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Blue Marina worker boot benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="Fail if the median boot takes longer")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "untouched.db")
+        runs = [boot_once(database_path) for _ in range(args.runs)]
+        touched_database = os.path.exists(database_path)
+
+    report = {
+        name: round(statistics.median(run[name] for run in runs), 3)
+        for name in ("import_seconds", "startup_seconds", "first_request_seconds", "boot_seconds")
+    }
+    report.update(runs=args.runs, max_seconds=args.max_seconds, touched_database=touched_database)
+    print(f"median over {args.runs} boots: import {report['import_seconds']}s, startup {report['startup_seconds']}s, "
+          f"first request {report['first_request_seconds']}s, total {report['boot_seconds']}s (target {args.max_seconds}s)")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if touched_database:
+        print("FAIL: booting a worker connected to the database")
+    if report["boot_seconds"] > args.max_seconds:
+        print("FAIL: boot is over target")
+    if touched_database or report["boot_seconds"] > args.max_seconds:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# tests/conftest.py
+# The suite runs against TEST_DATABASE_URL, a throwaway database whose schema is dropped and rebuilt:
+# with the Alembic migrations on PostgreSQL (as in CI), with create_all on SQLite (the default).
+# Configuration is read when app/ is imported, so it is set up here first, with strict DB checks on.
+import os
+import tempfile
+import uuid
+
+_scratch = tempfile.mkdtemp(prefix="bluemarina-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{_scratch}/test.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = os.path.join(_scratch, "blobs")
+os.environ["UPLOAD_SPOOL_DIR"] = os.path.join(_scratch, "spool")
+os.environ["STRICT_DB_CHECKS"] = "true"
+
+import pytest
+from sqlalchemy import text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="session")
+def engine():
+    """The app's sync engine, on a freshly built schema."""
+    from app.db import models
+    from app.db.base import engine
+
+    if engine.dialect.name == "postgresql":
+        from alembic import command
+        from alembic.config import Config
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+        config = Config(os.path.join(ROOT, "alembic.ini"))
+        config.set_main_option("sqlalchemy.url", engine.url.render_as_string(hide_password=False).replace("%", "%%"))
+        command.upgrade(config, "head")
+    else:
+        models.Base.metadata.drop_all(engine)
+        models.Base.metadata.create_all(engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    from app.db.base import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture(scope="session")
+def client(engine):
+    """One client, so one event loop, for the whole run: pooled asyncpg connections are bound to their loop."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def make_user(db):
+    """Creates a user with a unique name; the password hash defaults to a placeholder."""
+    from app.db import models
+
+    def make(role: str, hashed_password: str = "x") -> models.User:
+        user = models.User(username=f"{role}-{uuid.uuid4().hex[:8]}", hashed_password=hashed_password, role=role)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def login_as(client):
+    """Sends the client's following requests as the given user."""
+    from app.auth import create_access_token, token_claims_for
+
+    def login(user) -> None:
+        client.cookies.set("access_token", create_access_token(token_claims_for(user)))
+    return login
@@ -0,0 +1,97 @@
+# tests/test_auctions.py
+# Awarding bids: a store approving one by hand, and close_auctions awarding what is left.
+import uuid
+from datetime import datetime, timezone
+import pytest
+from app.db import models
+from app.services import auctions
+
+@pytest.fixture
+def open_po(db, make_user):
+    """A PENDING_BIDS PO with two line items, each with a cheap and a dear bid."""
+    store = make_user("store")
+    purchaser = make_user("purchaser")
+    article = models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name="Test article")
+    po = models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id, line_item_count=2)
+    db.add_all([article, po])
+    db.flush()
+    items = [models.OrderLineItem(po_id=po.id, article_id=article.id, requested_quantity=10, locked_rate=10) for _ in range(2)]
+    db.add_all(items)
+    db.flush()
+    bids = [
+        models.Bid(line_item_id=item.id, purchaser_id=purchaser.id, bid_rate=rate, status=models.BidStatus.PENDING.value)
+        for item in items for rate in (9, 12)
+    ]
+    db.add_all(bids)
+    db.commit()
+    return store, po, items, bids
+
+def _statuses(db, bids):
+    db.expire_all()
+    return [db.get(models.Bid, bid.id).status for bid in bids]
+
+def test_approve_bid(client, db, login_as, open_po):
+    store, po, items, bids = open_po
+    login_as(store)
+
+    response = client.post(f"/approve-bid/{bids[1].id}", follow_redirects=False)
+    assert response.status_code == 303
+    assert _statuses(db, bids[:2]) == [models.BidStatus.REJECTED.value, models.BidStatus.APPROVED.value]
+    assert db.get(models.OrderLineItem, items[0].id).allocated_quantity == 1.0
+    assert db.get(models.PurchaseOrder, po.id).status == models.POStatus.PENDING_BIDS.value
+
+    # Re-approving the other bid on the same item replaces the allocation without counting the item twice
+    client.post(f"/approve-bid/{bids[0].id}", follow_redirects=False)
+    client.post(f"/approve-bid/{bids[2].id}", follow_redirects=False)
+    db.expire_all()
+    po = db.get(models.PurchaseOrder, po.id)
+    assert (po.approved_item_count, po.status) == (2, models.POStatus.APPROVED.value)
+    assert db.get(models.OrderLineItem, items[0].id).allocated_quantity == 10
+
+def test_approve_bid_of_another_store(client, db, make_user, login_as, open_po):
+    _, _, _, bids = open_po
+    login_as(make_user("store"))
+    response = client.post(f"/approve-bid/{bids[0].id}", follow_redirects=False)
+    assert response.headers["location"] == "/dashboard"
+    assert _statuses(db, bids[:1]) == [models.BidStatus.PENDING.value]
+
+def test_close_auctions_awards_open_items(db, login_as, client, open_po):
+    store, po, items, bids = open_po
+    login_as(store)
+    client.post(f"/approve-bid/{bids[1].id}", follow_redirects=False)
+
+    auctions.close_auctions(db, datetime.now(timezone.utc))
+    db.commit()
+    # The approved item keeps its bid; the open one goes to its cheapest valid bid
+    assert _statuses(db, bids) == [
+        models.BidStatus.REJECTED.value, models.BidStatus.APPROVED.value,
+        models.BidStatus.APPROVED.value, models.BidStatus.REJECTED.value,
+    ]
+    assert db.get(models.PurchaseOrder, po.id).status == models.POStatus.APPROVED.value
+
+def test_close_auctions_closes_items_without_a_valid_bid(db, make_user, open_po):
+    store, po, items, bids = open_po
+    # Both bids on the first item fall outside the +/-30% guardrail
+    for bid, rate in zip(bids[:2], (5, 20)):
+        db.get(models.Bid, bid.id).bid_rate = rate
+    no_bids = models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id, line_item_count=1)
+    db.add(no_bids)
+    db.flush()
+    unbid_item = models.OrderLineItem(po_id=no_bids.id, article_id=items[0].article_id, requested_quantity=10, locked_rate=10)
+    db.add(unbid_item)
+    db.commit()
+
+    result = auctions.close_auctions(db, datetime.now(timezone.utc))
+    db.commit()
+    assert result["line_items_unfilled"] >= 2 and result["purchase_orders_unfilled"] >= 1
+    assert _statuses(db, bids) == [
+        models.BidStatus.REJECTED.value, models.BidStatus.REJECTED.value,
+        models.BidStatus.APPROVED.value, models.BidStatus.REJECTED.value,
+    ]
+    assert db.get(models.OrderLineItem, items[0].id).allocated_quantity == 0
+    assert db.get(models.PurchaseOrder, po.id).status == models.POStatus.APPROVED.value
+    assert db.get(models.OrderLineItem, unbid_item.id).allocated_quantity == 0
+    assert db.get(models.PurchaseOrder, no_bids.id).status == models.POStatus.UNFILLED.value
+
+    # Nothing is left open for the next run
+    assert auctions.close_auctions(db, datetime.now(timezone.utc))["purchase_orders_unfilled"] == 0
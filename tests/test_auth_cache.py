@@ -0,0 +1,46 @@
+# tests/test_auth_cache.py
+# Cached tokens follow the shared 'users' version: role changes and deleted users are not served from the cache.
+from sqlalchemy import update
+from app.auth import token_cache
+from app.db import models
+from app.services import versions
+
+def _create_po_status(client):
+    return client.get("/create-po", follow_redirects=False).status_code
+
+def test_role_change_drops_cached_tokens(client, db, make_user, login_as):
+    store = make_user("store")
+    login_as(store)
+    assert _create_po_status(client) == 200
+
+    db.get(models.User, store.id).role = "purchaser"
+    db.commit()
+    assert _create_po_status(client) == 307
+
+def test_deleted_user_is_logged_out(client, db, make_user, login_as):
+    store = make_user("store")
+    login_as(store)
+    assert _create_po_status(client) == 200
+
+    db.delete(db.get(models.User, store.id))
+    db.commit()
+    assert _create_po_status(client) == 401
+
+def test_bulk_update_reaches_workers_within_check_interval(client, db, make_user, login_as, monkeypatch):
+    versions.bump_version(db, versions.USERS) # makes sure the counter row exists
+    db.commit()
+    store = make_user("store")
+    login_as(store)
+    assert _create_po_status(client) == 200
+
+    # As another worker would: a bulk UPDATE that bumps the counter, with nothing invalidated in this process
+    db.execute(update(models.User).where(models.User.id == store.id).values(role="purchaser"))
+    db.execute(update(models.CacheVersion).where(models.CacheVersion.name == versions.USERS).values(
+        version=models.CacheVersion.version + 1
+    ))
+    db.commit()
+    monkeypatch.setattr(token_cache, "check_interval", 3600)
+    assert _create_po_status(client) == 200
+
+    monkeypatch.setattr(token_cache, "check_interval", 0)
+    assert _create_po_status(client) == 307
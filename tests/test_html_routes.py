@@ -0,0 +1,120 @@
+# tests/test_html_routes.py
+# Every page and form handler renders under STRICT_DB_CHECKS: a lazy load or a query past the route's budget fails here.
+import uuid
+from datetime import date, datetime
+import pytest
+from app.db import models
+
+@pytest.fixture(scope="module")
+def world(engine):
+    """A store, purchaser and admin, an article, a PO open for bids and a delivered PO."""
+    from app.db.base import SessionLocal
+    db = SessionLocal()
+    try:
+        store, purchaser, admin = (
+            models.User(username=f"{role}-{uuid.uuid4().hex[:8]}", hashed_password="x", role=role)
+            for role in ("store", "purchaser", "admin")
+        )
+        article = models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name="Test article")
+        db.add_all([store, purchaser, admin, article])
+        db.flush()
+        open_po, delivered_po = (
+            models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id, status=status, line_item_count=1)
+            for status in (models.POStatus.PENDING_BIDS.value, models.POStatus.DELIVERED.value)
+        )
+        db.add_all([open_po, delivered_po])
+        db.flush()
+        open_item, delivered_item = (
+            models.OrderLineItem(po_id=po.id, article_id=article.id, requested_quantity=10, allocated_quantity=allocated, locked_rate=10)
+            for po, allocated in ((open_po, None), (delivered_po, 10))
+        )
+        db.add_all([open_item, delivered_item])
+        db.flush()
+        bid = models.Bid(line_item_id=open_item.id, purchaser_id=purchaser.id, bid_rate=9, status=models.BidStatus.RECOMMENDED.value)
+        db.add_all([bid, models.Bid(
+            line_item_id=delivered_item.id, purchaser_id=purchaser.id, bid_rate=8, status=models.BidStatus.APPROVED.value
+        )])
+        db.commit()
+        for instance in (store, purchaser, admin, article):
+            db.refresh(instance) # loaded, so usable once the session is closed
+        return {
+            "store": store, "purchaser": purchaser, "admin": admin, "article": article,
+            "open_po": open_po.id, "open_item": open_item.id, "bid": bid.id, "delivered_po": delivered_po.id,
+        }
+    finally:
+        db.close()
+
+def _ok(response, status_code=200):
+    assert response.status_code == status_code, response.text[:500]
+    return response
+
+def test_login_page(client):
+    _ok(client.get("/login"))
+
+@pytest.mark.parametrize("role", ["store", "purchaser", "admin"])
+def test_dashboards(client, login_as, world, role):
+    login_as(world[role])
+    _ok(client.get("/dashboard"))
+    _ok(client.get("/dashboard", params={"page_size": 1, "date_from": date.today().isoformat()}))
+    if role == "admin":
+        for status in ("IN_LOGISTICS", "DELIVERED", "COMPLETED"):
+            _ok(client.get("/dashboard", params={"status": status}))
+
+def test_store_pages(client, login_as, world):
+    login_as(world["store"])
+    _ok(client.get("/create-po"))
+    _ok(client.get(f"/po/{world['open_po']}"))
+    _ok(client.get(f"/po/{world['delivered_po']}"))
+
+def test_purchaser_pages(client, login_as, world):
+    login_as(world["purchaser"])
+    _ok(client.get(f"/bid/{world['open_item']}"))
+    response = client.post(
+        f"/bid/{world['open_item']}", data={"bid_rate": "9.5"},
+        files={"proof_photo": ("proof.jpg", b"\xff\xd8" + uuid.uuid4().bytes, "image/jpeg")}, follow_redirects=False,
+    )
+    _ok(response, 303)
+
+@pytest.mark.parametrize("breakdown", [None, "store", "article"])
+def test_summary_report(client, login_as, world, breakdown):
+    login_as(world["admin"])
+    params = {"start_date": "2020-01-01", "end_date": date.today().isoformat(), "store_id": world["store"].id}
+    if breakdown:
+        params["breakdown"] = breakdown
+    _ok(client.get("/summary-report", params=params))
+
+def test_rates_and_new_po(client, login_as, world):
+    login_as(world["admin"])
+    _ok(client.get("/rates-manager"))
+    _ok(client.post("/add-rate", data={"article_id": world["article"].id, "selling_rate": "12.5"}, follow_redirects=False), 303)
+    _ok(client.get("/rates-manager"))
+
+    # The rate locked above prices the new PO
+    login_as(world["store"])
+    response = _ok(client.post(
+        "/create-po", data={"article_0": world["article"].article_number, "quantity_0": "5"}, follow_redirects=False,
+    ), 303)
+    assert response.headers["location"] == "/dashboard"
+
+def test_approve_bid(client, db, login_as, world):
+    login_as(world["store"])
+    _ok(client.post(f"/approve-bid/{world['bid']}", follow_redirects=False), 303)
+    assert db.get(models.PurchaseOrder, world["open_po"]).status == models.POStatus.APPROVED.value
+
+def test_logistics_flow(client, login_as, world):
+    login_as(world["admin"])
+    _ok(client.get(f"/po/{world['delivered_po']}/logistics"))
+    _ok(client.get(f"/po/{world['open_po']}/logistics"))
+    _ok(client.post(
+        f"/po/{world['open_po']}/assign-driver",
+        data={"assigned_driver": "Driver", "pickup_time": datetime.now().replace(microsecond=0).isoformat()},
+        follow_redirects=False,
+    ), 303)
+    _ok(client.post(
+        f"/po/{world['open_po']}/upload-proof", data={"proof_type": "pickup", "pickup_temperature": "4.5"},
+        files={"photo": ("pickup.jpg", b"\xff\xd8" + uuid.uuid4().bytes, "image/jpeg")}, follow_redirects=False,
+    ), 303)
+    _ok(client.get(f"/po/{world['open_po']}/logistics"))
+
+    login_as(world["store"])
+    _ok(client.post(f"/po/{world['delivered_po']}/confirm-receipt", data={"action": "accept"}, follow_redirects=False), 303)
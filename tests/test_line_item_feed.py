@@ -0,0 +1,60 @@
+# tests/test_line_item_feed.py
+# The purchaser live feed: which line items count as new, and a watcher that survives database errors.
+import asyncio
+import logging
+import uuid
+from app.db import models
+from app.services import events
+from app.services.events import LineItemFeed, _load_changes
+
+def _open_po(db, store_id, article_id) -> int:
+    po = models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store_id, line_item_count=1)
+    db.add(po)
+    db.flush()
+    item = models.OrderLineItem(po_id=po.id, article_id=article_id, requested_quantity=1, locked_rate=1)
+    db.add(item)
+    db.commit()
+    return item.id
+
+def test_items_committed_out_of_id_order_are_not_missed(db, make_user):
+    store = make_user("store")
+    article = models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name="Test article")
+    db.add(article)
+    db.commit()
+    version, seen, items = _load_changes(None, None)
+    assert items == []
+
+    earlier, later = _open_po(db, store.id, article.id), _open_po(db, store.id, article.id)
+    # The higher id was seen first, as when its transaction committed before the lower one
+    version, seen, items = _load_changes(version - 1, seen | {later})
+    assert [item["id"] for item in items] == [earlier]
+    assert {earlier, later} <= seen
+
+    # An unchanged version reads nothing more
+    assert _load_changes(version, seen) == (version, seen, [])
+
+def test_watcher_logs_and_backs_off_on_errors(monkeypatch, caplog):
+    calls = []
+
+    def flaky_load(last_version, seen_ids):
+        calls.append(seen_ids)
+        if len(calls) <= 2:
+            raise ConnectionError("database unavailable")
+        if seen_ids is None:
+            return 1, set(), []
+        return 2, {7}, [{"id": 7}]
+    monkeypatch.setattr(events, "_load_changes", flaky_load)
+    monkeypatch.setattr(events.logger, "disabled", False) # alembic's fileConfig disables existing loggers
+
+    async def run():
+        feed = LineItemFeed(poll_interval=0.01)
+        queue = feed.subscribe()
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=5)
+        finally:
+            await feed.close()
+
+    with caplog.at_level(logging.ERROR, logger="app.events"):
+        assert asyncio.run(run()) == ("line_items", [{"id": 7}])
+    assert len(caplog.records) == 2
+    assert "retrying in" in caplog.records[0].getMessage()
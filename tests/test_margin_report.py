@@ -0,0 +1,121 @@
+# tests/test_margin_report.py
+# The summary report reads margin_rollups: delivered and completed POs count, as they did before the rollups.
+import uuid
+import pytest
+from app.db import models
+from app.services import reports, rollups
+
+@pytest.fixture
+def store_pos(db, make_user):
+    """Two in-transit POs for a new store: one with two approved line items, one with no approved bid."""
+    store = make_user("store")
+    purchaser = make_user("purchaser")
+    apples, pears = (models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name=name) for name in ("Apples", "Pears"))
+    allocated, unallocated = (
+        models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id, status=models.POStatus.IN_LOGISTICS.value)
+        for _ in range(2)
+    )
+    db.add_all([apples, pears, allocated, unallocated])
+    db.flush()
+    items = [
+        models.OrderLineItem(po_id=allocated.id, article_id=apples.id, requested_quantity=10, allocated_quantity=10, locked_rate=5),
+        models.OrderLineItem(po_id=allocated.id, article_id=pears.id, requested_quantity=4, allocated_quantity=4, locked_rate=8),
+        models.OrderLineItem(po_id=unallocated.id, article_id=pears.id, requested_quantity=3, locked_rate=8),
+    ]
+    db.add_all(items)
+    db.flush()
+    db.add_all([
+        models.Bid(line_item_id=items[0].id, purchaser_id=purchaser.id, bid_rate=3, status=models.BidStatus.APPROVED.value),
+        models.Bid(line_item_id=items[1].id, purchaser_id=purchaser.id, bid_rate=6, status=models.BidStatus.APPROVED.value),
+        models.Bid(line_item_id=items[2].id, purchaser_id=purchaser.id, bid_rate=7, status=models.BidStatus.PENDING.value),
+    ])
+    db.commit()
+    return store, allocated, unallocated
+
+def _deliver(client, po):
+    response = client.post(
+        f"/po/{po.id}/upload-proof", data={"proof_type": "delivery"},
+        files={"photo": ("delivery.jpg", b"\xff\xd8" + uuid.uuid4().bytes, "image/jpeg")}, follow_redirects=False,
+    )
+    assert response.status_code == 303
+
+def _totals(db, store):
+    db.expire_all()
+    summary = reports.summarize_margins(db, store_id=store.id)
+    return summary["total_pos"], summary["line_items"], summary["total_revenue"], summary["total_cost"]
+
+def test_report_counts_delivered_and_completed_pos(client, db, make_user, login_as, store_pos):
+    store, allocated, unallocated = store_pos
+    expected = (2, 2, 10 * 5 + 4 * 8, 10 * 3 + 4 * 6)
+    assert _totals(db, store) == (0, 0, 0, 0)
+
+    login_as(make_user("admin"))
+    _deliver(client, allocated)
+    _deliver(client, unallocated)
+    assert _totals(db, store) == expected
+
+    login_as(store)
+    response = client.post(f"/po/{allocated.id}/confirm-receipt", data={"action": "accept"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert _totals(db, store) == expected
+    buckets = db.query(models.MarginRollup).filter(models.MarginRollup.store_id == store.id).all()
+    assert sum(row.completed_pos for row in buckets) == 1
+    assert sum(row.delivered_pos for row in buckets) == 1
+    assert sum(row.delivered_line_items for row in buckets) == 0
+
+    # A new delivery photo sends a completed PO back to DELIVERED, without counting it twice
+    login_as(make_user("admin"))
+    _deliver(client, allocated)
+    assert _totals(db, store) == expected
+
+def test_rebuild_matches_incremental_rollups(client, db, make_user, login_as, store_pos):
+    store, allocated, unallocated = store_pos
+    login_as(make_user("admin"))
+    _deliver(client, allocated)
+    _deliver(client, unallocated)
+    login_as(store)
+    client.post(f"/po/{unallocated.id}/confirm-receipt", data={"action": "accept"}, follow_redirects=False)
+
+    def snapshot():
+        db.expire_all()
+        return sorted(
+            tuple(getattr(row, column) for column in rollups.ROLLUP_KEY + rollups.DELIVERED_COLUMNS + rollups.COMPLETED_COLUMNS)
+            for row in db.query(models.MarginRollup).filter(models.MarginRollup.store_id == store.id)
+        )
+
+    incremental = snapshot()
+    rollups.rebuild_margin_rollups(db)
+    db.commit()
+    assert snapshot() == incremental
+
+def test_approvals_after_delivery_are_refused(client, db, make_user, login_as):
+    store = make_user("store")
+    purchaser = make_user("purchaser")
+    article = models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name="Plums")
+    po = models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id, line_item_count=1)
+    db.add_all([article, po])
+    db.flush()
+    item = models.OrderLineItem(po_id=po.id, article_id=article.id, requested_quantity=10, locked_rate=5)
+    db.add(item)
+    db.flush()
+    cheap, dear = (models.Bid(line_item_id=item.id, purchaser_id=purchaser.id, bid_rate=rate) for rate in (4, 6))
+    db.add_all([cheap, dear])
+    db.commit()
+    expected = (1, 1, 10 * 5, 10 * 4)
+
+    login_as(store)
+    client.post(f"/approve-bid/{cheap.id}", follow_redirects=False)
+    login_as(make_user("admin"))
+    _deliver(client, po)
+    assert _totals(db, store) == expected
+
+    login_as(store)
+    response = client.post(f"/approve-bid/{dear.id}", follow_redirects=False)
+    assert response.headers["location"] == f"/po/{po.id}"
+    db.expire_all()
+    assert db.get(models.PurchaseOrder, po.id).status == models.POStatus.DELIVERED.value
+    assert db.get(models.Bid, cheap.id).status == models.BidStatus.APPROVED.value
+
+    login_as(make_user("admin"))
+    _deliver(client, po)
+    assert _totals(db, store) == expected
@@ -0,0 +1,42 @@
+# tests/test_purchase_order_import.py
+# Bulk PO import: malformed files are rejected with a 400, bad quantities are skipped per row.
+import json
+import uuid
+import pytest
+from app.db import models
+from app.services import purchase_orders
+
+@pytest.mark.parametrize("payload", [
+    {"po_ref": "A"},
+    [{"po_ref": "A"}],
+    [{"po_ref": "A", "lines": {"article_number": "1", "quantity": 1}}],
+    [{"po_ref": "A", "lines": ["1001", 5]}],
+    [{"po_ref": "A", "lines": [None]}],
+    ["not a purchase order"],
+])
+def test_malformed_json_import_is_a_400(client, make_user, login_as, payload):
+    login_as(make_user("store"))
+    response = client.post(
+        "/api/purchase-orders/import",
+        files={"file": ("orders.json", json.dumps(payload).encode(), "application/json")},
+    )
+    assert response.status_code == 400
+
+def test_json_lines_are_flattened():
+    content = json.dumps([{"po_ref": "A", "store": "s1", "lines": [{"article_number": " 1001 ", "quantity": 5}]}]).encode()
+    assert purchase_orders.parse_import_file(content, "orders.json") == [
+        {"po_ref": "A", "store": "s1", "article_number": "1001", "quantity": 5},
+    ]
+
+def test_only_finite_positive_quantities_are_accepted(db):
+    article = models.Article(article_number=f"T-{uuid.uuid4().hex[:8]}", name="Test article")
+    db.add(article)
+    db.commit()
+    quantities = ["nan", "inf", "-inf", "-3", "0", "", None, "2.5"]
+
+    items, skipped = purchase_orders.resolve_line_items(
+        db, [(article.article_number, quantity) for quantity in quantities], {article.article_number: 10.0}
+    )
+    assert [item["requested_quantity"] for item in items] == [2.5]
+    assert {row["reason"] for row in skipped} == {purchase_orders.SKIP_INVALID_QUANTITY}
+    assert len(skipped) == len(quantities) - 1
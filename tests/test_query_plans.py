@@ -0,0 +1,18 @@
+# tests/test_query_plans.py
+# The hot queries use indexes. On PostgreSQL (as in CI) the schema comes from the migrations,
+# so an index missing from them fails here, not only in 'python -m app.cli check-query-plans'.
+import pytest
+from app.db.query_plans import check_query_plans, hot_queries
+
+@pytest.fixture(scope="module")
+def plans(engine):
+    from app.db.base import SessionLocal
+    db = SessionLocal()
+    try:
+        return check_query_plans(db)
+    finally:
+        db.close()
+
+@pytest.mark.parametrize("query", sorted(hot_queries()))
+def test_hot_query_uses_indexes(plans, query):
+    assert plans[query] == set(), f"{query} reads {', '.join(sorted(plans[query]))} with a full scan"
@@ -0,0 +1,44 @@
+# tests/test_storage.py
+# Blob storage backends: names stay inside the storage directory, and backends implement the whole interface.
+import asyncio
+import io
+import os
+import pytest
+from fastapi import UploadFile
+from app.services.storage import BlobStorage, LocalFileStorage
+from app.services.uploads import FileUploader
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+def test_uploaded_file_name_cannot_leave_the_storage_directory(tmp_path):
+    storage = LocalFileStorage(str(tmp_path / "blobs"), "/uploads")
+    uploader = FileUploader(storage, content_addressed=False)
+    file = UploadFile(io.BytesIO(b"photo"), filename="../../app/main.py")
+
+    stored = asyncio.run(uploader.upload_file(file, file.filename))
+    assert stored.name.endswith(".py") and "/" not in stored.name
+    assert os.listdir(tmp_path) == ["blobs"]
+    assert (tmp_path / "blobs" / stored.name).read_bytes() == b"photo"
+
+@pytest.mark.parametrize("name", ["../escaped", "nested/blob", "/etc/passwd", ".."])
+def test_local_storage_rejects_names_outside_its_directory(tmp_path, name):
+    storage = LocalFileStorage(str(tmp_path / "blobs"), "/uploads")
+    with pytest.raises(ValueError):
+        asyncio.run(storage.put(name, _chunks(b"x"), None))
+    with pytest.raises(ValueError):
+        asyncio.run(storage.delete(name))
+    assert os.listdir(tmp_path) == ["blobs"]
+    assert os.listdir(tmp_path / "blobs") == []
+
+def test_incomplete_backend_fails_when_instantiated():
+    class ReadOnlyStorage(BlobStorage):
+        async def exists(self, name):
+            return False
+
+        def url(self, name):
+            return name
+
+    with pytest.raises(TypeError):
+        ReadOnlyStorage()
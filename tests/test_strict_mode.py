@@ -0,0 +1,44 @@
+# tests/test_strict_mode.py
+# STRICT_DB_CHECKS: lazy loads raise, and routes fail once they run past their query budget.
+import uuid
+import pytest
+from passlib.hash import pbkdf2_sha256
+from sqlalchemy.exc import InvalidRequestError
+from app.auth import pwd_context
+from app.core.config import PASSWORD_HASH_ROUNDS
+from app.core.instrumentation import QueryBudgetExceeded
+from app.db import models
+from app.main import login_for_access_token
+
+def _login(client, username: str):
+    return client.post("/token", data={"username": username, "password": "password"}, follow_redirects=False)
+
+def test_login_within_budget(client, make_user):
+    user = make_user("purchaser", pwd_context.hash("password"))
+    response = _login(client, user.username)
+    assert response.status_code == 302
+    assert response.headers["location"] == "/dashboard"
+
+def test_login_rehashing_an_outdated_hash_within_budget(client, db, make_user):
+    user = make_user("purchaser", pbkdf2_sha256.using(rounds=PASSWORD_HASH_ROUNDS + 1000).hash("password"))
+    response = _login(client, user.username)
+    assert response.status_code == 302
+    assert response.headers["location"] == "/dashboard"
+
+    db.refresh(user)
+    assert pbkdf2_sha256.from_string(user.hashed_password).rounds == PASSWORD_HASH_ROUNDS
+    assert _login(client, user.username).status_code == 302
+
+def test_route_over_budget_fails(client, make_user, monkeypatch):
+    user = make_user("purchaser", pwd_context.hash("password"))
+    monkeypatch.setattr(login_for_access_token, "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        _login(client, user.username)
+
+def test_lazy_load_raises(db, make_user):
+    store = make_user("store")
+    db.add(models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=store.id))
+    db.commit()
+    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.store_id == store.id).one()
+    with pytest.raises(InvalidRequestError):
+        po.line_items
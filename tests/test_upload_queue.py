@@ -0,0 +1,102 @@
+# tests/test_upload_queue.py
+# Background proof uploads: retries, and the recovery sweep for uploads a worker left behind.
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.db import models
+from app.services.storage import LocalFileStorage
+from app.services.upload_queue import UploadQueue
+from app.services.uploads import FileUploader
+
+LONG_AGO = datetime.now(timezone.utc) - timedelta(days=1)
+
+class FlakyStorage(LocalFileStorage):
+    """Fails the first `failures` puts."""
+    def __init__(self, directory, failures=0):
+        super().__init__(directory, "/uploads")
+        self.failures = failures
+
+    async def put(self, name, chunks, content_type):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("storage unavailable")
+        await super().put(name, chunks, content_type)
+
+@pytest.fixture
+def queue(tmp_path):
+    return UploadQueue(
+        FileUploader(FlakyStorage(str(tmp_path / "blobs"))), spool_dir=str(tmp_path / "spool"),
+        workers=2, max_attempts=3, retry_base=0.01, stale_after=60, orphan_after=600, host="this-host",
+    )
+
+@pytest.fixture
+def pending_bid(db, make_user, tmp_path):
+    """Creates a bid waiting for its proof, with a spool file unless spooled=False."""
+    purchaser = make_user("purchaser")
+    po = models.PurchaseOrder(po_number=f"PO-{uuid.uuid4().hex[:8]}", store_id=make_user("store").id)
+    article = models.Article(article_number=f"A-{uuid.uuid4().hex[:8]}", name="Test article")
+    db.add_all([po, article])
+    db.flush()
+    item = models.OrderLineItem(po_id=po.id, article_id=article.id, requested_quantity=1, locked_rate=10)
+    db.add(item)
+    db.flush()
+
+    def make(host="this-host", claimed_at=LONG_AGO, spooled=True):
+        bid = models.Bid(line_item_id=item.id, purchaser_id=purchaser.id, bid_rate=9, proof_status=models.ProofStatus.PENDING.value)
+        db.add(bid)
+        db.flush()
+        path = str(tmp_path / f"spool-{bid.id}")
+        if spooled:
+            with open(path, "wb") as fh:
+                fh.write(os.urandom(256))
+        db.add(models.PendingUpload(bid_id=bid.id, spool_path=path, spool_host=host, file_name="p.jpg", content_type="image/jpeg", claimed_at=claimed_at))
+        db.commit()
+        return bid
+    return make
+
+def _proof_status(db, bid) -> str:
+    db.expire_all()
+    return db.get(models.Bid, bid.id).proof_status
+
+def _sweep(queue):
+    async def sweep():
+        await queue.recover_once()
+        await queue.join()
+        await queue.close()
+    asyncio.run(sweep())
+
+def test_stale_upload_on_this_host_is_resumed(db, queue, pending_bid):
+    queue.uploader.storage.failures = 1
+    bid = pending_bid()
+    _sweep(queue)
+    assert _proof_status(db, bid) == models.ProofStatus.UPLOADED.value
+    assert db.get(models.Bid, bid.id).proof_photo_url.startswith("/uploads/")
+    assert db.get(models.PendingUpload, bid.id) is None
+    assert queue.stats()["resumed"] == 1 and queue.stats()["retried"] == 1
+
+def test_recent_upload_is_left_to_its_worker(db, queue, pending_bid):
+    bid = pending_bid(claimed_at=datetime.now(timezone.utc))
+    _sweep(queue)
+    assert _proof_status(db, bid) == models.ProofStatus.PENDING.value
+
+def test_lost_spool_file_fails_the_bid(db, queue, pending_bid):
+    bid = pending_bid(spooled=False)
+    _sweep(queue)
+    assert _proof_status(db, bid) == models.ProofStatus.FAILED.value
+    assert queue.stats()["lost"] == 1
+
+def test_uploads_of_a_vanished_host_fail_once_orphaned(db, queue, pending_bid):
+    orphaned = pending_bid(host="recycled-replica")
+    live = pending_bid(host="other-replica", claimed_at=datetime.now(timezone.utc) - timedelta(seconds=120))
+    _sweep(queue)
+    assert _proof_status(db, orphaned) == models.ProofStatus.FAILED.value
+    assert _proof_status(db, live) == models.ProofStatus.PENDING.value
+
+def test_gives_up_after_max_attempts(db, queue, pending_bid):
+    queue.uploader.storage.failures = 10
+    bid = pending_bid()
+    _sweep(queue)
+    assert _proof_status(db, bid) == models.ProofStatus.FAILED.value
+    assert db.get(models.PendingUpload, bid.id).attempts == 3